@@ -0,0 +1,201 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import config
+
+class CacheMissError(Exception):
+    """回放模式下缓存未命中"""
+
+
+def hash_text(text):
+    """计算文本的 SHA-256 摘要"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+# ============================================================================
+# 进程内LRU缓存
+# ============================================================================
+class MemoryLRUCache:
+    """线程安全的进程内LRU缓存"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+    def get(self, key):
+        """读取缓存，未命中返回 None"""
+        with self._lock:
+            if key not in self._entries:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return self._entries[key]
+
+    def set(self, key, value):
+        """写入缓存，超过容量时淘汰最久未访问的条目"""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self.stats["writes"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def get_stats(self):
+        """获取命中统计"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+
+# ============================================================================
+# 持久化LRU缓存
+# ============================================================================
+
+
+class PersistentLRUCache:
+    """基于 SQLite 的键值缓存，超过容量时按最近访问时间淘汰"""
+
+    def __init__(self, path, max_entries):
+        self.path = path
+        self.max_entries = max_entries
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # 多个辩论线程共享同一连接，由锁保证串行访问
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON entries (last_access)")
+        self._conn.commit()
+
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+    def get(self, key):
+        """读取缓存，未命中返回 None"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            self._conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.stats["hits"] += 1
+            return row[0]
+
+    def set(self, key, value):
+        """写入缓存，超过容量时淘汰最久未访问的条目"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, last_access) VALUES (?, ?, ?)",
+                (key, value, time.time()),
+            )
+            self.stats["writes"] += 1
+
+            overflow = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY last_access LIMIT ?)",
+                    (overflow,),
+                )
+                self.stats["evictions"] += overflow
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def get_stats(self):
+        """获取命中统计"""
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["entries"] = len(self)
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+# ============================================================================
+# 大模型响应缓存
+# ============================================================================
+class ResponseCache(PersistentLRUCache):
+    """Agent 级别的大模型回复缓存
+
+    缓存键由发言者名称、模型名称、温度、系统提示摘要和可见对话历史摘要组成，
+    replay 为 True 时只读缓存，未命中抛出 CacheMissError。
+    """
+
+    def __init__(self, path=None, max_entries=None, replay=None):
+        super().__init__(
+            path or config.response_cache_path,
+            max_entries or config.response_cache_max_entries,
+        )
+        self.replay = config.response_cache_replay if replay is None else replay
+
+    @staticmethod
+    def make_key(speaker, model, temperature, system_message, messages):
+        """生成缓存键，对话历史只取 role/name/content，保证同步和异步引擎的键一致
+
+        裁判共用同一份系统提示、看到相同的历史，也可能分到同一个模型，
+        键中必须包含发言者，否则同模型的裁判会读到彼此的评分。
+        """
+        history = [[m.get("role"), m.get("name"), m.get("content")] for m in messages]
+        return ":".join([
+            speaker,
+            model,
+            str(temperature),
+            hash_text(system_message or ""),
+            hash_text(json.dumps(history, ensure_ascii=False)),
+        ])
+
+    def lookup(self, key):
+        """读取缓存，回放模式下未命中直接报错"""
+        value = self.get(key)
+        if value is None and self.replay:
+            raise CacheMissError(f"回放模式下缓存未命中: {key}")
+        return value
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """获取全局响应缓存，未开启缓存时返回 None"""
+    global _response_cache
+    if not (config.response_cache_enabled or config.response_cache_replay):
+        return None
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache()
+        return _response_cache
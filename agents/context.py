@@ -0,0 +1,125 @@
+import threading
+import config
+from agents.http_client import http_client
+from agents.tokens import estimate_messages_tokens
+from instrumentation import recorder, add_usage
+
+# ============================================================================
+# 辩手上下文窗口
+# ============================================================================
+SUMMARY_SYSTEM_PROMPT = "你是一名辩论记录员。请根据已有摘要和新增发言，更新辩论摘要：按正方、反方分别列出已提出的核心论点、主要反驳和尚未回应的质疑。只输出摘要本身，不超过400字。"
+
+
+class DebateContextManager:
+    """为辩手构造精简后的对话历史
+
+    每场辩论一个实例，由所有辩手共享。视图由三部分组成：
+    - 固定保留：辩论发起人的开场消息，以及赛制中固定保留阶段的发言（默认为主持人介绍和开场陈述/立论，
+      见 debate_formats.py 中的 pinned）
+    - 较早发言：按 summary_every 的节奏合并进滚动摘要，尚未合并的部分原样保留
+    - 最近发言：最近 recent_messages 条完整保留
+
+    Args:
+        debate_format: 编译后的赛制（CompiledFormat），固定保留的发言取自其 pinned_turns
+    """
+
+    def __init__(self, debate_format, recent_messages=None, summary_every=None, summary_model=None):
+        self.pinned_turns = debate_format.pinned_turns
+        self.recent_messages = recent_messages or config.context_recent_messages
+        self.summary_every = summary_every or config.context_summary_every
+        self.summary_model = summary_model or config.context_summary_model or config.host_model
+
+        self._lock = threading.Lock()
+        # 滚动摘要及其覆盖的较早发言条数
+        self.summary = ""
+        self.summarized_count = 0
+
+        self.stats = {
+            "calls": 0,
+            "full_prompt_tokens": 0,
+            "windowed_prompt_tokens": 0,
+            "summaries": 0,
+        }
+
+    def build_view(self, messages):
+        """根据完整历史构造精简视图，历史较短时原样返回"""
+        pinned, older, recent = self._split(messages)
+
+        with self._lock:
+            if len(older) - self.summarized_count >= self.summary_every:
+                self._update_summary(older)
+
+            if self.summarized_count:
+                summary_message = {
+                    "content": f"【此前辩论摘要（共{self.summarized_count}条发言）】\n{self.summary}",
+                    "role": "user",
+                }
+                view = pinned + [summary_message] + older[self.summarized_count:] + recent
+            else:
+                view = pinned + older + recent
+
+            self.stats["calls"] += 1
+            self.stats["full_prompt_tokens"] += estimate_messages_tokens(messages)
+            self.stats["windowed_prompt_tokens"] += estimate_messages_tokens(view)
+
+        return view
+
+    def _split(self, messages):
+        """把历史划分为固定保留、较早发言和最近发言三部分"""
+        recent_start = max(0, len(messages) - self.recent_messages)
+        pinned, older = [], []
+        # 按发言者计数，与赛制的 pinned_turns 对应
+        spoken = {}
+        for index, m in enumerate(messages[:recent_start]):
+            name = m.get("name")
+            count = spoken.get(name, 0)
+            spoken[name] = count + 1
+            if index == 0 or (name, count) in self.pinned_turns:
+                pinned.append(m)
+            else:
+                older.append(m)
+        return pinned, older, messages[recent_start:]
+
+    def _update_summary(self, older):
+        """把尚未摘要的较早发言合并进滚动摘要（调用方需持有锁）"""
+        new_messages = older[self.summarized_count:]
+        transcript = "\n\n".join(f"{m.get('name', '')}: {m.get('content', '')}" for m in new_messages)
+        try:
+            # 回放模式下不发起网络请求
+            if config.response_cache_replay:
+                raise RuntimeError("回放模式下不生成远程摘要")
+            with recorder.track_call(self.summary_model, role="summarizer"):
+                result = http_client.chat_completion({
+                    "model": self.summary_model,
+                    "messages": [
+                        {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+                        {"role": "user", "content": f"已有摘要：\n{self.summary or '（无）'}\n\n新增发言：\n{transcript}"},
+                    ],
+                })
+                usage = result.get("usage") or {}
+                add_usage(usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0))
+            summary = result["choices"][0]["message"]["content"].strip()
+        except Exception as e:
+            print(f"生成辩论摘要失败，使用本地摘要: {e}")
+            summary = self._local_summary(new_messages)
+
+        if summary:
+            self.summary = summary
+            self.summarized_count = len(older)
+            self.stats["summaries"] += 1
+
+    def _local_summary(self, new_messages):
+        """远程摘要不可用时，截取每条发言的开头作为摘要"""
+        lines = [self.summary] if self.summary else []
+        for m in new_messages:
+            content = (m.get("content") or "").replace("\n", " ")
+            lines.append(f"- {m.get('name', '')}: {content[:80]}")
+        return "\n".join(lines)
+
+    def get_report(self):
+        """获取本场辩论的token节省情况（按估算token计）"""
+        with self._lock:
+            report = dict(self.stats)
+        report["saved_tokens"] = report["full_prompt_tokens"] - report["windowed_prompt_tokens"]
+        report["saved_ratio"] = report["saved_tokens"] / report["full_prompt_tokens"] if report["full_prompt_tokens"] else 0.0
+        return report
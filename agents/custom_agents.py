@@ -1,8 +1,107 @@
-from autogen import AssistantAgent
+import time
+from concurrent.futures import ThreadPoolExecutor
+from autogen import AssistantAgent, ConversableAgent
 from agents.extractor import extractor
+from agents.http_client import http_client
+from agents.cache import get_response_cache
+from agents.tokens import estimate_tokens, estimate_messages_tokens
+import config
 from error_handler import log_debate_error
+from instrumentation import recorder, set_call_context, mark_first_token, add_usage
+from retry_policy import retry_policy, classify_error, BREAKER_ERRORS, ERROR_CACHE_MISS
+from model_router import model_router, use_model
+from debate_formats import DEFAULT_VISIBILITY, filter_messages
+from agents.verdicts import record_verdict, get_template_announcement
+from agents.pool import PooledAgentMixin
+from agents.prompt_caching import mark_cacheable_prefixes, get_cached_tokens
 
-class FinalModeratorAgent(AssistantAgent):
+
+def generate_llm_reply(agent, sender, generate, messages=None, attempt=0):
+    """调用大模型生成原始回复，开启响应缓存时优先读取缓存
+
+    每次调用都会记录模型、角色、阶段、token用量、首token时间、总延迟和重试次数。
+
+    Args:
+        agent: 发起调用的 Agent
+        sender: 消息来源（GroupChatManager）
+        generate: 缓存未命中时实际生成回复的无参函数
+        messages: 本次调用可见的对话历史，默认取 agent.chat_messages[sender]
+        attempt: 当前是第几次重试（首次为0）
+    """
+    debate_sm = agent.debate_sm
+    set_call_context(
+        debate_sm.debate_id if debate_sm is not None else None,
+        agent.name,
+        debate_sm.state if debate_sm is not None else None,
+    )
+    if messages is None:
+        messages = agent.chat_messages[sender]
+    llm_config = agent.llm_config["config_list"][0]
+
+    with recorder.track_call(llm_config["model"], retries=attempt) as call:
+        cache = get_response_cache()
+        key = None
+        if cache is not None:
+            key = cache.make_key(agent.name, llm_config["model"], agent.llm_config.get("temperature"), agent.system_message, messages)
+            reply = cache.lookup(key)
+            if reply is not None:
+                call["cache_hit"] = True
+                return reply
+
+        # 流式调用和共享客户端都会自行上报用量，未上报时（如 autogen 缓存命中）按估算记录
+        reply = generate()
+        if not call["prompt_tokens"]:
+            call["prompt_tokens"] = estimate_tokens(agent.system_message) + estimate_messages_tokens(messages)
+            call["completion_tokens"] = estimate_tokens(reply if isinstance(reply, str) else "")
+            call["estimated"] = True
+
+        if cache is not None and reply and isinstance(reply, str):
+            cache.set(key, reply)
+        return reply
+
+
+def generate_with_retry(agent, sender, generate, messages=None):
+    """生成回复并提取纯文本，空回复和调用失败按 retry_policy 退避重试，必要时切换到同公司的其他模型
+
+    Returns:
+        str: 提取后的回复（重试用尽后可能为空）
+    """
+    agent.ensure_system_message()
+    assigned_model = agent.llm_config["config_list"][0]["model"]
+
+    def attempt(retry, model):
+        # 开启模型故障切换时，本次尝试可能使用同公司的其他模型
+        start = time.perf_counter()
+        try:
+            with use_model(agent, model):
+                reply = generate_llm_reply(agent, sender, generate, messages=messages, attempt=retry)
+        except Exception as e:
+            # 回放模式下缓存未命中没有发起调用，不计入模型的健康数据
+            if classify_error(e) != ERROR_CACHE_MISS:
+                model_router.record(model, None, ok=False)
+            raise
+        model_router.record(model, time.perf_counter() - start, ok=True)
+        extracted_reply = extractor.extract(reply)
+
+        # 在控制台输出原始回复和提取后的回复
+        print(f"原始回复: {reply}")
+        print(f"提取回复: {extracted_reply}")
+        return extracted_reply
+
+    return retry_policy.run(assigned_model, attempt, route=lambda retry, failed: model_router.choose(assigned_model, failed))
+
+
+def get_visible_messages(agent, messages):
+    """按赛制的可见性规则过滤 agent 能看到的对话历史，无需过滤时返回原列表
+
+    有状态机时返回 agent 的增量可见视图（不复制历史），调用方只能读取，不能修改。
+    """
+    if agent.debate_sm is not None:
+        return agent.debate_sm.visible_messages(agent.name, messages)
+    return filter_messages(agent.name, messages, DEFAULT_VISIBILITY)
+
+
+class FinalModeratorAgent(PooledAgentMixin, AssistantAgent):
     """最终主持人Agent - 能看到所有裁判评分"""
     
     def __init__(self, name, llm_config, system_message, debate_sm, ui_callback=None):
@@ -13,18 +112,16 @@ class FinalModeratorAgent(AssistantAgent):
 
     def generate_reply(self, sender=None, **kwargs):
         try:
-            max_retries = 3
-            for retry in range(max_retries):
-                reply = super().generate_reply(sender=sender, **kwargs)
-                extracted_reply = extractor.extract(reply)
-                
-                # 在控制台输出原始回复和提取后的回复
-                print(f"原始回复: {reply}")
-                print(f"提取回复: {extracted_reply}")
-                
-                if extracted_reply:
-                    break
-                print(f"回复为空，进行第 {retry + 2} 次重试...")
+            # 最终裁决使用模板时直接按本地汇总的评分宣布，不调用模型
+            extracted_reply = get_template_announcement(self.debate_sm)
+            if extracted_reply is None:
+                # 在按赛制的可见性规则过滤后的历史上生成
+                messages = get_visible_messages(self, self.chat_messages[sender])
+                extracted_reply = generate_with_retry(
+                    self, sender,
+                    lambda: super(FinalModeratorAgent, self).generate_reply(messages=messages, sender=sender, **kwargs),
+                    messages=messages,
+                )
             
             if extracted_reply and self.ui_callback:
                 self.ui_callback(self.name, extracted_reply)
@@ -36,7 +133,7 @@ class FinalModeratorAgent(AssistantAgent):
                 self.ui_callback("系统", f"[{self.name}] 生成回复时发生错误")
             return "[主持人]: 当前无法正常回复"
 
-class FilteredAssistantAgent(AssistantAgent):
+class FilteredAssistantAgent(PooledAgentMixin, AssistantAgent):
     """过滤其他裁判消息的助手Agent"""
     
     def __init__(self, name, llm_config, system_message, debate_sm=None, ui_callback=None):
@@ -45,71 +142,111 @@ class FilteredAssistantAgent(AssistantAgent):
         self.ui_callback = ui_callback
     
     def generate_reply(self, sender=None, **kwargs):
-        # Pull full message history
-        messages = self.chat_messages[sender]
-
-        # Filter visibility: exclude messages from other judges
-        filtered_messages = []
-        for m in messages:
-            name = m.get("name", "")
-            # Keep all messages except those from other judges
-            # A judge message starts with "裁判" (Judge)
-            if not (name.startswith("裁判") and name != self.name):
-                filtered_messages.append(m)
-
-        # IMPORTANT: temporarily replace messages
-        original = self.chat_messages[sender]
-        self.chat_messages[sender] = filtered_messages
-
         try:
-            max_retries = 3
-            for retry in range(max_retries):
-                reply = super().generate_reply(sender=sender, **kwargs)
-                extracted_reply = extractor.extract(reply)
-                
-                # 在控制台输出原始回复和提取后的回复
-                print(f"原始回复: {reply}")
-                print(f"提取回复: {extracted_reply}")
-                
-                if extracted_reply:
-                    break
-                print(f"回复为空，进行第 {retry + 2} 次重试...")
-            
+            extracted_reply = record_verdict(self.debate_sm, self.name, self.generate_verdict(sender, **kwargs))
+
             if extracted_reply and self.ui_callback:
                 self.ui_callback(self.name, extracted_reply)
-            
+
             return f"[{self.name}]: {extracted_reply}"
         except Exception as e:
             log_debate_error(self.name, e, "FilteredAssistantAgent.generate_reply")
             if self.ui_callback:
                 self.ui_callback("系统", f"[{self.name}] 消息过滤过程中发生错误")
             return f"[{self.name}]: 当前无法正常回复"
+
+    def generate_verdict(self, sender=None, **kwargs):
+        """在过滤后的历史上生成评分，返回提取后的文本（不触发界面回调）
+
+        过滤后的历史直接作为 messages 传入，不替换 chat_messages，
+        并行评分的裁判各自读取自己的可见视图，互不影响。
+        """
+        # Filter visibility: by default judges cannot see other judges' messages
+        messages = get_visible_messages(self, self.chat_messages[sender])
+        return generate_with_retry(
+            self, sender,
+            lambda: super(FilteredAssistantAgent, self).generate_reply(messages=messages, sender=sender, **kwargs),
+            messages=messages,
+        )
+
+class JudgePanelAgent(ConversableAgent):
+    """裁判团Agent - 并行调度所有裁判独立评分
+
+    每位裁判在各自的过滤视图上同时评分，结果按裁判编号顺序汇总，
+    作为一条消息交还给主持人进行最终裁决。
+    """
+
+    def __init__(self, name, judges, debate_sm=None, ui_callback=None, max_workers=None):
+        super().__init__(name=name, llm_config=False, human_input_mode="NEVER", code_execution_config=False)
+        self.judges = judges
+        self.debate_sm = debate_sm
+        self.ui_callback = ui_callback
+        self.max_workers = max_workers or len(judges)
+
+    def generate_reply(self, sender=None, **kwargs):
+        verdicts = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = [pool.submit(self._timed_verdict, judge, sender) for judge in self.judges]
+            # 按裁判顺序收集结果，保证输出顺序确定
+            for judge, future in zip(self.judges, futures):
+                try:
+                    verdict = future.result()
+                except Exception as e:
+                    log_debate_error(judge.name, e, "JudgePanelAgent.generate_reply")
+                    if self.ui_callback:
+                        self.ui_callback("系统", f"[{judge.name}] 消息过滤过程中发生错误")
+                    verdict = "当前无法正常回复"
+                verdicts.append((judge.name, record_verdict(self.debate_sm, judge.name, verdict)))
+
+        for judge_name, verdict in verdicts:
+            if self.debate_sm is not None:
+                self.debate_sm.judge_scores[judge_name] = verdict
+            if verdict and self.ui_callback:
+                self.ui_callback(judge_name, verdict)
+
+        return "\n\n".join(f"[{judge_name}]: {verdict}" for judge_name, verdict in verdicts)
+
+    def _timed_verdict(self, judge, sender):
+        """生成单个裁判的评分，并把耗时记入时间线"""
+        start = time.perf_counter()
+        try:
+            return judge.generate_verdict(sender)
         finally:
-            # Restore full history to avoid side effects
-            self.chat_messages[sender] = original
+            if self.debate_sm is not None:
+                self.debate_sm.timeline.add_span(judge.name, start, time.perf_counter())
 
-class DebaterAssistantAgent(AssistantAgent):
+class DebaterAssistantAgent(PooledAgentMixin, AssistantAgent):
     """辩手Agent - 支持界面回调"""
     
-    def __init__(self, name, llm_config, system_message, debate_sm=None, ui_callback=None):
+    def __init__(self, name, llm_config, system_message, debate_sm=None, ui_callback=None, context_manager=None, speculator=None):
         super().__init__(name=name, llm_config=llm_config, system_message=system_message)
         self.debate_sm = debate_sm
         self.ui_callback = ui_callback
+        # 上下文窗口管理（为 None 时使用完整历史）
+        self.context_manager = context_manager
+        # 开场陈述预生成（为 None 时不预生成）
+        self.speculator = speculator
     
     def generate_reply(self, sender=None, **kwargs):
         try:
-            max_retries = 3
-            for retry in range(max_retries):
-                reply = super().generate_reply(sender=sender, **kwargs)
-                extracted_reply = extractor.extract(reply)
+            extracted_reply = None
+            if self.speculator is not None:
+                # 先为下一位辩手启动预生成，再等待自己的预生成结果，两者可以同时进行
+                self.speculator.prefetch_next(sender)
+                extracted_reply = self.speculator.take(self, sender)
 
-                # 在控制台输出原始回复和提取后的回复
-                print(f"原始回复: {reply}")
-                print(f"提取回复: {extracted_reply}")
+            if not extracted_reply:
+                # 按赛制的可见性规则过滤历史；开启上下文窗口时，再使用精简后的历史
+                messages = get_visible_messages(self, self.chat_messages[sender])
+                if self.context_manager is not None:
+                    set_call_context(self.debate_sm.debate_id, self.name, self.debate_sm.state)
+                    messages = self.context_manager.build_view(messages)
 
-                if extracted_reply:
-                    break
-                print(f"回复为空，进行第 {retry + 2} 次重试...")
+                if config.stream_debater_replies and self.ui_callback:
+                    generate = lambda: self.stream_reply(sender, messages=messages, **kwargs)
+                else:
+                    generate = lambda: super(DebaterAssistantAgent, self).generate_reply(messages=messages, sender=sender, **kwargs)
+                extracted_reply = generate_with_retry(self, sender, generate, messages=messages)
 
             # Ensure we always have a meaningful response
             if not extracted_reply:
@@ -126,4 +263,54 @@ class DebaterAssistantAgent(AssistantAgent):
             if self.ui_callback:
                 self.ui_callback("系统", f"[{self.name}] 生成回复时发生错误")
             stateName = self.debate_sm.get_state_name() if self.debate_sm else "未知状态"
-            return f"[{stateName}-{self.name}]: 当前无法正常回复"
\ No newline at end of file
+            return f"[{stateName}-{self.name}]: 当前无法正常回复"
+
+    def generate_speculative(self, sender, messages):
+        """在给定的历史快照上生成开场陈述，只返回提取结果，不推送界面"""
+        messages = get_visible_messages(self, messages)
+        if self.context_manager is not None:
+            messages = self.context_manager.build_view(messages)
+        return generate_with_retry(
+            self, sender,
+            lambda: super(DebaterAssistantAgent, self).generate_reply(messages=messages, sender=sender),
+            messages=messages,
+        )
+
+    def stream_reply(self, sender=None, messages=None, **kwargs):
+        """流式生成回复，把增量文本通过界面回调实时推送
+
+        推送格式为 ("__STREAM__", (辩手名称, 增量文本))，增量文本为 None 表示
+        新一轮流式输出开始。生成结束后由调用方
+        对完整文本做信息提取，再以普通消息推送最终结果覆盖流式内容。
+        流式调用失败时回退到非流式生成。
+        messages 为本次使用的对话历史，默认取 chat_messages[sender]。
+        """
+        if messages is None:
+            messages = self.chat_messages[sender]
+        llm_config = self.llm_config["config_list"][0]
+        payload_messages = [
+            {key: m[key] for key in ("role", "content", "name") if m.get(key) is not None}
+            for m in [{"content": self.system_message, "role": "system"}] + messages
+        ]
+        payload = {"model": llm_config["model"], "messages": mark_cacheable_prefixes(llm_config["model"], payload_messages)}
+        if self.llm_config.get("temperature") is not None:
+            payload["temperature"] = self.llm_config["temperature"]
+
+        chunks = []
+        usage = {}
+        self.ui_callback("__STREAM__", (self.name, None))
+        try:
+            for chunk in http_client.stream_chat_completion(payload, usage=usage):
+                if not chunks:
+                    mark_first_token()
+                chunks.append(chunk)
+                self.ui_callback("__STREAM__", (self.name, chunk))
+            add_usage(usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0), cached_tokens=get_cached_tokens(usage))
+        except Exception as e:
+            log_debate_error(self.name, e, "DebaterAssistantAgent.stream_reply")
+            if not chunks:
+                # 限流、超时等服务端问题交给重试策略退避，避免立即再发一次非流式请求
+                if classify_error(e) in BREAKER_ERRORS:
+                    raise
+                return super().generate_reply(messages=messages, sender=sender, **kwargs)
+        return "".join(chunks)
\ No newline at end of file
@@ -1,28 +1,197 @@
-import requests
-from config import base_config, host_model
+import re
+import threading
+import time
+import config
+from config import host_model, extractor_fast_path_enabled, extractor_fast_path_min_chars
+from agents.http_client import http_client as shared_http_client
+from agents.cache import MemoryLRUCache, PersistentLRUCache, hash_text
+from instrumentation import recorder, add_usage
+from debate_timeline import record_extraction
+
+# ============================================================================
+# 本地规则提取
+# ============================================================================
+# 思考过程块：<think>...</think>、<thinking>...</thinking>、<reasoning>...</reasoning>
+_THINK_BLOCK_RE = re.compile(r"<(think|thinking|reasoning)>.*?</\1>", re.S | re.I)
+# 只有结束标签的思考块（部分模型会省略开头的 <think>）
+_THINK_TAIL_RE = re.compile(r"^.*?</(think|thinking|reasoning)>", re.S | re.I)
+# 整段被代码块包裹
+_CODE_FENCE_RE = re.compile(r"^```[\w-]*\s*\n(.*?)\n?```$", re.S)
+# 角色标签前缀：[正方辩手1]:、[开场陈述-正方辩手1]:、【裁判2】、主持人：
+_ROLE_NAME = r"(?:主持人|(?:正方|反方)辩手\d+|裁判\d+)"
+_ROLE_TAG_RE = re.compile(
+    rf"^\s*(?:\[[^\[\]\n]{{0,20}}{_ROLE_NAME}\]|【[^【】\n]{{0,20}}{_ROLE_NAME}】)\s*[:：]?\s*"
+    rf"|^\s*(?:\*\*)?{_ROLE_NAME}(?:\*\*)?\s*[:：]\s*"
+)
+# 推理前缀：以"思考过程："等开头，直到出现明确的回答标记
+_REASONING_PREFIX_RE = re.compile(
+    r"^\s*(?:【?(?:思考过程|思考|分析过程|推理过程)】?|Thinking|Thought|Reasoning)\s*[:：]",
+    re.I,
+)
+_ANSWER_MARKER_RE = re.compile(
+    r"(?:^|\n)\s*(?:【?(?:回答|发言|正式发言|最终回答|发言内容)】?|Answer|Final answer|Response)\s*[:：]?\s*\n?",
+    re.I,
+)
+# 提取后仍残留的可疑标记，出现即认为本地提取不可信
+_RESIDUAL_MARKER_RE = re.compile(r"</?(?:think|thinking|reasoning)>|<\|[^|]*\|>|思考过程[:：]", re.I)
+
+
+def local_extract(text):
+    """基于规则的本地提取
+
+    Returns:
+        tuple: (提取后的文本, 是否可信)
+    """
+    result = text.strip()
+
+    # 去除思考过程块
+    result = _THINK_BLOCK_RE.sub("", result)
+    if re.search(r"</(think|thinking|reasoning)>", result, re.I):
+        result = _THINK_TAIL_RE.sub("", result, count=1)
+    result = result.strip()
+
+    # 去除推理前缀，必须能找到回答标记才可信
+    if _REASONING_PREFIX_RE.match(result):
+        marker = _ANSWER_MARKER_RE.search(result)
+        if not marker:
+            return result, False
+        result = result[marker.end():].strip()
+
+    # 去除整段代码块包裹
+    fence = _CODE_FENCE_RE.match(result)
+    if fence:
+        result = fence.group(1).strip()
+
+    # 去除（可能重复出现的）角色标签前缀
+    while True:
+        stripped = _ROLE_TAG_RE.sub("", result, count=1).strip()
+        if stripped == result:
+            break
+        result = stripped
+
+    confident = len(result) >= extractor_fast_path_min_chars and not _RESIDUAL_MARKER_RE.search(result)
+    return result, confident
 
 # ============================================================================# 信息提取器# ============================================================================
 class InformationExtractor:
     """信息提取器 - 从大模型回复中提取纯文本内容"""
-    
-    def __init__(self, model=None):
+
+    def __init__(self, model=None, fast_path=None, http_client=None, cache_size=None, persistent_cache=None):
         self.model = model or host_model
-        self.base_url = base_config.get("base_url")
-        self.api_key = base_config.get("api_key")
-    
+        # 复用全局连接池，避免每次提取都重新建立TCP/TLS连接
+        self.http_client = http_client or shared_http_client
+        self.fast_path = extractor_fast_path_enabled if fast_path is None else fast_path
+
+        # 提取结果缓存：进程内LRU + 可选的持久化缓存
+        cache_size = config.extractor_cache_size if cache_size is None else cache_size
+        self.memory_cache = MemoryLRUCache(cache_size) if cache_size > 0 else None
+        if persistent_cache is None and config.extractor_persistent_cache_enabled:
+            persistent_cache = PersistentLRUCache(
+                config.extractor_persistent_cache_path,
+                config.extractor_persistent_cache_max_entries,
+            )
+        self.persistent_cache = persistent_cache
+
+        # 统计计数（裁判并行评分时会被多个线程同时调用）
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            "total": 0,
+            "cache_hits": 0,
+            "fast_path": 0,
+            "remote": 0,
+            "remote_failures": 0,
+        }
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def get_stats(self):
+        """获取提取统计信息，包含本地快速路径命中率和缓存统计"""
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats["fast_path_ratio"] = stats["fast_path"] / stats["total"] if stats["total"] else 0.0
+        stats["cache_hit_ratio"] = stats["cache_hits"] / stats["total"] if stats["total"] else 0.0
+        if self.memory_cache is not None:
+            stats["memory_cache"] = self.memory_cache.get_stats()
+        if self.persistent_cache is not None:
+            stats["persistent_cache"] = self.persistent_cache.get_stats()
+        return stats
+
+    def reset_stats(self):
+        """重置统计信息"""
+        with self._stats_lock:
+            for key in self.stats:
+                self.stats[key] = 0
+
     def extract(self, text):
-        """从文本中提取纯内容"""
+        """从文本中提取纯内容，相同文本直接返回缓存结果"""
         if not text:
             return text
-        
+
+        start = time.perf_counter()
         try:
-            # 直接调用 openrouter API
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json",
-                "HTTP-Referer": "https://openrouter.ai/",
-            }
-            
+            return self._extract_cached(text)
+        finally:
+            # 提取耗时计入当前辩论的阶段时间线
+            record_extraction(time.perf_counter() - start)
+
+    def _extract_cached(self, text):
+        self._count("total")
+        key = hash_text(f"{self.model}\n{text}")
+        cached = self._cache_get(key)
+        if cached is not None:
+            self._count("cache_hits")
+            return cached
+
+        result, cacheable = self._extract(text)
+        if cacheable:
+            self._cache_set(key, result)
+        return result
+
+    def _cache_get(self, key):
+        if self.memory_cache is not None:
+            cached = self.memory_cache.get(key)
+            if cached is not None:
+                return cached
+        if self.persistent_cache is not None:
+            cached = self.persistent_cache.get(key)
+            if cached is not None and self.memory_cache is not None:
+                self.memory_cache.set(key, cached)
+            return cached
+        return None
+
+    def _cache_set(self, key, value):
+        if self.memory_cache is not None:
+            self.memory_cache.set(key, value)
+        if self.persistent_cache is not None:
+            self.persistent_cache.set(key, value)
+
+    def _extract(self, text):
+        """优先使用本地规则，置信度不足时调用远程模型
+
+        Returns:
+            tuple: (提取结果, 是否可以缓存)
+        """
+        # 回放模式下不发起网络请求，只使用本地规则
+        replay = config.response_cache_replay
+        if self.fast_path or replay:
+            result, confident = local_extract(text)
+            if confident or replay:
+                self._count("fast_path")
+                return result, confident
+
+        self._count("remote")
+        return self._remote_extract(text)
+
+    def _remote_extract(self, text):
+        """调用大模型进行提取
+
+        Returns:
+            tuple: (提取结果, 是否提取成功)
+        """
+        try:
+            # 直接调用 openrouter API（认证头由连接池客户端统一设置）
             payload = {
                 "model": self.model,
                 "messages": [
@@ -36,19 +205,20 @@ class InformationExtractor:
                     }
                 ]
             }
-            
-            response = requests.post(f"{self.base_url}/chat/completions", headers=headers, json=payload)
-            response.raise_for_status()
-            
+
             # 解析响应
-            result = response.json()
+            with recorder.track_call(self.model, role="extractor"):
+                result = self.http_client.chat_completion(payload)
+                usage = result.get("usage") or {}
+                add_usage(usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0))
             if result.get("choices"):
-                return result["choices"][0]["message"]["content"].strip()
-            return text
+                return result["choices"][0]["message"]["content"].strip(), True
+            return text, False
         except Exception as e:
+            self._count("remote_failures")
             print(f"信息提取失败: {e}")
             # 提取失败时返回原始文本
-            return text
+            return text, False
 
 # 创建全局提取器实例
 extractor = InformationExtractor()
\ No newline at end of file
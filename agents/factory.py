@@ -1,7 +1,13 @@
-from config import base_config, host_model, debaters_per_side, judges_count, max_free_debate_turns
-from agents.custom_agents import FinalModeratorAgent, FilteredAssistantAgent, DebaterAssistantAgent
+from functools import partial
+from config import host_model, debaters_per_side, judges_count, max_free_debate_turns
+from agents.custom_agents import FinalModeratorAgent, FilteredAssistantAgent, DebaterAssistantAgent, JudgePanelAgent
 from agents.prompts import get_moderator_message, get_debater_message, get_judge_message
+from agents.context import DebateContextManager
+from agents.speculation import OpeningSpeculator
+from agents.pool import get_llm_config
+import config
 from debater_traits import get_trait_info
+from debate_state import JUDGE_PANEL_NAME
 from autogen import AssistantAgent
 
 # ============================================================================
@@ -9,6 +15,9 @@ from autogen import AssistantAgent
 # ============================================================================
 def create_agents(debate_topic, debate_sm, model_assignments=None, trait_assignments=None, ui_callback=None, max_free_debate_turns=None, debaters_per_side=2, judges_count=3):
     """创建所有辩论agents
+
+    内容相同的 llm_config 和客户端在所有 Agent、所有辩论之间共享；
+    客户端和系统提示词在 Agent 第一次发言时才创建和渲染。
     
     Args:
         debate_topic: 辩论辩题
@@ -38,12 +47,17 @@ def create_agents(debate_topic, debate_sm, model_assignments=None, trait_assignm
     actual_debaters_per_side = debaters_per_side
     actual_judges_count = judges_count
     
+    # 辩手共享的上下文窗口管理（每场辩论一个实例）
+    context_manager = DebateContextManager(debate_sm.format) if config.context_window_enabled else None
+    # 开场陈述预生成（每场辩论一个实例）
+    speculator = OpeningSpeculator(debate_sm) if config.speculative_opening_enabled else None
+    
     # 主持人（特殊处理final阶段）
     moderator_model = model_assignments.get('moderator_model', host_model)
     moderator = FinalModeratorAgent(
         name="主持人",
-        llm_config={"config_list": [{**base_config, "model": moderator_model}]},
-        system_message=get_moderator_message(actual_judges_count, max_free_debate_turns),
+        llm_config=get_llm_config(moderator_model),
+        system_message=partial(get_moderator_message, actual_judges_count, max_free_debate_turns, debate_sm.format),
         debate_sm=debate_sm,
         ui_callback=ui_callback,
     )
@@ -85,10 +99,12 @@ def create_agents(debate_topic, debate_sm, model_assignments=None, trait_assignm
         
         debater = DebaterAssistantAgent(
             name=f"正方辩手{i}",
-            llm_config={"config_list": [{**base_config, "model": pro_model}], "temperature": 0.5},
-            system_message=get_debater_message("pro", i, debate_topic, trait_name, trait_prompt),
+            llm_config=get_llm_config(pro_model, temperature=0.5),
+            system_message=partial(get_debater_message, "pro", i, debate_topic, trait_name, trait_prompt, debate_sm.format),
             debate_sm=debate_sm,
             ui_callback=ui_callback,
+            context_manager=context_manager,
+            speculator=speculator,
         )
         pro_debaters.append(debater)
     
@@ -129,13 +145,18 @@ def create_agents(debate_topic, debate_sm, model_assignments=None, trait_assignm
         
         debater = DebaterAssistantAgent(
             name=f"反方辩手{i}",
-            llm_config={"config_list": [{**base_config, "model": con_model}], "temperature": 0.5},
-            system_message=get_debater_message("con", i, debate_topic, trait_name, trait_prompt),
+            llm_config=get_llm_config(con_model, temperature=0.5),
+            system_message=partial(get_debater_message, "con", i, debate_topic, trait_name, trait_prompt, debate_sm.format),
             debate_sm=debate_sm,
             ui_callback=ui_callback,
+            context_manager=context_manager,
+            speculator=speculator,
         )
         con_debaters.append(debater)
     
+    if speculator is not None:
+        speculator.register(pro_debaters + con_debaters)
+    
     # 裁判（独立评分）
     judges = []
     # 获取预分配的裁判模型
@@ -146,11 +167,27 @@ def create_agents(debate_topic, debate_sm, model_assignments=None, trait_assignm
         print(f"Debug: 裁判{i}选择的模型: {current_judge_model}")
         judge = FilteredAssistantAgent(
             name=f"裁判{i}",
-            llm_config={"config_list": [{**base_config, "model": current_judge_model}]},
-            system_message=get_judge_message(),
+            llm_config=get_llm_config(current_judge_model),
+            system_message=get_judge_message,
             debate_sm=debate_sm,
             ui_callback=ui_callback,
         )
         judges.append(judge)
     
-    return moderator, pro_debaters, con_debaters, judges
\ No newline at end of file
+    return moderator, pro_debaters, con_debaters, judges
+
+
+def create_judge_panel(judges, debate_sm, ui_callback=None):
+    """创建裁判团，用于并行调度所有裁判独立评分
+
+    Args:
+        judges: create_agents 返回的裁判列表
+        debate_sm: 辩论状态机实例
+        ui_callback: 界面回调函数，裁判团按裁判编号顺序推送各裁判评分
+    """
+    return JudgePanelAgent(
+        name=JUDGE_PANEL_NAME,
+        judges=judges,
+        debate_sm=debate_sm,
+        ui_callback=ui_callback,
+    )
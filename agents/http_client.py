@@ -0,0 +1,128 @@
+import json
+import threading
+import time
+from collections import deque
+import requests
+from requests.adapters import HTTPAdapter
+from config import base_config, http_connect_timeout, http_read_timeout, http_pool_size
+
+# ============================================================================
+# 连接池HTTP客户端
+# ============================================================================
+class PooledHTTPClient:
+    """复用TCP/TLS连接的HTTP客户端，带超时控制和请求延迟统计"""
+
+    def __init__(self, base_url=None, api_key=None, connect_timeout=None, read_timeout=None, pool_size=None, sample_size=500):
+        self.base_url = base_url or base_config.get("base_url")
+        self.api_key = api_key or base_config.get("api_key")
+        self.timeout = (
+            connect_timeout if connect_timeout is not None else http_connect_timeout,
+            read_timeout if read_timeout is not None else http_read_timeout,
+        )
+        self.pool_size = pool_size or http_pool_size
+
+        # 连接池大小有上限，超出时阻塞等待空闲连接，避免无限制创建连接
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, pool_block=True)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "HTTP-Referer": "https://openrouter.ai/",
+        })
+
+        # 延迟统计
+        self._metrics_lock = threading.Lock()
+        self._latencies = deque(maxlen=sample_size)
+        self._requests = 0
+        self._errors = 0
+        self._total_latency = 0.0
+
+    def post_json(self, path, payload, timeout=None, **kwargs):
+        """向 base_url 下的接口发送 JSON 请求，返回 Response"""
+        url = f"{self.base_url}{path}"
+        start = time.perf_counter()
+        try:
+            response = self.session.post(url, json=payload, timeout=timeout or self.timeout, **kwargs)
+            response.raise_for_status()
+            return response
+        except Exception:
+            with self._metrics_lock:
+                self._errors += 1
+            raise
+        finally:
+            self._record(time.perf_counter() - start)
+
+    def chat_completion(self, payload, **kwargs):
+        """调用 /chat/completions 接口，返回解析后的 JSON"""
+        return self.post_json("/chat/completions", payload, **kwargs).json()
+
+    def stream_chat_completion(self, payload, usage=None, **kwargs):
+        """流式调用 /chat/completions 接口，逐段产出增量文本
+
+        传入 usage 字典时，流结束后会写入服务端返回的token用量
+        """
+        payload = {**payload, "stream": True, "stream_options": {"include_usage": True}}
+        response = self.post_json("/chat/completions", payload, stream=True, **kwargs)
+        # SSE 响应通常不带 charset，requests 会默认按 ISO-8859-1 解码
+        response.encoding = "utf-8"
+        with response:
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                if usage is not None and chunk.get("usage"):
+                    usage.update(chunk["usage"])
+                choices = chunk.get("choices") or []
+                if choices:
+                    content = (choices[0].get("delta") or {}).get("content")
+                    if content:
+                        yield content
+
+    def _record(self, latency):
+        with self._metrics_lock:
+            self._requests += 1
+            self._total_latency += latency
+            self._latencies.append(latency)
+
+    def get_metrics(self):
+        """获取请求延迟统计（单位：秒）"""
+        with self._metrics_lock:
+            samples = sorted(self._latencies)
+            requests_count = self._requests
+            errors = self._errors
+            total_latency = self._total_latency
+
+        def percentile(p):
+            if not samples:
+                return 0.0
+            return samples[min(len(samples) - 1, int(p * len(samples)))]
+
+        return {
+            "requests": requests_count,
+            "errors": errors,
+            "avg_latency": total_latency / requests_count if requests_count else 0.0,
+            "min_latency": samples[0] if samples else 0.0,
+            "max_latency": samples[-1] if samples else 0.0,
+            "p50_latency": percentile(0.5),
+            "p95_latency": percentile(0.95),
+        }
+
+    def reset_metrics(self):
+        """重置延迟统计"""
+        with self._metrics_lock:
+            self._latencies.clear()
+            self._requests = 0
+            self._errors = 0
+            self._total_latency = 0.0
+
+    def close(self):
+        """关闭连接池"""
+        self.session.close()
+
+# 全局共享的HTTP客户端（信息提取器及其他直接调用API的模块共用）
+http_client = PooledHTTPClient()
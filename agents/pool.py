@@ -0,0 +1,136 @@
+import json
+import threading
+from typing import Dict
+
+from autogen import OpenAIWrapper
+
+import config
+from instrumentation import add_usage
+from agents.prompt_caching import mark_cacheable_prefixes, get_cached_tokens
+
+# ============================================================================
+# llm_config 与客户端共享池
+# ============================================================================
+class PooledOpenAIWrapper(OpenAIWrapper):
+    """可在多个 Agent、多场辩论之间共享的 autogen 客户端
+
+    共享客户端的累计用量由多个 Agent 同时写入，无法再按调用前后取差值，
+    因此每次实际请求（非缓存命中）的用量直接记入当前进行中的调用。
+    开启提示词缓存时，请求前按模型所属服务商标记可缓存的前缀。
+    """
+
+    def __init__(self, **llm_config):
+        super().__init__(**llm_config)
+        self.model = llm_config["config_list"][0]["model"]
+        self._usage_lock = threading.Lock()
+        # 当前线程的请求是否实际发给了服务商（autogen 缓存命中时不是）
+        self._local = threading.local()
+
+    def create(self, **params):
+        if params.get("messages"):
+            params["messages"] = mark_cacheable_prefixes(params.get("model") or self.model, params["messages"])
+        self._local.requested = False
+        response = super().create(**params)
+        if self._local.requested and response.usage is not None:
+            add_usage(
+                response.usage.prompt_tokens,
+                response.usage.completion_tokens,
+                cached_tokens=get_cached_tokens(response.usage),
+            )
+        return response
+
+    def _update_usage(self, actual_usage, total_usage):
+        with self._usage_lock:
+            super()._update_usage(actual_usage, total_usage)
+        if actual_usage:
+            self._local.requested = True
+
+
+_lock = threading.Lock()
+# 配置内容 -> 共享的 llm_config
+_configs: Dict[str, Dict] = {}
+# 配置内容 -> 共享的客户端
+_clients: Dict[str, PooledOpenAIWrapper] = {}
+
+
+def _config_key(llm_config) -> str:
+    return json.dumps(llm_config, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def get_llm_config(model: str, temperature=None, **fields) -> Dict:
+    """获取模型对应的 llm_config，内容相同的配置共享同一个对象（只读，不能修改）
+
+    Args:
+        model: 模型名称
+        temperature: 为 None 时不设置
+        fields: llm_config 的其他顶层字段
+    """
+    llm_config = {"config_list": [{**config.base_config, "model": model}], **fields}
+    if temperature is not None:
+        llm_config["temperature"] = temperature
+    return intern_llm_config(llm_config)
+
+
+def intern_llm_config(llm_config: Dict) -> Dict:
+    """返回与 llm_config 内容相同的共享对象"""
+    key = _config_key(llm_config)
+    with _lock:
+        return _configs.setdefault(key, llm_config)
+
+
+def get_client(llm_config: Dict) -> PooledOpenAIWrapper:
+    """获取 llm_config 对应的共享客户端，第一次使用时创建"""
+    key = _config_key(llm_config)
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _clients[key] = PooledOpenAIWrapper(**llm_config)
+    return client
+
+
+def clear_pool():
+    """清空共享池（如修改了 base_config 之后），已创建的 Agent 仍持有原来的客户端"""
+    with _lock:
+        _configs.clear()
+        _clients.clear()
+
+
+def get_pool_stats() -> Dict:
+    with _lock:
+        return {"configs": len(_configs), "clients": len(_clients)}
+
+
+# ============================================================================
+# 使用共享客户端、按需渲染提示词的 Agent
+# ============================================================================
+class PooledAgentMixin:
+    """与 autogen Agent 一起继承，只通过 autogen 的公开接口接入共享池
+
+    - 构造时以 llm_config=False 跳过 autogen 自己创建客户端，之后再把共享池中的
+      llm_config 和客户端赋给 llm_config / client 属性
+    - system_message 可以传入无参函数，第一次调用模型前（ensure_system_message）
+      才渲染并通过 update_system_message 写入，从未发言的 Agent 不渲染
+    """
+
+    def __init__(self, name, llm_config, system_message, **kwargs):
+        self._system_message_factory = system_message if callable(system_message) else None
+        super().__init__(
+            name=name,
+            llm_config=False,
+            system_message="" if self._system_message_factory else system_message,
+            **kwargs,
+        )
+        if llm_config:
+            self.llm_config = intern_llm_config(llm_config)
+            self.client = get_client(self.llm_config)
+
+    def ensure_system_message(self):
+        """渲染尚未渲染的系统提示词，所有调用模型的路径都要先调用"""
+        factory = self._system_message_factory
+        if factory is not None:
+            self._system_message_factory = None
+            system_message = factory()
+            self.update_system_message(system_message)
+            self.description = system_message
@@ -0,0 +1,82 @@
+from functools import lru_cache
+
+import config
+from agents.prompts import PROMPT_TEMPLATES
+
+# ============================================================================
+# 服务商提示词缓存
+# ============================================================================
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def get_model_company(model):
+    """模型所属公司；不在 models_by_company 中的模型（如部分裁判模型）按服务商前缀归类"""
+    for company, models in config.models_by_company.items():
+        if model in models:
+            return company
+    vendor = model.split("/", 1)[0]
+    for company, models in config.models_by_company.items():
+        if any(m.split("/", 1)[0] == vendor for m in models):
+            return company
+    return None
+
+
+def get_caching_mode(model):
+    """模型的提示词缓存方式："explicit"、"auto"，未开启或不支持时为 None"""
+    if not config.prompt_caching_enabled:
+        return None
+    return config.prompt_caching_by_company.get(get_model_company(model))
+
+
+@lru_cache(maxsize=256)
+def split_static_prefix(text):
+    """按提示词模板把系统提示拆成 (静态前缀, 其余部分)，不是模板渲染的提示返回 ("", text)"""
+    best = ""
+    for template in PROMPT_TEMPLATES.values():
+        prefix = template.static_prefix
+        if len(prefix) > len(best) and text.startswith(prefix):
+            best = prefix
+    return best, text[len(best):]
+
+
+def _text_part(text):
+    return {"type": "text", "text": text, "cache_control": CACHE_CONTROL}
+
+
+def mark_cacheable_prefixes(model, messages):
+    """按服务商的要求标记请求中可缓存的前缀，返回新的消息列表（不修改传入的消息）
+
+    explicit 方式设置最多三个缓存断点：
+    - 系统提示的静态前缀：同一模板的所有 Agent、所有辩论共享
+    - 完整系统提示：同一 Agent 的每次发言共享
+    - 最后一条历史消息：对话历史只会追加，下一次发言可以复用此前的全部历史
+    auto 方式由服务商自动缓存相同前缀，原样返回。
+    """
+    if not messages or get_caching_mode(model) != "explicit":
+        return messages
+    marked = list(messages)
+
+    first = marked[0]
+    if first.get("role") == "system" and isinstance(first.get("content"), str) and first["content"]:
+        prefix, rest = split_static_prefix(first["content"])
+        parts = [_text_part(prefix), _text_part(rest)] if prefix and rest else [_text_part(first["content"])]
+        marked[0] = {**first, "content": parts}
+
+    last = marked[-1]
+    if len(marked) > 1 and isinstance(last.get("content"), str) and last["content"]:
+        marked[-1] = {**last, "content": [_text_part(last["content"])]}
+    return marked
+
+
+def get_cached_tokens(usage):
+    """从响应用量（对象或字典）中读取 prompt_tokens_details.cached_tokens，没有时为 0"""
+    if usage is None:
+        return 0
+    if isinstance(usage, dict):
+        details = usage.get("prompt_tokens_details")
+    else:
+        details = getattr(usage, "prompt_tokens_details", None)
+    if details is None:
+        return 0
+    cached = details.get("cached_tokens") if isinstance(details, dict) else getattr(details, "cached_tokens", None)
+    return cached or 0
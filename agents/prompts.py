@@ -1,57 +1,143 @@
+import string
+from functools import lru_cache
+
+import config
+from agents.tokens import estimate_tokens
+from debate_formats import get_compiled_format
+
 # ============================================================================
-# Agent配置函数
+# 提示词模板注册表
+# ============================================================================
+class PromptTemplate:
+    """注册时编译一次的提示词模板（str.format 语法）
+
+    static_prefix 为第一个占位符之前的文本，不随辩题、辩手等参数变化；
+    支持提示词缓存的服务商可以复用这段前缀，因此各模板都把静态规则放在最前面。
+    """
+
+    __slots__ = ("name", "text", "fields", "static_prefix")
+
+    def __init__(self, name, text):
+        self.name = name
+        self.text = text
+        parts = list(string.Formatter().parse(text))
+        self.fields = tuple(dict.fromkeys(field for _, field, _, _ in parts if field is not None))
+        prefix = []
+        for literal, field, _, _ in parts:
+            prefix.append(literal)
+            if field is not None:
+                break
+        self.static_prefix = "".join(prefix)
+
+    def render(self, **fields):
+        return self.text.format(**fields)
+
+
+PROMPT_TEMPLATES = {}
+
+
+def register_template(name, text):
+    """注册（或替换）一个提示词模板"""
+    template = PROMPT_TEMPLATES[name] = PromptTemplate(name, text)
+    _render.cache_clear()
+    return template
+
+
+@lru_cache(maxsize=config.prompt_render_cache_size)
+def _render(name, fields):
+    template = PROMPT_TEMPLATES[name]
+    text = template.render(**dict(fields))
+    stats = {
+        "template": name,
+        "tokens": estimate_tokens(text),
+        "static_tokens": estimate_tokens(template.static_prefix),
+    }
+    return text, stats
+
+
+def render_prompt(name, **fields):
+    """渲染提示词模板，相同参数的结果只渲染一次"""
+    return _render(name, tuple(sorted(fields.items())))[0]
+
+
+def get_prompt_stats(name, **fields):
+    """提示词的估算 token 数：{"template", "tokens", "static_tokens"}
+
+    与 render_prompt 共用同一份缓存，参数相同时不会重复渲染。
+    """
+    return dict(_render(name, tuple(sorted(fields.items())))[1])
+
+
+def get_render_cache_info():
+    return _render.cache_info()
+
+
+# ============================================================================
+# 提示词模板
 # ============================================================================
-def get_moderator_message(judges_count, max_free_debate_turns):
-    """主持人系统提示"""
-    return f"""你是一位专业的辩论主持人，严格按照辩论流程控制辩论进行。
+# 阶段宣布、赛制流程和轮数限制由本场赛制生成（见 get_moderator_message）
+register_template("moderator", """你是一位专业的辩论主持人，严格按照辩论流程控制辩论进行。
 
 你的核心职责：
-1. **开场介绍**：辩论开始时，简洁介绍辩题和完整辩论规则（包括自由辩论轮数）
+1. **开场介绍**：辩论开始时，简洁介绍辩题和完整辩论规则（包括各环节的发言轮数）
 2. **阶段宣布**：在每个阶段开始和结束时明确宣布，包括：
-   - 开场陈述阶段开始："现在进入开场陈述环节"
-   - 自由辩论阶段开始："现在进入自由辩论环节，双方共有{max_free_debate_turns}轮（即各发言{max_free_debate_turns/2}次）交锋机会"
-   - 自由辩论阶段结束："自由辩论环节已结束，现在进入总结陈词环节"
-   - 总结陈词阶段结束："总结陈词环节已结束，现在请{judges_count}位裁判进行独立评分"
+{phase_announcements}
 3. **最终裁决**：在收到所有裁判评分后，综合评分结果，明确宣布获胜方及理由
 
+本场赛制（{format_label}）流程：
+{format_rules}
+
 关键规则：
-- **严格阶段控制**：必须在正确的时间点宣布阶段转换，绝对不能在自由辩论轮数已满时让辩论继续
-- **信息准确性**：裁判人数为{judges_count}位，自由辩论最大轮数为{max_free_debate_turns}轮
+- **严格阶段控制**：必须在正确的时间点宣布阶段转换，绝对不能在发言轮数已满时让辩论继续
+- **信息准确性**：裁判人数为{judges_count}位{turn_limits}
 - **中立性**：只负责流程控制，不参与任何辩论内容或表达个人观点
 - **简洁性**：每次发言控制在2-3句话，语言清晰、明确
 - **语言要求**：全程使用中文主持，保持专业、中立的语气
 
 注意事项：
 - 明确宣布当前正在进行的阶段，避免模糊表述
-- 自由辩论轮数一旦用完，立即宣布进入总结陈词环节
-- 确保所有裁判完成评分后，再进行最终裁决
+{turn_limit_notes}- 确保所有裁判完成评分后，再进行最终裁决
 - 严格遵守上述所有要求，不得偏离你的职责范围
-"""
-def get_debater_message(side, number, topic, trait_name="", trait_prompt=""):
-    """AutoGen GroupChat · 主持人驱动的专业辩手（赛制语境版）"""
-
-    side_text = "支持" if side == "pro" else "反对"
-    side_name = "正方" if side == "pro" else "反方"
+""")
 
-    # 构建特质部分
-    trait_section = ""
-    if trait_name and trait_prompt:
-        trait_section = f"""
-====================
-【个人辩论风格：{trait_name}】
-====================
-{trait_prompt}
-"""
+# 辩手在各阶段（按阶段标识）的行为要求，赛制中的其他阶段只列出阶段说明
+PHASE_BEHAVIORS = {
+    "opening": (
+        "只做立场陈述与论证框架搭建",
+        "提出中心论点与主要论据",
+        "不针对对方发言进行反驳",
+        "不进行总结或胜负判断",
+        "显式指出自己发言完毕",
+    ),
+    "cross_examination": (
+        "提问时问题简短、具体，每次只问一个问题，围绕对方论证的薄弱环节",
+        "回答时直接回应问题，不回避、不反问",
+        "不进行长篇陈述或总结",
+    ),
+    "free_debate": (
+        "**使用短句，一句一攻防点**",
+        "必须针对对方最近一轮观点发言",
+        "以反驳、质疑、拆解逻辑为主",
+        "不系统性回顾全局",
+    ),
+    "rebuttal": (
+        "针对对方立论和质询中暴露的问题逐一反驳",
+        "重建我方被攻击的论点",
+        "不提出新的论证框架",
+    ),
+    "closing": (
+        "回顾对方核心漏洞",
+        "强调我方最强论点",
+        "给出明确的价值判断",
+        "**禁止**提出任何新论点或追问",
+    ),
+}
 
-    return f"""
+# 与赛制无关的规则在前，之后依次是本场赛制的阶段规则（见 get_debater_message）和本场身份、立场、特质
+register_template("debater", """
 你是一名**专业辩手**，正在参加一场**正式的辩论赛**。
 本场比赛设有**主持人、明确的辩论阶段和评判标准**，你需要严格遵守赛制要求发言。
 
-在本场辩论中：
-- 你是 **[{side_name}辩手{number}]**
-- 你的固定立场是：**{side_text}《{topic}》**
-
-{trait_section}
 ====================
 【最高优先级指令：主持人协议】
 ====================
@@ -61,37 +147,6 @@ def get_debater_message(side, number, topic, trait_name="", trait_prompt=""):
 - 如有冲突，以主持人指令为准
 - **严禁输出你的思考，即仅允许直接输出发言内容**
 
-====================
-【阶段—行为强绑定规则】
-====================
-
-▶ 当主持人宣布【开场陈述 / 立论 / 开篇陈词】：
-- 只做立场陈述与论证框架搭建
-- 提出中心论点与主要论据
-- 不针对对方发言进行反驳
-- 不进行总结或胜负判断
-- 显式指出自己发言完毕
-
-▶ 当主持人宣布【自由辩论 / 攻防环节】：
-- **使用短句，一句一攻防点**
-- 必须针对对方最近一轮观点发言
-- 以反驳、质疑、拆解逻辑为主
-- 不系统性回顾全局
-
-▶ 当主持人宣布【总结陈词 / 结辩 / 最后发言】：
-- 回顾对方核心漏洞
-- 强调我方最强论点
-- 给出明确的价值判断
-- **禁止**提出任何新论点或追问
-
-====================
-【身份与立场硬约束】
-====================
-- 始终代表 **{side_name}** 立场
-- **严禁**认可、赞同或替对方补充论证
-- 不模糊、不折中、不价值中立
-- 不引入与辩题无关的内容
-
 ====================
 【辩论语言风格】
 ====================
@@ -106,16 +161,33 @@ def get_debater_message(side, number, topic, trait_name="", trait_prompt=""):
 - 逻辑清晰，因果自洽
 - 不虚构具体数据或权威来源
 
+====================
+【阶段—行为强绑定规则】
+====================
+{phase_cues}
+====================
+【本场身份】
+====================
+在本场辩论中：
+- 你是 **[{side_name}辩手{number}]**
+- 你的固定立场是：**{side_text}《{topic}》**
+
+{trait_section}
+====================
+【身份与立场硬约束】
+====================
+- 始终代表 **{side_name}** 立场
+- **严禁**认可、赞同或替对方补充论证
+- 不模糊、不折中、不价值中立
+- 不引入与辩题无关的内容
+
 ====================
 请你**严格依据主持人宣布的阶段发言**。
 用**中文**输出，不附加任何说明。
 
-"""
-
+""")
 
-def get_judge_message():
-    """裁判系统提示"""
-    return """你是一位资深的辩论赛裁判。你将独立评分，不受其他裁判影响。
+register_template("judge", """你是一位资深的辩论赛裁判。你将独立评分，不受其他裁判影响。
 
 评分标准（总分10分）：
 1. 论点质量（3分）：论据是否充分、有说服力
@@ -136,4 +208,184 @@ def get_judge_message():
 【结论】我认为[正方/反方]获胜，因为...
 
 用中文评判。
-"""
\ No newline at end of file
+""")
+
+register_template("judge_structured", """你是一位资深的辩论赛裁判。你将独立评分，不受其他裁判影响。
+
+评分标准（总分10分）：
+1. argument 论点质量（0-3分）：论据是否充分、有说服力
+2. logic 逻辑严密性（0-3分）：推理是否合理、前后一致
+3. rebuttal 反驳能力（0-2分）：能否有效回应对方论点
+4. clarity 表达清晰度（0-2分）：语言组织和陈述能力
+
+评分要求：
+- 分别对正方和反方的每一项打分，可以使用0.5分
+- 明确说明你认为哪一方获胜
+- 保持客观公正，独立判断
+
+输出格式：只输出一个 JSON 对象，不要输出任何其他内容：
+{{"pro": {{"argument": 分数, "logic": 分数, "rebuttal": 分数, "clarity": 分数}},
+ "con": {{"argument": 分数, "logic": 分数, "rebuttal": 分数, "clarity": 分数}},
+ "winner": "正方" 或 "反方",
+ "pro_comment": "正方表现（1-2句话）",
+ "con_comment": "反方表现（1-2句话）",
+ "reason": "获胜理由（1句话）"}}
+
+文字部分用中文。
+""")
+
+
+# ============================================================================
+# Agent配置函数
+# ============================================================================
+def _default_format(judges_count=None, max_free_debate_turns=None):
+    """未传入赛制时使用 config 中的当前赛制"""
+    return get_compiled_format(
+        config.debate_format,
+        config.debaters_per_side,
+        config.judges_count if judges_count is None else judges_count,
+        config.max_free_debate_turns if max_free_debate_turns is None else max_free_debate_turns,
+        config.parallel_judging,
+    )
+
+
+def _format_turns(turns):
+    """双方共有 N 轮（即各发言 N/2 次）"""
+    return f"{turns}轮（即各发言{turns / 2:g}次）"
+
+
+def _announced_phases(debate_format):
+    """需要主持人宣布开始的阶段及其上一个阶段：[(上一个阶段或 None, 阶段, 角色集合)]
+
+    只由主持人发言的阶段（主持人介绍、宣布结果）不需要宣布；第一个辩论阶段由主持人介绍时引出，
+    之后的阶段只有赛制要求宣布（announce）时主持人才会发言。
+    """
+    announced = []
+    previous = None
+    for phase, roles in zip(debate_format.phases, debate_format.get_phase_roles()):
+        if roles <= {"moderator"}:
+            continue
+        if previous is None or phase["announce"]:
+            announced.append((previous, phase, roles))
+        previous = phase
+    return announced
+
+
+def _moderator_fields(debate_format, judges_count):
+    """主持人提示中由赛制生成的部分：阶段宣布、赛制流程和轮数限制"""
+    announcements = []
+    for previous, phase, roles in _announced_phases(debate_format):
+        if "judge" in roles:
+            text = f"现在请{judges_count}位裁判进行独立评分"
+        else:
+            text = f"现在进入{phase['label']}环节"
+            if phase["turns"]:
+                text += f"，双方共有{_format_turns(phase['turns'])}交锋机会"
+        if previous is not None:
+            text = f"{previous['label']}环节已结束，{text}"
+        announcements.append(f'   - {phase["label"]}阶段开始："{text}"')
+
+    turn_limits = []
+    turn_limit_notes = []
+    phases = debate_format.phases
+    for index, phase in enumerate(phases):
+        if not phase["turns"]:
+            continue
+        turn_limits.append(f"，{phase['label']}最大轮数为{phase['turns']}轮")
+        if index + 1 < len(phases):
+            turn_limit_notes.append(f"- {phase['label']}轮数一旦用完，立即宣布进入{phases[index + 1]['label']}环节\n")
+
+    return {
+        "phase_announcements": "\n".join(announcements),
+        "format_label": debate_format.label,
+        "format_rules": "\n".join(f"{i}. {rule}" for i, rule in enumerate(debate_format.rules, 1)),
+        "turn_limits": "".join(turn_limits),
+        "turn_limit_notes": "".join(turn_limit_notes),
+    }
+
+
+def _phase_cues(debate_format):
+    """辩手提示中的阶段—行为规则：按阶段标识合并，列出阶段名称、赛制说明、轮数和行为要求"""
+    cues = {}
+    for phase, roles in zip(debate_format.phases, debate_format.get_phase_roles()):
+        if not roles & {"pro", "con"}:
+            continue
+        cue = cues.setdefault(phase["id"], {"labels": [], "rules": [], "turns": None})
+        if phase["label"] not in cue["labels"]:
+            cue["labels"].append(phase["label"])
+        if phase["rule"]:
+            cue["rules"].append(phase["rule"])
+        if phase["turns"]:
+            cue["turns"] = phase["turns"]
+
+    blocks = []
+    for phase_id, cue in cues.items():
+        lines = [f"▶ 当主持人宣布【{' / '.join(cue['labels'])}】："]
+        lines.extend(f"- 赛制：{rule}" for rule in cue["rules"])
+        if cue["turns"]:
+            lines.append(f"- 本环节双方共{_format_turns(cue['turns'])}，轮数用完即结束")
+        lines.extend(f"- {behavior}" for behavior in PHASE_BEHAVIORS.get(phase_id, ()))
+        blocks.append("\n".join(lines) + "\n")
+    return "\n".join(blocks)
+
+
+def get_moderator_message(judges_count, max_free_debate_turns, debate_format=None):
+    """主持人系统提示
+
+    Args:
+        debate_format: 编译后的赛制（CompiledFormat），默认为 config 中的当前赛制
+    """
+    if debate_format is None:
+        debate_format = _default_format(judges_count, max_free_debate_turns)
+    return render_prompt("moderator", judges_count=judges_count, **_moderator_fields(debate_format, judges_count))
+
+
+def get_debater_message(side, number, topic, trait_name="", trait_prompt="", debate_format=None):
+    """AutoGen GroupChat · 主持人驱动的专业辩手（赛制语境版）
+
+    Args:
+        debate_format: 编译后的赛制（CompiledFormat），默认为 config 中的当前赛制
+    """
+
+    side_text = "支持" if side == "pro" else "反对"
+    side_name = "正方" if side == "pro" else "反方"
+
+    # 构建特质部分
+    trait_section = ""
+    if trait_name and trait_prompt:
+        trait_section = f"""
+====================
+【个人辩论风格：{trait_name}】
+====================
+{trait_prompt}
+"""
+
+    if debate_format is None:
+        debate_format = _default_format()
+    return render_prompt(
+        "debater",
+        phase_cues=_phase_cues(debate_format),
+        side_name=side_name,
+        side_text=side_text,
+        number=number,
+        topic=topic,
+        trait_section=trait_section,
+    )
+
+
+def get_judge_message(structured=None):
+    """裁判系统提示
+
+    Args:
+        structured: 是否要求 JSON 格式的结构化评分，默认跟随 config.structured_verdicts_enabled
+    """
+    if structured is None:
+        structured = config.structured_verdicts_enabled
+    if structured:
+        return get_structured_judge_message()
+    return render_prompt("judge")
+
+
+def get_structured_judge_message():
+    """裁判系统提示（结构化评分，输出 JSON）"""
+    return render_prompt("judge_structured")
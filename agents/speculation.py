@@ -0,0 +1,90 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# ============================================================================
+# 开场陈述预生成
+# ============================================================================
+class OpeningSpeculator:
+    """开场陈述阶段提前生成下一位辩手的发言
+
+    开场顺序固定（正1 反1 正2 反2 ...），且开场陈述不依赖对方刚刚的发言（赛制中标记为 independent 的阶段），
+    因此在当前辩手发言的同时，用下一位辩手此刻可见的历史快照预先生成其开场陈述。
+    轮到该辩手发言且历史与快照一致（快照是当前历史的前缀）时直接采用预生成结果，
+    否则丢弃，按正常流程重新生成。
+    """
+
+    def __init__(self, debate_sm, max_workers=2):
+        self.debate_sm = debate_sm
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="opening-speculation")
+        self._lock = threading.Lock()
+        # 辩手名称 -> Agent
+        self.agents = {}
+        # 辩手名称 -> (future, 历史快照)
+        self._pending = {}
+        self.stats = {"started": 0, "committed": 0, "discarded": 0}
+
+    def register(self, agents):
+        """登记可以预生成的辩手"""
+        for agent in agents:
+            self.agents[agent.name] = agent
+
+    def prefetch_next(self, sender):
+        """当前处于开场陈述阶段时，为下一位辩手启动预生成"""
+        agent = self.agents.get(self.debate_sm.get_next_opening_speaker())
+        if agent is None:
+            return
+
+        with self._lock:
+            if agent.name in self._pending:
+                return
+            snapshot = list(agent.chat_messages[sender])
+            future = self._pool.submit(agent.generate_speculative, sender, snapshot)
+            self._pending[agent.name] = (future, snapshot)
+            self.stats["started"] += 1
+        print(f"Debug: 预生成 {agent.name} 的开场陈述")
+
+    def take(self, agent, sender):
+        """轮到 agent 发言时取出预生成结果，不可用时返回 None"""
+        with self._lock:
+            entry = self._pending.pop(agent.name, None)
+        if entry is None:
+            return None
+
+        future, snapshot = entry
+        current = agent.chat_messages[sender]
+        if len(snapshot) > len(current) or current[:len(snapshot)] != snapshot:
+            future.cancel()
+            self._count("discarded")
+            print(f"Debug: {agent.name} 的历史已变化，丢弃预生成结果")
+            return None
+
+        try:
+            result = future.result()
+        except Exception as e:
+            self._count("discarded")
+            print(f"Debug: {agent.name} 预生成失败，重新生成: {e}")
+            return None
+
+        if not result:
+            self._count("discarded")
+            return None
+        self._count("committed")
+        return result
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats)
+
+    def shutdown(self):
+        """辩论结束时丢弃所有未采用的预生成"""
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+            self.stats["discarded"] += len(pending)
+        for future, _ in pending:
+            future.cancel()
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,20 @@
+import re
+
+# ============================================================================
+# Token估算
+# ============================================================================
+# 中日韩字符大致一个字符对应一个token，其余文本大约四个字符一个token
+_CJK_RE = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+
+
+def estimate_tokens(text):
+    """粗略估算文本的token数量（无需加载分词器）"""
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def estimate_messages_tokens(messages):
+    """估算消息列表的token数量，每条消息额外计入少量格式开销"""
+    return sum(estimate_tokens(m.get("content") if isinstance(m.get("content"), str) else "") + 4 for m in messages)
@@ -0,0 +1,224 @@
+import json
+import re
+import statistics
+from collections import Counter
+
+import config
+
+# ============================================================================
+# 裁判评分解析
+# ============================================================================
+# 评分项：(字段名, 中文名称, 满分)，与裁判提示词中的评分标准一致
+CRITERIA = (
+    ("argument", "论点质量", 3),
+    ("logic", "逻辑严密性", 3),
+    ("rebuttal", "反驳能力", 2),
+    ("clarity", "表达清晰度", 2),
+)
+MAX_TOTAL = sum(max_score for _, _, max_score in CRITERIA)
+
+SIDE_NAMES = {"pro": "正方", "con": "反方"}
+_WINNER_ALIASES = {"正方": "pro", "pro": "pro", "反方": "con", "con": "con", "平局": "tie", "tie": "tie"}
+
+# 自由文本格式：【评分】正方 8分，反方 7分
+_SCORE_RE = re.compile(
+    r"【评分】[^\n]*?正方\s*[:：]?\s*(\d+(?:\.\d+)?)\s*分?[^\n]*?反方\s*[:：]?\s*(\d+(?:\.\d+)?)"
+)
+_WINNER_RE = re.compile(r"【结论】[^\n]*?(正方|反方)\s*(?:获胜|胜出|胜)")
+_JSON_OBJECT_RE = re.compile(r"\{.*\}", re.S)
+
+
+def _to_score(value, max_score):
+    """把评分转换为 [0, 满分] 内的数字，无法转换时返回 None"""
+    try:
+        score = float(value)
+    except (TypeError, ValueError):
+        return None
+    return min(max(score, 0.0), float(max_score))
+
+
+def _parse_json_verdict(text):
+    """解析 JSON 格式的评分，不是有效的评分 JSON 时返回 None"""
+    match = _JSON_OBJECT_RE.search(text)
+    if not match:
+        return None
+    try:
+        data = json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get("pro"), dict) or not isinstance(data.get("con"), dict):
+        return None
+
+    verdict = {"structured": True}
+    for side in ("pro", "con"):
+        scores = {}
+        for key, _, max_score in CRITERIA:
+            score = _to_score(data[side].get(key), max_score)
+            if score is None:
+                return None
+            scores[key] = score
+        verdict[side] = scores
+        verdict[f"{side}_total"] = sum(scores.values())
+    verdict["winner"] = _WINNER_ALIASES.get(str(data.get("winner", "")).strip().lower())
+    verdict["pro_comment"] = str(data.get("pro_comment", ""))
+    verdict["con_comment"] = str(data.get("con_comment", ""))
+    verdict["reason"] = str(data.get("reason", ""))
+    return verdict
+
+
+def _parse_text_verdict(text):
+    """从【评分】【结论】文本中解析总分和获胜方，解析不到分数时返回 None"""
+    match = _SCORE_RE.search(text)
+    if not match:
+        return None
+    verdict = {
+        "structured": False,
+        "pro": None,
+        "con": None,
+        "pro_total": _to_score(match.group(1), MAX_TOTAL),
+        "con_total": _to_score(match.group(2), MAX_TOTAL),
+        "winner": None,
+        "reason": "",
+    }
+    winner = _WINNER_RE.search(text)
+    if winner:
+        verdict["winner"] = _WINNER_ALIASES[winner.group(1)]
+    return verdict
+
+
+def parse_verdict(text):
+    """解析一位裁判的评分，优先按 JSON 解析，失败时按【评分】文本解析
+
+    Returns:
+        dict: {"structured", "pro", "con", "pro_total", "con_total", "winner", "reason", ...}，
+        pro / con 为各评分项得分（文本格式时为 None）；无法解析时返回 None
+    """
+    if not text:
+        return None
+    verdict = _parse_json_verdict(text) or _parse_text_verdict(text)
+    if verdict is not None and verdict["winner"] is None:
+        # 没有明确获胜方时按总分判断
+        difference = verdict["pro_total"] - verdict["con_total"]
+        verdict["winner"] = "pro" if difference > 0 else "con" if difference < 0 else "tie"
+    return verdict
+
+
+def render_verdict(verdict):
+    """把结构化评分渲染为界面显示的文本（保留【评分】格式，便于按文本再次解析）"""
+    lines = []
+    for side in ("pro", "con"):
+        details = "，".join(
+            f"{label} {verdict[side][key]:g}/{max_score}" for key, label, max_score in CRITERIA
+        )
+        comment = verdict.get(f"{side}_comment")
+        lines.append(f"【{SIDE_NAMES[side]}表现】{comment + '（' if comment else ''}{details}{'）' if comment else ''}")
+    lines.append(f"【评分】正方 {verdict['pro_total']:g}分，反方 {verdict['con_total']:g}分")
+    winner = SIDE_NAMES.get(verdict["winner"])
+    conclusion = f"我认为{winner}获胜" if winner else "我认为双方打平"
+    if verdict.get("reason"):
+        conclusion += f"，因为{verdict['reason']}"
+    lines.append(f"【结论】{conclusion}")
+    return "\n".join(lines)
+
+
+def record_verdict(debate_sm, judge_name, text):
+    """解析裁判评分并记入状态机，返回用于显示和记录的文本
+
+    开启结构化评分时，JSON 评分渲染为可读文本；其余情况原样返回。
+    """
+    verdict = parse_verdict(text)
+    if debate_sm is not None:
+        debate_sm.judge_verdicts[judge_name] = verdict
+    if verdict is not None and verdict["structured"] and config.structured_verdicts_enabled:
+        return render_verdict(verdict)
+    return text
+
+
+# ============================================================================
+# 评分汇总
+# ============================================================================
+def aggregate_verdicts(verdicts):
+    """在本地汇总各裁判评分
+
+    Args:
+        verdicts: {裁判名称: parse_verdict 的结果}，无法解析的评分为 None
+
+    Returns:
+        dict: 双方平均分、中位数、各评分项平均分、投票数、获胜方和置信度；
+        没有可用评分时返回 None
+    """
+    valid = {name: v for name, v in verdicts.items() if v is not None}
+    if not valid:
+        return None
+
+    pro_totals = [v["pro_total"] for v in valid.values()]
+    con_totals = [v["con_total"] for v in valid.values()]
+    votes = Counter(v["winner"] for v in valid.values())
+    pro_mean = statistics.mean(pro_totals)
+    con_mean = statistics.mean(con_totals)
+
+    # 多数票决定获胜方，票数相同时按平均分，仍相同则为平局
+    if votes["pro"] != votes["con"]:
+        winner = "pro" if votes["pro"] > votes["con"] else "con"
+    elif pro_mean != con_mean:
+        winner = "pro" if pro_mean > con_mean else "con"
+    else:
+        winner = "tie"
+
+    # 各评分项平均分（只统计结构化评分）
+    structured = [v for v in valid.values() if v["structured"]]
+    criteria = {}
+    if structured:
+        for side in ("pro", "con"):
+            criteria[side] = {
+                key: statistics.mean(v[side][key] for v in structured) for key, _, _ in CRITERIA
+            }
+
+    return {
+        "judges": len(valid),
+        "missing": sorted(name for name, v in verdicts.items() if v is None),
+        "pro_mean": pro_mean,
+        "con_mean": con_mean,
+        "pro_median": statistics.median(pro_totals),
+        "con_median": statistics.median(con_totals),
+        "criteria": criteria,
+        "votes": {"pro": votes["pro"], "con": votes["con"], "tie": votes["tie"]},
+        "winner": winner,
+        # 置信度：判获胜方赢的裁判占比
+        "confidence": votes[winner] / len(valid) if winner != "tie" else votes["tie"] / len(valid),
+    }
+
+
+def format_final_announcement(aggregate):
+    """按汇总结果生成主持人的最终裁决（不调用模型）"""
+    lines = [
+        f"感谢{aggregate['judges']}位裁判的独立评分，现在宣布本场辩论结果。",
+        f"正方平均得分 {aggregate['pro_mean']:.1f} 分（中位数 {aggregate['pro_median']:g} 分），"
+        f"反方平均得分 {aggregate['con_mean']:.1f} 分（中位数 {aggregate['con_median']:g} 分）。",
+        f"{aggregate['votes']['pro']}位裁判判正方获胜，{aggregate['votes']['con']}位裁判判反方获胜"
+        + (f"，{aggregate['votes']['tie']}位裁判判平局。" if aggregate["votes"]["tie"] else "。"),
+    ]
+    if aggregate["criteria"]:
+        strengths = []
+        for side in ("pro", "con"):
+            best_key, best_label, best_max = max(CRITERIA, key=lambda c: aggregate["criteria"][side][c[0]] / c[2])
+            strengths.append(f"{SIDE_NAMES[side]}在{best_label}上表现最好（平均 {aggregate['criteria'][side][best_key]:.1f}/{best_max}）")
+        lines.append("，".join(strengths) + "。")
+    if aggregate["missing"]:
+        lines.append(f"{'、'.join(aggregate['missing'])}的评分无法解析，未计入统计。")
+    if aggregate["winner"] == "tie":
+        lines.append("双方得分与票数完全相同，本场辩论为平局。")
+    else:
+        lines.append(f"本场辩论的获胜方是：{SIDE_NAMES[aggregate['winner']]}！（裁判一致率 {aggregate['confidence']:.0%}）")
+    return "\n".join(lines)
+
+
+def get_template_announcement(debate_sm):
+    """最终裁决使用模板时返回主持人的宣布内容，否则返回 None（由模型生成）"""
+    if config.final_announcement_mode != "template" or debate_sm is None or debate_sm.state != "final":
+        return None
+    aggregate = aggregate_verdicts(debate_sm.judge_verdicts)
+    if aggregate is None:
+        # 没有可解析的评分时仍由模型综合
+        return None
+    return format_final_announcement(aggregate)
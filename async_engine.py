@@ -0,0 +1,329 @@
+"""
+基于 asyncio 的辩论引擎
+与 main.run_debate 使用同一个 DebateStateMachine、同样的 Agent 配置和界面回调事件，
+但所有大模型调用均为异步调用，一个事件循环可以同时承载多场辩论：
+
+    async def run_all(topics):
+        client = create_async_client()
+        return await asyncio.gather(*(
+            async_run_debate(topic, callback, client=client) for topic in topics
+        ))
+"""
+
+import asyncio
+import time
+from openai import AsyncOpenAI
+from agents.cache import get_response_cache
+from agents.extractor import extractor
+from agents.factory import create_agents, create_judge_panel
+from config import base_config, http_read_timeout, update_config
+import config
+from debate_state import DebateStateMachine, JUDGE_PANEL_NAME
+from debate_formats import VisibilityView
+from error_handler import handle_debate_error, log_debate_error
+from instrumentation import recorder, set_call_context, add_usage
+from main import build_assignments, get_opening_message, INITIATOR_NAME
+from checkpoint import DebateCheckpoint
+from agents.verdicts import record_verdict, get_template_announcement
+from retry_policy import retry_policy
+from model_router import model_router
+from agents.prompt_caching import mark_cacheable_prefixes, get_cached_tokens
+
+# 与 run_debate 中 GroupChat 的设置保持一致
+MAX_ROUND = 50
+
+
+def create_async_client():
+    """创建异步 OpenAI 兼容客户端（同一事件循环内的多场辩论可共享）"""
+    return AsyncOpenAI(
+        base_url=base_config.get("base_url"),
+        api_key=base_config.get("api_key"),
+        timeout=http_read_timeout,
+        max_retries=base_config.get("max_retries", 0),
+    )
+
+
+class _Roster:
+    """提供给状态机的参与者列表，与 GroupChat.agents 接口一致"""
+
+    def __init__(self, agents):
+        self.agents = agents
+
+
+class _Participant:
+    """不参与生成的发言者（如辩论发起人），仅供状态机读取名称"""
+
+    def __init__(self, name):
+        self.name = name
+
+
+# ============================================================================
+# 异步辩论引擎
+# ============================================================================
+class AsyncDebateEngine:
+    """按 DebateStateMachine 的阶段驱动辩论，所有大模型调用均为异步"""
+
+    def __init__(self, debate_topic, ui_callback, debate_sm, moderator, pro_debaters, con_debaters, judges, client=None, checkpoint=None):
+        self.debate_topic = debate_topic
+        self.ui_callback = ui_callback
+        self.debate_sm = debate_sm
+        self.moderator = moderator
+        self.judges = judges
+        self.client = client or create_async_client()
+        # 每轮发言结束后写入检查点（格式与同步引擎相同，可用 main.resume_debate 恢复）
+        self.checkpoint = checkpoint
+
+        agents = [moderator] + pro_debaters + con_debaters + judges
+        if debate_sm.parallel_judging:
+            agents.append(create_judge_panel(judges, debate_sm))
+        self.roster = _Roster(agents)
+
+        # 与 groupchat.messages 结构相同的消息记录
+        self.messages = []
+        # 各 Agent 视角下的对话历史（增量维护）
+        self._views = {}
+
+    async def run(self, opening_message):
+        """执行整场辩论，返回完整消息记录"""
+        self.messages.append({"content": opening_message, "name": INITIATOR_NAME, "role": "user"})
+        last_speaker = _Participant(INITIATOR_NAME)
+
+        for _ in range(MAX_ROUND - 1):
+            if self.checkpoint is not None:
+                self.checkpoint.commit(self.messages, self.debate_sm)
+            speaker = self.debate_sm.next_speaker(last_speaker, self.roster)
+            if speaker is None:
+                break
+
+            if speaker.name == JUDGE_PANEL_NAME:
+                content = await self._judge_panel_reply()
+            elif speaker is self.moderator:
+                content = await self._moderator_reply()
+            elif speaker in self.judges:
+                content = await self._judge_reply(speaker)
+            else:
+                content = await self._debater_reply(speaker)
+
+            self.messages.append({"content": content, "name": speaker.name, "role": "user"})
+            last_speaker = speaker
+
+        self.debate_sm.timeline.finish()
+        if self.checkpoint is not None and self.debate_sm.state == "end":
+            self.checkpoint.complete()
+        return self.messages
+
+    # ------------------------------------------------------------------
+    # 各角色回复（与 agents/custom_agents.py 中的同步实现保持一致）
+    # ------------------------------------------------------------------
+    async def _moderator_reply(self):
+        agent = self.moderator
+        try:
+            # 最终裁决使用模板时直接按本地汇总的评分宣布，不调用模型
+            extracted_reply = get_template_announcement(self.debate_sm)
+            if extracted_reply is None:
+                extracted_reply = await self._generate(agent, self._visible_messages(agent))
+            if extracted_reply and self.ui_callback:
+                self.ui_callback(agent.name, extracted_reply)
+            return "[主持人]:" + extracted_reply
+        except Exception as e:
+            log_debate_error(agent.name, e, "AsyncDebateEngine._moderator_reply")
+            if self.ui_callback:
+                self.ui_callback("系统", f"[{agent.name}] 生成回复时发生错误")
+            return "[主持人]: 当前无法正常回复"
+
+    async def _debater_reply(self, agent):
+        try:
+            messages = self._visible_messages(agent)
+            set_call_context(self.debate_sm.debate_id, agent.name, self.debate_sm.state)
+            # 开启上下文窗口时使用精简后的历史（生成摘要可能触发同步网络请求）
+            if agent.context_manager is not None:
+                messages = await asyncio.to_thread(agent.context_manager.build_view, messages)
+            extracted_reply = await self._generate(agent, messages)
+
+            # Ensure we always have a meaningful response
+            if not extracted_reply:
+                extracted_reply = "我正在思考这个问题，但暂时无法给出完整的回复。"
+                print(f"使用默认回复: {extracted_reply}")
+
+            if self.ui_callback:
+                self.ui_callback(agent.name, extracted_reply)
+
+            stateName = self.debate_sm.get_state_name()
+            return f"[{stateName}-{agent.name}]: {extracted_reply}"
+        except Exception as e:
+            log_debate_error(agent.name, e, "AsyncDebateEngine._debater_reply")
+            if self.ui_callback:
+                self.ui_callback("系统", f"[{agent.name}] 生成回复时发生错误")
+            stateName = self.debate_sm.get_state_name()
+            return f"[{stateName}-{agent.name}]: 当前无法正常回复"
+
+    async def _judge_reply(self, agent):
+        try:
+            extracted_reply = record_verdict(self.debate_sm, agent.name, await self._generate(agent, self._visible_messages(agent)))
+            if extracted_reply and self.ui_callback:
+                self.ui_callback(agent.name, extracted_reply)
+            return f"[{agent.name}]: {extracted_reply}"
+        except Exception as e:
+            log_debate_error(agent.name, e, "AsyncDebateEngine._judge_reply")
+            if self.ui_callback:
+                self.ui_callback("系统", f"[{agent.name}] 消息过滤过程中发生错误")
+            return f"[{agent.name}]: 当前无法正常回复"
+
+    async def _judge_panel_reply(self):
+        """所有裁判同时评分，按裁判顺序汇总"""
+        results = await asyncio.gather(
+            *(self._timed_verdict(judge) for judge in self.judges),
+            return_exceptions=True,
+        )
+
+        verdicts = []
+        for judge, verdict in zip(self.judges, results):
+            if isinstance(verdict, Exception):
+                log_debate_error(judge.name, verdict, "AsyncDebateEngine._judge_panel_reply")
+                if self.ui_callback:
+                    self.ui_callback("系统", f"[{judge.name}] 消息过滤过程中发生错误")
+                verdict = "当前无法正常回复"
+            verdict = record_verdict(self.debate_sm, judge.name, verdict)
+            self.debate_sm.judge_scores[judge.name] = verdict
+            if verdict and self.ui_callback:
+                self.ui_callback(judge.name, verdict)
+            verdicts.append(f"[{judge.name}]: {verdict}")
+
+        return "\n\n".join(verdicts)
+
+    async def _timed_verdict(self, judge):
+        """生成单个裁判的评分，并把耗时记入时间线"""
+        start = time.perf_counter()
+        try:
+            return await self._generate(judge, self._visible_messages(judge))
+        finally:
+            self.debate_sm.timeline.add_span(judge.name, start, time.perf_counter())
+
+    # ------------------------------------------------------------------
+    # 大模型调用
+    # ------------------------------------------------------------------
+    def _visible_messages(self, agent):
+        """构造 agent 视角下的对话历史（按赛制的可见性规则过滤，自己的发言为 assistant，其余为 user）
+
+        每个 Agent 的视图只处理上次之后新增的消息，返回的列表只能读取。
+        """
+        view = self._views.get(agent.name)
+        if view is None:
+            def to_agent_view(m, viewer=agent.name):
+                name = m["name"]
+                role = "assistant" if name == viewer else "user"
+                return {"content": m["content"], "role": role, "name": name}
+            view = self._views[agent.name] = VisibilityView(agent.name, self.debate_sm.format.visibility, transform=to_agent_view)
+        return view.get(self.messages)
+
+    async def _generate(self, agent, messages):
+        """异步调用大模型并提取纯文本，空回复和调用失败按 retry_policy 退避重试"""
+        agent.ensure_system_message()
+        llm_config = agent.llm_config["config_list"][0]
+        request = {
+            "model": llm_config["model"],
+            "messages": [{"content": agent.system_message, "role": "system"}] + messages,
+        }
+        if agent.llm_config.get("temperature") is not None:
+            request["temperature"] = agent.llm_config["temperature"]
+
+        # 与同步 Agent 使用相同的缓存键，两种引擎可以共享缓存
+        cache = get_response_cache()
+        cache_key = None
+        if cache is not None:
+            cache_key = cache.make_key(agent.name, request["model"], request.get("temperature"), agent.system_message, messages)
+
+        # 协程各自持有上下文，并行评分的裁判之间互不影响
+        set_call_context(self.debate_sm.debate_id, agent.name, self.debate_sm.state)
+
+        assigned_model = request["model"]
+
+        async def attempt(retry, model):
+            with recorder.track_call(model, retries=retry) as call:
+                reply = cache.lookup(cache_key) if cache is not None else None
+                if reply is not None:
+                    call["cache_hit"] = True
+                else:
+                    # 开启模型故障切换时，本次尝试可能使用同公司的其他模型
+                    start = time.perf_counter()
+                    try:
+                        response = await self.client.chat.completions.create(
+                            **{**request, "model": model, "messages": mark_cacheable_prefixes(model, request["messages"])}
+                        )
+                    except Exception:
+                        model_router.record(model, None, ok=False)
+                        raise
+                    model_router.record(model, time.perf_counter() - start, ok=True)
+                    reply = response.choices[0].message.content if response.choices else ""
+                    if response.usage is not None:
+                        add_usage(
+                            response.usage.prompt_tokens,
+                            response.usage.completion_tokens,
+                            cached_tokens=get_cached_tokens(response.usage),
+                        )
+                    if cache is not None and reply:
+                        cache.set(cache_key, reply)
+            # 信息提取可能触发同步网络请求，放到线程池中执行
+            extracted_reply = await asyncio.to_thread(extractor.extract, reply)
+
+            # 在控制台输出原始回复和提取后的回复
+            print(f"原始回复: {reply}")
+            print(f"提取回复: {extracted_reply}")
+            return extracted_reply
+
+        extracted_reply = await retry_policy.run_async(
+            assigned_model, attempt, route=lambda retry, failed: model_router.choose(assigned_model, failed)
+        )
+        return extracted_reply or ""
+
+
+# ============================================================================
+# 辩论执行函数
+# ============================================================================
+async def async_run_debate(debate_topic, ui_callback, debaters_per_side=2, judges_count=3, max_free_debate_turns=4, pro_models=None, con_models=None, judge_models=None, moderator_model=None, pro_traits=None, con_traits=None, client=None):
+    """run_debate 的异步版本，参数、界面回调事件和返回的消息记录结构均与其一致
+
+    Args:
+        client: 可选的 AsyncOpenAI 客户端，同一事件循环中的多场辩论可共享；
+            未提供时为本场辩论创建一个，辩论结束后关闭
+    """
+    update_config(
+        debaters_per_side=debaters_per_side,
+        judges_count=judges_count,
+        max_free_debate_turns=max_free_debate_turns
+    )
+
+    model_assignments, trait_assignments = build_assignments(
+        debaters_per_side, judges_count, pro_models, con_models, judge_models, moderator_model, pro_traits, con_traits
+    )
+
+    debate_sm = DebateStateMachine(max_free_debate_turns, debaters_per_side, judges_count)
+    moderator, pro_debaters, con_debaters, judges = create_agents(
+        debate_topic, debate_sm, model_assignments, trait_assignments, ui_callback, max_free_debate_turns,
+        debaters_per_side=debaters_per_side, judges_count=judges_count
+    )
+
+    checkpoint = None
+    if config.checkpoint_enabled:
+        checkpoint = DebateCheckpoint.create(debate_sm, debate_topic, model_assignments, trait_assignments)
+    engine = AsyncDebateEngine(debate_topic, ui_callback, debate_sm, moderator, pro_debaters, con_debaters, judges, client=client, checkpoint=checkpoint)
+    try:
+        await engine.run(get_opening_message(debate_topic, debaters_per_side, judges_count, debate_sm.format.rules))
+        print(f"Debug: 调用统计 - {recorder.summarize(debate_sm.debate_id)['by_role']}")
+        # 辩论正常结束，发送结束信号
+        ui_callback("__DEBATE_END__", "辩论已结束")
+    except Exception as e:
+        log_debate_error("辩论系统", e, "async_run_debate")
+        handle_debate_error(e, ui_callback)
+        # 发生错误时也发送结束信号
+        ui_callback("__DEBATE_END__", "辩论因错误而结束")
+    finally:
+        if client is None:
+            await engine.client.close()
+        # 异步引擎不使用开场陈述预生成，释放 create_agents 创建的预生成线程池
+        speculator = pro_debaters[0].speculator if pro_debaters else None
+        if speculator is not None:
+            speculator.shutdown()
+            print(f"Debug: 开场陈述预生成统计 - {speculator.get_stats()}")
+
+    return engine.messages
@@ -0,0 +1,197 @@
+"""
+无界面批量辩论运行器
+从 JSONL 文件读取辩题和配置，并发执行辩论，每场辩论的记录和裁决写入独立的 JSON 文件。
+已完成的辩论会被跳过，因此进程崩溃后重新运行同一命令即可继续。
+
+输入文件每行一个 JSON 对象，除 topic 外均为可选字段：
+    {"id": "ai-001", "topic": "人工智能利大于弊", "debaters_per_side": 2, "judges_count": 3,
+     "max_free_debate_turns": 4, "pro_models": [...], "con_models": [...], "judge_models": [...],
+     "moderator_model": "...", "pro_traits": [...], "con_traits": [...]}
+
+用法：
+    python batch_runner.py topics.jsonl --output-dir results --workers 4
+"""
+
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from main import run_debate
+
+# run_debate 支持的参数及默认值
+DEBATE_OPTIONS = {
+    "debaters_per_side": 2,
+    "judges_count": 3,
+    "max_free_debate_turns": 4,
+    "pro_models": None,
+    "con_models": None,
+    "judge_models": None,
+    "moderator_model": None,
+    "pro_traits": None,
+    "con_traits": None,
+}
+
+
+# ============================================================================
+# 辩论记录收集
+# ============================================================================
+class TranscriptCollector:
+    """替代界面的回调，按顺序收集辩论过程中推送的消息"""
+
+    def __init__(self):
+        self.events = []
+        self.ended = False
+        self.failed = False
+
+    def __call__(self, speaker_name, message):
+        if speaker_name == "__STREAM__":
+            return
+        if speaker_name == "__DEBATE_END__":
+            self.ended = True
+            self.failed = message != "辩论已结束"
+            return
+        self.events.append({"speaker": speaker_name, "message": message})
+
+    def get_verdict(self):
+        """汇总各裁判评分和主持人的最终裁决"""
+        judges = {}
+        for event in self.events:
+            if event["speaker"].startswith("裁判"):
+                judges[event["speaker"]] = event["message"]
+
+        moderator = None
+        for event in reversed(self.events):
+            if event["speaker"] == "主持人":
+                moderator = event["message"]
+                break
+
+        return {"judges": judges, "moderator": moderator}
+
+
+# ============================================================================
+# 任务读取与结果写入
+# ============================================================================
+def load_jobs(input_path):
+    """读取 JSONL 任务文件，没有 id 的任务按内容生成稳定的 id"""
+    jobs = []
+    with open(input_path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            job = json.loads(line)
+            if not job.get("topic"):
+                raise ValueError(f"第{line_number}行缺少 topic 字段")
+            if not job.get("id"):
+                digest = hashlib.sha1(json.dumps(job, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+                job["id"] = digest.hexdigest()[:12]
+            jobs.append(job)
+    return jobs
+
+
+def get_output_path(output_dir, job_id):
+    """获取任务结果文件路径"""
+    return os.path.join(output_dir, f"{job_id}.json")
+
+
+def is_completed(output_dir, job_id):
+    """判断任务是否已成功完成（失败或未完成的任务会被重新执行）"""
+    path = get_output_path(output_dir, job_id)
+    if not os.path.exists(path):
+        return False
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f).get("status") == "completed"
+    except (OSError, ValueError):
+        return False
+
+
+def write_result(output_dir, job_id, result):
+    """原子写入结果文件，避免崩溃时留下不完整的 JSON"""
+    path = get_output_path(output_dir, job_id)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+# ============================================================================
+# 执行
+# ============================================================================
+def run_job(job):
+    """执行单场辩论并返回结构化结果"""
+    options = {key: job.get(key, default) for key, default in DEBATE_OPTIONS.items()}
+    collector = TranscriptCollector()
+    started_at = datetime.datetime.now()
+
+    error = None
+    transcript = []
+    try:
+        transcript = run_debate(job["topic"], collector, **options)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+
+    finished_at = datetime.datetime.now()
+    failed = error is not None or collector.failed or not collector.ended
+    return {
+        "id": job["id"],
+        "topic": job["topic"],
+        "status": "failed" if failed else "completed",
+        "error": error,
+        "config": options,
+        "started_at": started_at.isoformat(timespec="seconds"),
+        "finished_at": finished_at.isoformat(timespec="seconds"),
+        "duration_seconds": round((finished_at - started_at).total_seconds(), 3),
+        "events": collector.events,
+        "transcript": [
+            {"name": m.get("name", ""), "role": m.get("role", ""), "content": m.get("content", "")}
+            for m in transcript
+        ],
+        "verdict": collector.get_verdict(),
+    }
+
+
+def run_batch(input_path, output_dir, workers=4):
+    """并发执行任务文件中所有未完成的辩论
+
+    Returns:
+        dict: 各状态的任务数量
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = load_jobs(input_path)
+    pending = [job for job in jobs if not is_completed(output_dir, job["id"])]
+    counts = {"total": len(jobs), "skipped": len(jobs) - len(pending), "completed": 0, "failed": 0}
+    print(f"共 {len(jobs)} 场辩论，已完成 {counts['skipped']} 场，待执行 {len(pending)} 场")
+
+    counts_lock = threading.Lock()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_job, job): job for job in pending}
+        for future in as_completed(futures):
+            job = futures[future]
+            result = future.result()
+            write_result(output_dir, job["id"], result)
+            with counts_lock:
+                counts[result["status"]] += 1
+                done = counts["completed"] + counts["failed"]
+            print(f"[{done}/{len(pending)}] {job['id']} {result['status']} ({result['duration_seconds']}s)")
+
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="无界面批量运行辩论")
+    parser.add_argument("input", help="JSONL 任务文件，每行一个辩题及其配置")
+    parser.add_argument("--output-dir", default="batch_results", help="结果输出目录")
+    parser.add_argument("--workers", type=int, default=4, help="并发执行的辩论数量")
+    args = parser.parse_args()
+
+    counts = run_batch(args.input, args.output_dir, args.workers)
+    print(f"批量运行结束：完成 {counts['completed']} 场，失败 {counts['failed']} 场，跳过 {counts['skipped']} 场")
+
+
+if __name__ == "__main__":
+    main()
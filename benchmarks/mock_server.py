@@ -0,0 +1,350 @@
+"""
+本地模拟的 OpenAI 兼容服务（用于基准测试）
+按可配置的延迟和token分布返回回复，支持流式输出，不需要网络和 API Key。
+根据系统提示词区分主持人/辩手、裁判和信息提取器，返回格式接近真实模型的内容。
+模拟服务商的前缀缓存，在 usage.prompt_tokens_details.cached_tokens 中返回命中的输入token。
+
+用法：
+    python benchmarks/mock_server.py --port 8765 --latency-ms 800 --jitter-ms 200 --tokens 300
+    然后设置 OPENROUTER_BASE_URL=http://127.0.0.1:8765 运行辩论
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 生成回复时循环使用的文本片段（一个汉字约计一个token）
+FILLER_TEXT = "我方认为这一观点在逻辑和事实上都站得住脚对方的论证忽略了关键前提因此结论难以成立"
+
+
+class MockServerConfig:
+    """模拟服务的延迟和token分布
+
+    Args:
+        latency_ms: 平均响应延迟（毫秒），流式输出时为首token延迟
+        jitter_ms: 延迟的波动范围
+        distribution: 延迟分布，fixed / uniform / normal / lognormal
+        completion_tokens: 平均回复长度（token）
+        tokens_jitter: 回复长度的波动范围
+        stream_chunk_tokens: 流式输出每个分片的token数
+        stream_chunk_delay_ms: 流式输出分片之间的间隔
+        error_rate: 随机返回 500 错误的概率
+        seed: 随机种子，固定后分布可复现
+    """
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, distribution="uniform", completion_tokens=200, tokens_jitter=50,
+                 stream_chunk_tokens=8, stream_chunk_delay_ms=0.0, error_rate=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.distribution = distribution
+        self.completion_tokens = completion_tokens
+        self.tokens_jitter = tokens_jitter
+        self.stream_chunk_tokens = stream_chunk_tokens
+        self.stream_chunk_delay_ms = stream_chunk_delay_ms
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample_latency(self):
+        """按配置的分布采样一次延迟（秒）"""
+        with self._lock:
+            if self.distribution == "fixed" or not self.jitter_ms:
+                value = self.latency_ms
+            elif self.distribution == "normal":
+                value = self.rng.gauss(self.latency_ms, self.jitter_ms)
+            elif self.distribution == "lognormal":
+                # 均值保持为 latency_ms，长尾由 jitter_ms 控制
+                sigma = min(2.0, self.jitter_ms / max(self.latency_ms, 1.0))
+                value = self.latency_ms * self.rng.lognormvariate(-sigma * sigma / 2, sigma)
+            else:
+                value = self.rng.uniform(self.latency_ms - self.jitter_ms, self.latency_ms + self.jitter_ms)
+        return max(0.0, value) / 1000
+
+    def sample_tokens(self):
+        """采样一次回复长度"""
+        with self._lock:
+            value = self.rng.randint(self.completion_tokens - self.tokens_jitter, self.completion_tokens + self.tokens_jitter)
+        return max(1, value)
+
+    def should_fail(self):
+        with self._lock:
+            return self.rng.random() < self.error_rate
+
+    def to_dict(self):
+        return {key: value for key, value in vars(self).items() if key not in ("rng", "_lock")}
+
+
+class MockServerStats:
+    """统计模拟服务收到的请求"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.stream_requests = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        # 服务端为模拟延迟累计等待的时间（秒）
+        self.simulated_latency = 0.0
+
+    def add(self, stream, prompt_tokens, completion_tokens, latency, error=False, cached_tokens=0):
+        with self._lock:
+            self.requests += 1
+            self.stream_requests += 1 if stream else 0
+            self.errors += 1 if error else 0
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.cached_tokens += cached_tokens
+            self.simulated_latency += latency
+
+    def snapshot(self):
+        with self._lock:
+            return {key: value for key, value in vars(self).items() if key != "_lock"}
+
+    def reset(self):
+        with self._lock:
+            self.requests = self.stream_requests = self.errors = 0
+            self.prompt_tokens = self.completion_tokens = self.cached_tokens = 0
+            self.simulated_latency = 0.0
+
+
+class PromptCacheSimulator:
+    """模拟服务商的前缀缓存：请求开头与之前某次请求相同的部分计为缓存命中
+
+    请求中带 cache_control 标记时只在标记处写入缓存（显式缓存），查找时从最后一个标记向前
+    匹配各段内容的边界；没有标记时在每条消息末尾写入缓存（自动缓存）。
+    """
+
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._prefixes = set()
+
+    def lookup(self, model, messages):
+        """返回本次请求命中缓存的输入token数，并缓存本次请求的前缀"""
+        explicit = any(
+            isinstance(m.get("content"), list) and any("cache_control" in part for part in m["content"])
+            for m in messages
+        )
+        digest = hashlib.sha256(model.encode("utf-8"))
+        tokens = 0
+        boundaries = []
+        for m in messages:
+            digest.update(f"\x00{m.get('role')}\x00{m.get('name', '')}\x00".encode("utf-8"))
+            content = m.get("content")
+            parts = content if isinstance(content, list) else [{"text": content or ""}]
+            for part in parts:
+                text = part.get("text", "")
+                digest.update(text.encode("utf-8"))
+                tokens += len(text)
+                boundaries.append((digest.copy().hexdigest(), tokens, not explicit or "cache_control" in part))
+
+        if explicit:
+            # 最后一个标记之后的内容不参与缓存
+            last_marked = max(i for i, (_, _, marked) in enumerate(boundaries) if marked)
+            boundaries = boundaries[:last_marked + 1]
+        with self._lock:
+            cached = max((count for key, count, _ in boundaries if key in self._prefixes), default=0)
+            if len(self._prefixes) + len(boundaries) > self.max_entries:
+                self._prefixes.clear()
+            self._prefixes.update(key for key, _, marked in boundaries if marked)
+        return cached
+
+    def reset(self):
+        with self._lock:
+            self._prefixes.clear()
+
+
+def make_text(tokens):
+    """生成指定长度的填充文本"""
+    repeats = tokens // len(FILLER_TEXT) + 1
+    return (FILLER_TEXT * repeats)[:tokens]
+
+
+def content_text(content):
+    """消息内容的纯文本（兼容分段的 content 列表）"""
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content)
+    return content or ""
+
+
+def build_reply(messages, tokens):
+    """根据系统提示词生成对应角色的回复"""
+    system_message = content_text(messages[0].get("content")) if messages else ""
+
+    if "信息提取器" in system_message:
+        # 信息提取：返回去除思考过程后的原文
+        content = content_text(messages[-1].get("content"))
+        return content.split("</think>")[-1].strip()[-tokens:]
+    if "裁判" in system_message and "JSON" in system_message:
+        # 结构化评分
+        return json.dumps({
+            "pro": {"argument": 3, "logic": 2.5, "rebuttal": 1.5, "clarity": 2},
+            "con": {"argument": 2, "logic": 2, "rebuttal": 1.5, "clarity": 1.5},
+            "winner": "正方",
+            "pro_comment": make_text(tokens // 3),
+            "con_comment": make_text(tokens // 3),
+            "reason": "论证更完整",
+        }, ensure_ascii=False)
+    if "裁判" in system_message:
+        return (
+            f"【正方表现】{make_text(tokens // 3)}\n"
+            f"【反方表现】{make_text(tokens // 3)}\n"
+            "【评分】正方 8分，反方 7分\n"
+            "【结论】我认为正方获胜，因为论证更完整"
+        )
+    # 主持人和辩手：带思考块，覆盖信息提取器的本地规则
+    return f"<think>{make_text(16)}</think>{make_text(tokens)}"
+
+
+def estimate_prompt_tokens(messages):
+    return sum(len(content_text(m.get("content"))) for m in messages)
+
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    """处理 /chat/completions 请求（兼容带 /v1 前缀的路径）"""
+
+    server_config = MockServerConfig()
+    stats = MockServerStats()
+    prompt_cache = PromptCacheSimulator()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        messages = body.get("messages", [])
+        stream = bool(body.get("stream"))
+        model = body.get("model", "mock-model")
+
+        latency = self.server_config.sample_latency()
+        time.sleep(latency)
+
+        if self.server_config.should_fail():
+            self.stats.add(stream, 0, 0, latency, error=True)
+            self._send_json(500, {"error": {"message": "mock server error", "type": "server_error"}})
+            return
+
+        completion_tokens = self.server_config.sample_tokens()
+        text = build_reply(messages, completion_tokens)
+        cached_tokens = self.prompt_cache.lookup(model, messages)
+        usage = {
+            "prompt_tokens": estimate_prompt_tokens(messages),
+            "completion_tokens": len(text),
+            "total_tokens": estimate_prompt_tokens(messages) + len(text),
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        }
+
+        if stream:
+            chunk_delay = self.server_config.stream_chunk_delay_ms / 1000
+            self._stream(model, text, usage, chunk_delay)
+            self.stats.add(True, usage["prompt_tokens"], usage["completion_tokens"], latency + chunk_delay * len(text) / self.server_config.stream_chunk_tokens, cached_tokens=cached_tokens)
+            return
+
+        self.stats.add(False, usage["prompt_tokens"], usage["completion_tokens"], latency, cached_tokens=cached_tokens)
+        self._send_json(200, {
+            "id": "mock-completion",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": usage,
+        })
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, model, text, usage, chunk_delay):
+        """按 SSE 格式分片输出，最后一个分片附带 usage"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+
+        size = self.server_config.stream_chunk_tokens
+        for i in range(0, len(text), size):
+            chunk = {
+                "id": "mock-completion",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": text[i:i + size]}, "finish_reason": None}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            if chunk_delay:
+                time.sleep(chunk_delay)
+
+        final = {
+            "id": "mock-completion",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            "usage": usage,
+        }
+        self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+
+def start_mock_server(server_config=None, host="127.0.0.1", port=0):
+    """在后台线程启动模拟服务，返回 (server, base_url)"""
+    handler = type("ConfiguredMockRequestHandler", (MockRequestHandler,), {
+        "server_config": server_config or MockServerConfig(),
+        "stats": MockServerStats(),
+        "prompt_cache": PromptCacheSimulator(),
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟的 OpenAI 兼容服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=500.0, help="平均响应延迟（毫秒）")
+    parser.add_argument("--jitter-ms", type=float, default=100.0, help="延迟波动范围（毫秒）")
+    parser.add_argument("--distribution", choices=["fixed", "uniform", "normal", "lognormal"], default="uniform")
+    parser.add_argument("--tokens", type=int, default=200, help="平均回复长度（token）")
+    parser.add_argument("--tokens-jitter", type=int, default=50)
+    parser.add_argument("--stream-chunk-delay-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    server_config = MockServerConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        distribution=args.distribution,
+        completion_tokens=args.tokens,
+        tokens_jitter=args.tokens_jitter,
+        stream_chunk_delay_ms=args.stream_chunk_delay_ms,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    server, base_url = start_mock_server(server_config, args.host, args.port)
+    print(f"模拟服务已启动：{base_url}（Ctrl+C 退出）")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,417 @@
+"""
+离线基准测试
+在本地模拟服务上运行辩论，把编排开销与大模型延迟分开测量：
+    - state_machine: DebateStateMachine 每次选择发言者的耗时
+    - create_agents: 创建全部 Agent 的耗时
+    - overhead: 模拟服务零延迟时每轮发言的编排开销（含本机HTTP往返）
+    - throughput: 按配置的延迟分布运行时每分钟完成的辩论场数
+    - memory: 连续运行多场辩论时的内存增长（tracemalloc）
+    - extractor: 本地规则提取、缓存命中和远程提取的单次耗时
+    - ui_queue: 界面消息队列的处理速度（需要图形环境，否则跳过）
+
+结果保存为 benchmarks/results/<时间>_<标签>.json，可用 --compare 与之前的结果对比：
+    python benchmarks/run_benchmarks.py --label baseline
+    python benchmarks/run_benchmarks.py --label new --compare benchmarks/results/xxx_baseline.json
+"""
+
+import argparse
+import contextlib
+import datetime
+import gc
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from mock_server import MockServerConfig, start_mock_server
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT_DIR, "benchmarks", "results")
+
+# 指标名以这些后缀结尾时数值越大越好，其余指标越小越好
+HIGHER_IS_BETTER = ("per_minute", "per_sec", "hit_ratio")
+
+
+class _FakeAgent:
+    """仅供状态机读取名称的占位 Agent"""
+
+    def __init__(self, name):
+        self.name = name
+
+
+class _FakeGroupChat:
+    def __init__(self, agents):
+        self.agents = agents
+
+
+def parse_sizes(text):
+    """解析 "1x1,2x3" 形式的（每方辩手数 x 裁判数）列表"""
+    sizes = []
+    for item in text.split(","):
+        debaters, judges = item.lower().split("x")
+        sizes.append((int(debaters), int(judges)))
+    return sizes
+
+
+@contextlib.contextmanager
+def quiet():
+    """屏蔽辩论过程中的控制台输出"""
+    with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def run_one_debate(debaters_per_side, judges_count, free_turns, topic="人工智能的发展利大于弊"):
+    """运行一场辩论，返回 (耗时秒数, 发言轮数)"""
+    from main import run_debate
+
+    start = time.perf_counter()
+    messages = run_debate(topic, lambda speaker, message: None, debaters_per_side, judges_count, free_turns)
+    # 第一条是辩论发起人的开场消息
+    return time.perf_counter() - start, max(1, len(messages) - 1)
+
+
+# ============================================================================
+# 各项基准测试
+# ============================================================================
+def bench_state_machine(sizes, free_turns, repeats):
+    """只测状态机调度，不涉及任何大模型调用"""
+    from debate_state import DebateStateMachine, JUDGE_PANEL_NAME
+
+    results = {}
+    for debaters, judges in sizes:
+        names = ["主持人", JUDGE_PANEL_NAME]
+        names += [f"{side}辩手{i}" for side in ("正方", "反方") for i in range(1, debaters + 1)]
+        names += [f"裁判{i}" for i in range(1, judges + 1)]
+        groupchat = _FakeGroupChat([_FakeAgent(name) for name in names])
+
+        calls = 0
+        start = time.perf_counter()
+        for _ in range(repeats):
+            debate_sm = DebateStateMachine(free_turns, debaters, judges, seed=0)
+            last_speaker = _FakeAgent("辩论发起人")
+            while True:
+                calls += 1
+                speaker = debate_sm.next_speaker(last_speaker, groupchat)
+                if speaker is None:
+                    break
+                last_speaker = speaker
+        elapsed = time.perf_counter() - start
+        results[f"{debaters}x{judges}"] = {
+            "next_speaker_us": elapsed / calls * 1e6,
+            "debates_per_sec": repeats / elapsed,
+        }
+    return results
+
+
+def bench_create_agents(sizes, free_turns, repeats):
+    """创建全部 Agent 的耗时（客户端和系统提示词在首次发言时才创建，不计入）"""
+    from agents.factory import create_agents
+    from debate_state import DebateStateMachine
+    from main import build_assignments
+
+    results = {}
+    for debaters, judges in sizes:
+        durations = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            with quiet():
+                model_assignments, trait_assignments = build_assignments(debaters, judges)
+                debate_sm = DebateStateMachine(free_turns, debaters, judges)
+                create_agents("基准测试辩题", debate_sm, model_assignments, trait_assignments, None, free_turns,
+                              debaters_per_side=debaters, judges_count=judges)
+            durations.append(time.perf_counter() - start)
+        results[f"{debaters}x{judges}"] = {"create_agents_ms": statistics.median(durations) * 1000}
+    return results
+
+
+def bench_overhead(server, sizes, free_turns, debates):
+    """模拟服务零延迟时，每轮发言的编排开销"""
+    server_config = server.RequestHandlerClass.server_config
+    saved = (server_config.latency_ms, server_config.jitter_ms, server_config.stream_chunk_delay_ms)
+    server_config.latency_ms = server_config.jitter_ms = server_config.stream_chunk_delay_ms = 0.0
+
+    results = {}
+    try:
+        for debaters, judges in sizes:
+            per_turn = []
+            with quiet():
+                for _ in range(debates):
+                    elapsed, turns = run_one_debate(debaters, judges, free_turns)
+                    per_turn.append(elapsed / turns)
+            results[f"{debaters}x{judges}"] = {
+                "turn_overhead_ms": statistics.median(per_turn) * 1000,
+                "turn_overhead_max_ms": max(per_turn) * 1000,
+            }
+    finally:
+        server_config.latency_ms, server_config.jitter_ms, server_config.stream_chunk_delay_ms = saved
+    return results
+
+
+def bench_throughput(server, sizes, free_turns, debates, workers):
+    """按配置的延迟分布运行辩论，统计每分钟完成场数"""
+    stats = server.RequestHandlerClass.stats
+    results = {}
+    for debaters, judges in sizes:
+        stats.reset()
+        start = time.perf_counter()
+        with quiet(), ThreadPoolExecutor(max_workers=workers) as pool:
+            runs = list(pool.map(lambda _: run_one_debate(debaters, judges, free_turns), range(debates)))
+        elapsed = time.perf_counter() - start
+        server_stats = stats.snapshot()
+        results[f"{debaters}x{judges}"] = {
+            "debates_per_minute": debates / elapsed * 60,
+            "debate_seconds": statistics.median(duration for duration, _ in runs),
+            "turns_per_debate": statistics.median(turns for _, turns in runs),
+            "requests_per_debate": server_stats["requests"] / debates,
+            "simulated_latency_per_debate": server_stats["simulated_latency"] / debates,
+            # 模拟服务的前缀缓存命中的输入token占比（开启 config.prompt_caching_enabled 时可对比）
+            "cached_ratio": server_stats["cached_tokens"] / server_stats["prompt_tokens"] if server_stats["prompt_tokens"] else 0.0,
+        }
+    return results
+
+
+def bench_memory(server, sizes, free_turns, debates):
+    """连续运行多场辩论时的内存增长"""
+    server_config = server.RequestHandlerClass.server_config
+    saved = (server_config.latency_ms, server_config.jitter_ms)
+    server_config.latency_ms = server_config.jitter_ms = 0.0
+
+    results = {}
+    tracemalloc.start()
+    try:
+        for debaters, judges in sizes:
+            gc.collect()
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            samples = []
+            with quiet():
+                for _ in range(debates):
+                    run_one_debate(debaters, judges, free_turns)
+                    gc.collect()
+                    samples.append(tracemalloc.get_traced_memory()[0])
+            peak = tracemalloc.get_traced_memory()[1]
+            # 第一场包含模块和客户端的一次性初始化，之后的差值才是每场的增长
+            growth = (samples[-1] - samples[0]) / (len(samples) - 1) if len(samples) > 1 else samples[0] - baseline
+            results[f"{debaters}x{judges}"] = {
+                "first_debate_kb": (samples[0] - baseline) / 1024,
+                "growth_per_debate_kb": growth / 1024,
+                "peak_kb": (peak - baseline) / 1024,
+            }
+    finally:
+        tracemalloc.stop()
+        server_config.latency_ms, server_config.jitter_ms = saved
+    return results
+
+
+def bench_extractor(iterations):
+    """信息提取各路径的单次耗时"""
+    from agents.extractor import InformationExtractor, local_extract
+    from mock_server import build_reply
+
+    replies = [build_reply([{"content": ""}], 100 + i) for i in range(iterations)]
+
+    start = time.perf_counter()
+    for reply in replies:
+        local_extract(reply)
+    local_us = (time.perf_counter() - start) / len(replies) * 1e6
+
+    cached = InformationExtractor(fast_path=True, cache_size=len(replies))
+    for reply in replies:
+        cached.extract(reply)
+    start = time.perf_counter()
+    for reply in replies:
+        cached.extract(reply)
+    cache_hit_us = (time.perf_counter() - start) / len(replies) * 1e6
+
+    # 远程提取较慢，只取一小部分样本
+    remote = InformationExtractor(fast_path=False, cache_size=0)
+    samples = replies[:max(1, iterations // 20)]
+    start = time.perf_counter()
+    with quiet():
+        for reply in samples:
+            remote.extract(reply)
+    remote_ms = (time.perf_counter() - start) / len(samples) * 1000
+
+    return {
+        "local_extract_us": local_us,
+        "cache_hit_us": cache_hit_us,
+        "remote_extract_ms": remote_ms,
+        "cache_hit_ratio": cached.get_stats()["cache_hit_ratio"],
+    }
+
+
+def bench_ui_queue(messages):
+    """界面消息队列从入队到渲染完成的吞吐，没有图形环境时跳过"""
+    try:
+        import tkinter as tk
+        from debate_ui import DebateUI
+        from main import run_debate
+
+        ui = DebateUI(run_debate)
+    except Exception as e:
+        return {"skipped": f"无法创建界面：{e}"}
+
+    try:
+        speakers = ["主持人", "正方辩手1", "反方辩手1", "裁判1"]
+        start = time.perf_counter()
+        for i in range(messages):
+            ui.ui_callback(speakers[i % len(speakers)], f"第{i}条消息：" + "测试内容" * 20)
+        while not ui.message_queue.empty():
+            ui.root.update()
+        ui.root.update()
+        elapsed = time.perf_counter() - start
+        return {"messages_per_sec": messages / elapsed, "total_ms": elapsed * 1000}
+    except tk.TclError as e:
+        return {"skipped": f"界面处理失败：{e}"}
+    finally:
+        ui.root.destroy()
+
+
+# ============================================================================
+# 结果保存与对比
+# ============================================================================
+def get_git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def flatten(results, prefix=""):
+    """把嵌套结果展开为 {"bench.size.metric": value}，只保留数值"""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(current, baseline, threshold):
+    """打印与基线的差异，返回退化的指标列表"""
+    current_flat = flatten(current["benchmarks"])
+    baseline_flat = flatten(baseline["benchmarks"])
+    regressions = []
+
+    print(f"\n与基线对比（{baseline.get('label')} @ {baseline.get('git_commit')}）：")
+    for name in sorted(current_flat):
+        if name not in baseline_flat:
+            continue
+        old, new = baseline_flat[name], current_flat[name]
+        change = (new - old) / old if old else 0.0
+        worse = -change if name.endswith(HIGHER_IS_BETTER) else change
+        flag = ""
+        if worse > threshold:
+            flag = "  <-- 退化"
+            regressions.append(name)
+        print(f"  {name:<60} {old:>12.3f} -> {new:>12.3f} ({change:+.1%}){flag}")
+    return regressions
+
+
+def save_results(results, output_dir):
+    os.makedirs(output_dir, exist_ok=True)
+    filename = f"{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}_{results['label']}.json"
+    path = os.path.join(output_dir, filename)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    return path
+
+
+# ============================================================================
+# 主程序
+# ============================================================================
+BENCHMARKS = ["state_machine", "create_agents", "overhead", "throughput", "memory", "extractor", "ui_queue"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="辩论系统离线基准测试")
+    parser.add_argument("--label", default="local", help="结果标签，写入文件名")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, help="只运行指定的测试")
+    parser.add_argument("--sizes", default="1x1,2x3,3x5", help="每方辩手数x裁判数，逗号分隔")
+    parser.add_argument("--free-turns", type=int, default=4, help="自由辩论轮数")
+    parser.add_argument("--debates", type=int, default=3, help="每种规模运行的辩论场数")
+    parser.add_argument("--workers", type=int, default=1, help="吞吐测试的并发辩论数")
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="模拟服务平均延迟（毫秒）")
+    parser.add_argument("--jitter-ms", type=float, default=50.0, help="模拟服务延迟波动（毫秒）")
+    parser.add_argument("--distribution", choices=["fixed", "uniform", "normal", "lognormal"], default="uniform")
+    parser.add_argument("--tokens", type=int, default=200, help="模拟回复的平均长度（token）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output-dir", default=RESULTS_DIR)
+    parser.add_argument("--compare", help="用于对比的历史结果文件")
+    parser.add_argument("--threshold", type=float, default=0.1, help="超过该比例视为退化")
+    args = parser.parse_args()
+
+    server_config = MockServerConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        distribution=args.distribution,
+        completion_tokens=args.tokens,
+        seed=args.seed,
+    )
+    server, base_url = start_mock_server(server_config)
+
+    # autogen/httpx 每次请求都会输出日志，测试期间只保留错误
+    logging.disable(logging.WARNING)
+
+    # config 在导入时读取环境变量，必须在导入辩论模块之前设置
+    os.environ["OPENROUTER_BASE_URL"] = base_url
+    os.environ.setdefault("OPENROUTER_API_KEY", "benchmark")
+    sys.path.insert(0, ROOT_DIR)
+    with quiet():
+        import config
+    # 基准测试测量的是真实调用路径，关闭响应缓存
+    config.response_cache_enabled = False
+
+    sizes = parse_sizes(args.sizes)
+    selected = args.only or BENCHMARKS
+    runners = {
+        "state_machine": lambda: bench_state_machine(sizes, args.free_turns, repeats=200),
+        "create_agents": lambda: bench_create_agents(sizes, args.free_turns, repeats=5),
+        "overhead": lambda: bench_overhead(server, sizes, args.free_turns, args.debates),
+        "throughput": lambda: bench_throughput(server, sizes, args.free_turns, args.debates, args.workers),
+        "memory": lambda: bench_memory(server, sizes, args.free_turns, max(2, args.debates)),
+        "extractor": lambda: bench_extractor(iterations=200),
+        "ui_queue": lambda: bench_ui_queue(messages=500),
+    }
+
+    results = {
+        "label": args.label,
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "git_commit": get_git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {key: value for key, value in vars(args).items() if key not in ("compare", "output_dir")},
+        "mock_server": server_config.to_dict(),
+        "benchmarks": {},
+    }
+    for name in BENCHMARKS:
+        if name not in selected:
+            continue
+        print(f"运行 {name} ...")
+        start = time.perf_counter()
+        results["benchmarks"][name] = runners[name]()
+        print(f"  完成（{time.perf_counter() - start:.1f} 秒）：{json.dumps(results['benchmarks'][name], ensure_ascii=False)}")
+
+    server.shutdown()
+    path = save_results(results, args.output_dir)
+    print(f"\n结果已保存到：{path}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n共 {len(regressions)} 项指标退化超过 {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
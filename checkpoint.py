@@ -0,0 +1,129 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import config
+
+# ============================================================================
+# 辩论检查点
+# ============================================================================
+CHECKPOINT_VERSION = 1
+
+
+def _dumps(record) -> str:
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+
+
+class DebateCheckpoint:
+    """一场辩论的检查点文件（JSON Lines，只追加写入）
+
+    第一行为辩论配置：辩题、状态机参数、模型分配和特质分配；
+    之后每提交一条发言追加一行 {"message": 发言, "sm": 提交时的状态机状态}；
+    辩论结束时追加 {"complete": true}。
+    每行写入后立即落盘，进程中断时最后一行可能不完整，读取时忽略。
+    """
+
+    def __init__(self, path: str, saved: int = 0):
+        self.path = path
+        # 已写入的发言条数
+        self.saved = saved
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create(cls, debate_sm, debate_topic, model_assignments, trait_assignments, directory: Optional[str] = None) -> "DebateCheckpoint":
+        """为新辩论创建检查点文件"""
+        directory = directory or config.checkpoint_dir
+        os.makedirs(directory, exist_ok=True)
+        checkpoint = cls(os.path.join(directory, f"{debate_sm.debate_id}.jsonl"))
+        header = {
+            "version": CHECKPOINT_VERSION,
+            "debate_id": debate_sm.debate_id,
+            "created": time.time(),
+            "topic": debate_topic,
+            "state_machine": debate_sm.get_checkpoint_config(),
+            "model_assignments": model_assignments,
+            "trait_assignments": trait_assignments,
+        }
+        with open(checkpoint.path, "w", encoding="utf-8") as f:
+            f.write(_dumps(header) + "\n")
+        return checkpoint
+
+    def commit(self, messages: List[Dict], debate_sm):
+        """追加尚未写入的发言，并记录此刻的状态机状态
+
+        在选择下一位发言者之前调用，此时 messages 中的发言都已完成。
+        """
+        with self._lock:
+            new_messages = messages[self.saved:]
+            if not new_messages:
+                return
+            sm_state = debate_sm.get_checkpoint_state()
+            # 只有最后一条发言需要附带状态机状态
+            lines = [_dumps({"message": m}) for m in new_messages[:-1]]
+            lines.append(_dumps({"message": new_messages[-1], "sm": sm_state}))
+            self._append(lines)
+            self.saved = len(messages)
+
+    def complete(self):
+        """标记辩论已正常结束"""
+        with self._lock:
+            self._append([_dumps({"complete": True})])
+
+    def _append(self, lines: List[str]):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def load_checkpoint(path: str) -> Dict:
+    """读取检查点，返回 {"header", "messages", "sm", "complete"}
+
+    messages 截止到最后一条附带状态机状态的发言（最后一个已提交的发言）。
+    """
+    header = None
+    messages = []
+    committed_messages = []
+    sm_state = None
+    complete = False
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # 写入过程中中断的最后一行
+                break
+            if header is None:
+                header = record
+                continue
+            if record.get("complete"):
+                complete = True
+                continue
+            messages.append(record["message"])
+            if "sm" in record:
+                sm_state = record["sm"]
+                committed_messages = list(messages)
+
+    if header is None:
+        raise ValueError(f"检查点文件为空或已损坏：{path}")
+    if header.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"不支持的检查点版本：{header.get('version')}")
+    return {"header": header, "messages": committed_messages, "sm": sm_state, "complete": complete}
+
+
+def find_incomplete_checkpoints(directory: Optional[str] = None) -> List[str]:
+    """列出未完成的辩论检查点，按修改时间从新到旧排列"""
+    directory = directory or config.checkpoint_dir
+    if not os.path.isdir(directory):
+        return []
+    paths = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".jsonl")]
+    incomplete = []
+    for path in sorted(paths, key=os.path.getmtime, reverse=True):
+        try:
+            if not load_checkpoint(path)["complete"]:
+                incomplete.append(path)
+        except (OSError, ValueError):
+            continue
+    return incomplete
@@ -17,6 +17,8 @@ print(f"Debug: API Key Set={api_key is not None}")
 base_config = {
     "base_url": base_url,
     "api_key": api_key,
+    # 重试统一由 retry_policy 负责，关闭 openai 客户端内置的重试
+    "max_retries": 0,
 }
 
 # 辩论配置
@@ -24,15 +26,17 @@ base_config = {
 _DEFAULT_DEBATERS_PER_SIDE = 2  # 每方辩手人数
 _DEFAULT_JUDGES_COUNT = 3  # 裁判人数
 _DEFAULT_MAX_FREE_DEBATE_TURNS = 4  # 自由辩论最大轮次
+_DEFAULT_PARALLEL_JUDGING = True  # 裁判是否并行评分
 
 # 当前使用的配置值
 debaters_per_side = _DEFAULT_DEBATERS_PER_SIDE
 judges_count = _DEFAULT_JUDGES_COUNT
 max_free_debate_turns = _DEFAULT_MAX_FREE_DEBATE_TURNS
+parallel_judging = _DEFAULT_PARALLEL_JUDGING
 
 def update_config(**kwargs):
     """更新辩论配置参数"""
-    global debaters_per_side, judges_count, max_free_debate_turns
+    global debaters_per_side, judges_count, max_free_debate_turns, parallel_judging
     
     if 'debaters_per_side' in kwargs:
         debaters_per_side = kwargs['debaters_per_side']
@@ -40,13 +44,16 @@ def update_config(**kwargs):
         judges_count = kwargs['judges_count']
     if 'max_free_debate_turns' in kwargs:
         max_free_debate_turns = kwargs['max_free_debate_turns']
+    if 'parallel_judging' in kwargs:
+        parallel_judging = kwargs['parallel_judging']
 
 def get_current_config():
     """获取当前配置"""
     return {
         'debaters_per_side': debaters_per_side,
         'judges_count': judges_count,
-        'max_free_debate_turns': max_free_debate_turns
+        'max_free_debate_turns': max_free_debate_turns,
+        'parallel_judging': parallel_judging
     }
 
 # 为不同角色配置不同模型
@@ -149,3 +156,130 @@ def get_debate_model_assignments(debaters_per_side=None, judges_count=None):
         },
         "judges": judge_models_assigned
     }
+
+
+# ============================================================================
+# 裁判评分配置
+# ============================================================================
+# 开启后裁判按 JSON 输出各评分项得分，由本地解析、汇总后渲染为文本显示；
+# 关闭时仍从【评分】文本中解析总分用于汇总
+structured_verdicts_enabled = False
+# 最终裁决方式：llm 由主持人模型阅读各裁判评分后宣布；
+# template 按本地汇总结果（平均分、中位数、多数票、一致率）直接生成，不再调用模型
+final_announcement_mode = "llm"
+
+# ============================================================================
+# 赛制配置
+# ============================================================================
+# 内置赛制名称（standard / oxford / lincoln_douglas / cross_examination，见 debate_formats.py）
+# 或 JSON / YAML 赛制定义文件路径
+debate_format = "standard"
+
+# ============================================================================
+# 信息提取器配置
+# ============================================================================
+# 本地规则快速提取：先用规则清理思考过程、角色标签等，置信度不足时再调用远程模型
+extractor_fast_path_enabled = True
+# 本地提取结果的最小长度（字符），低于该值视为置信度不足
+extractor_fast_path_min_chars = 2
+
+# ============================================================================
+# HTTP连接池配置（直接调用API时共享）
+# ============================================================================
+http_connect_timeout = 10  # 建立连接超时（秒）
+http_read_timeout = 120  # 读取响应超时（秒）
+http_pool_size = 16  # 每个主机保持的最大连接数
+
+# ============================================================================
+# 流式输出配置
+# ============================================================================
+# 开启后辩手回复会边生成边推送到界面，生成结束后再用提取结果校正
+stream_debater_replies = False
+
+# ============================================================================
+# 开场陈述预生成配置
+# ============================================================================
+# 开启后在当前辩手做开场陈述时，同时预生成下一位辩手的开场陈述
+# （下一位辩手因此看不到紧挨着的上一篇开场陈述）
+speculative_opening_enabled = False
+
+# ============================================================================
+# 响应缓存配置
+# ============================================================================
+# 按 模型+温度+系统提示+可见对话历史 缓存大模型回复，用于反复测试同一辩题
+response_cache_enabled = False
+response_cache_path = os.path.join(".debate_cache", "responses.sqlite3")
+response_cache_max_entries = 10000
+# 回放模式：只读缓存，未命中时报错而不发起网络请求（信息提取也只使用本地规则）
+response_cache_replay = False
+# 自由辩论随机选人的种子，回放整场辩论时需要与录制时一致
+debate_random_seed = None
+
+# ============================================================================
+# 信息提取缓存配置
+# ============================================================================
+# 按 提取模型+原文摘要 缓存提取结果，重复文本（如空回复、固定套话）无需再次提取
+extractor_cache_size = 2048  # 进程内LRU容量，0 表示关闭
+extractor_persistent_cache_enabled = False
+extractor_persistent_cache_path = os.path.join(".debate_cache", "extractions.sqlite3")
+extractor_persistent_cache_max_entries = 20000
+
+# ============================================================================
+# 提示词配置
+# ============================================================================
+prompt_render_cache_size = 256  # 渲染结果的进程内LRU容量（按 模板+参数 缓存）
+# 开启后按服务商的方式利用提示词缓存（系统提示的静态规则在前，对话历史只追加）
+prompt_caching_enabled = False
+# 各公司的提示词缓存方式，未列出的公司不做处理：
+#   explicit - 需要在请求中用 cache_control 标记缓存断点
+#   auto     - 服务商自动缓存相同的前缀，无需标记
+prompt_caching_by_company = {
+    "Anthropic": "explicit",
+    "OpenAI": "auto",
+    "DeepSeek": "auto",
+    "Moonshot": "auto",
+    "xAI": "auto",
+}
+
+# ============================================================================
+# 辩手上下文窗口配置
+# ============================================================================
+# 开启后辩手只看到：开场陈述 + 较早发言的滚动摘要 + 最近若干条发言
+context_window_enabled = False
+context_recent_messages = 6  # 完整保留的最近发言条数
+context_summary_every = 4  # 每累计多少条移出窗口的发言更新一次摘要
+context_summary_model = None  # 生成摘要使用的模型，默认与主持人相同
+
+# ============================================================================
+# 检查点配置
+# ============================================================================
+# 开启后每轮发言结束都把辩论进度追加写入检查点文件，进程中断后可用
+# python main.py --resume <检查点文件> 从最后一个已完成的发言继续，已完成的发言不会重新调用模型
+checkpoint_enabled = False
+checkpoint_dir = os.path.join(".debate_cache", "checkpoints")
+
+# ============================================================================
+# 调用埋点配置
+# ============================================================================
+# 设置后每次大模型调用的埋点记录会实时追加到该 JSON Lines 文件
+instrumentation_log_path = None
+
+# ============================================================================
+# 重试与熔断配置
+# ============================================================================
+retry_max_attempts = 3  # 每次发言最多尝试次数（含首次）
+retry_base_delay = 1.0  # 指数退避的初始等待（秒）
+retry_max_delay = 30.0  # 单次等待上限（秒），服务端 Retry-After 也受此限制
+retry_empty_delay = 0.0  # 提取结果为空时的重试等待（秒），空回复不是服务端故障
+circuit_breaker_failure_threshold = 5  # 同一模型连续失败多少次后熔断
+circuit_breaker_reset_timeout = 30.0  # 熔断后多久允许试探性调用（秒）
+
+# ============================================================================
+# 模型故障切换配置
+# ============================================================================
+# 开启后按各模型的实时延迟和错误率，在同一公司的模型之间自动切换
+model_routing_enabled = False
+model_routing_error_threshold = 0.5  # 错误率（指数加权平均）超过该值视为不健康
+model_routing_latency_ratio = 1.5  # 指定模型比同组最快的健康模型慢超过该倍数时才切换
+model_routing_min_samples = 3  # 模型至少有多少次调用记录后才参与延迟比较
+model_routing_ewma_alpha = 0.3  # 指数加权平均的平滑系数，越大越偏重最近的调用
@@ -0,0 +1,382 @@
+import json
+import os
+import threading
+from functools import lru_cache
+
+# 并行评分时代表全体裁判的Agent名称
+JUDGE_PANEL_NAME = "裁判团"
+MODERATOR_NAME = "主持人"
+
+# ============================================================================
+# 赛制定义
+# ============================================================================
+# 每个赛制由若干阶段组成，阶段按顺序进行，字段说明：
+#   id: 阶段标识（即状态机的 state），同一标识可出现在多个阶段
+#   label: 阶段中文名称，用于辩手发言标签和界面显示
+#   announce: 阶段开始时是否先由主持人宣布
+#   order: 发言顺序，发言者写法：
+#       moderator                 主持人
+#       pro:1 / con:last          指定编号的辩手（last 为每方最后一位）
+#       pro:{i} / con:{i}         配合 for_each_debater，对每个编号各展开一次
+#       pro:random / con:random   运行时从该方随机选一位
+#       judges                    所有裁判（并行评分时为裁判团）
+#   for_each_debater: 按辩手编号 1..N 重复 order
+#   cycle: order 之后循环使用的发言顺序，直到发言数达到 turns
+#   turns: 阶段内的发言数上限，整数或参数名（free_debate_turns / debaters_per_side / judges_count）
+#   numbered: 辩手发言标签是否带轮数（如 自由辩论-第2轮）
+#   independent: 阶段内各发言互不依赖，可以提前生成下一位的发言
+#   pinned: 开启上下文窗口时，该阶段的发言（不含主持人宣布）始终完整保留、不并入摘要，
+#       未设置时 intro 和 opening 阶段（主持人介绍、开场陈述/立论）为 True
+#   rule: 开场消息中对该阶段的说明，可使用上面的参数名作为占位符
+# visibility 按角色（moderator / pro / con / judge）列出其看不到的其他角色的发言，
+# 自己的发言始终可见。
+DEBATE_FORMATS = {
+    "standard": {
+        "label": "标准赛制",
+        "phases": [
+            {"id": "intro", "label": "主持人介绍", "order": ["moderator"]},
+            {"id": "opening", "label": "开场陈述", "order": ["pro:{i}", "con:{i}"], "for_each_debater": True,
+             "independent": True, "rule": "开场陈述：正反方各{debaters_per_side}位辩手依次陈述观点"},
+            {"id": "free_debate", "label": "自由辩论", "announce": True, "order": ["pro:1"],
+             "cycle": ["con:random", "pro:random"], "turns": "free_debate_turns", "numbered": True,
+             "rule": "自由辩论：双方自由交锋"},
+            {"id": "closing", "label": "总结陈词", "announce": True, "order": ["con:last", "pro:last"],
+             "rule": "总结陈词：反方和正方的{debaters_per_side}号辩手总结"},
+            {"id": "judging", "label": "裁判评分", "announce": True, "order": ["judges"],
+             "rule": "独立评分：{judges_count}位裁判各自独立评分（互不干扰）"},
+            {"id": "final", "label": "宣布结果", "order": ["moderator"],
+             "rule": "最终裁决：主持人综合{judges_count}位裁判意见宣布结果"},
+        ],
+        "visibility": {"judge": ["judge"]},
+    },
+    "oxford": {
+        "label": "牛津式辩论",
+        "phases": [
+            {"id": "intro", "label": "主持人介绍", "order": ["moderator"]},
+            {"id": "opening", "label": "主题演讲", "order": ["pro:{i}", "con:{i}"], "for_each_debater": True,
+             "independent": True, "rule": "主题演讲：正反方各{debaters_per_side}位辩手交替发表主题演讲"},
+            {"id": "closing", "label": "总结陈词", "announce": True, "order": ["con:1", "pro:1"],
+             "rule": "总结陈词：反方和正方的1号辩手总结，不得提出新论点"},
+            {"id": "judging", "label": "裁判评分", "announce": True, "order": ["judges"],
+             "rule": "独立评分：{judges_count}位裁判各自独立评分（互不干扰）"},
+            {"id": "final", "label": "宣布结果", "order": ["moderator"],
+             "rule": "最终裁决：主持人综合{judges_count}位裁判意见宣布结果"},
+        ],
+        "visibility": {"judge": ["judge"]},
+    },
+    "lincoln_douglas": {
+        "label": "林肯-道格拉斯式辩论",
+        "phases": [
+            {"id": "intro", "label": "主持人介绍", "order": ["moderator"]},
+            {"id": "opening", "label": "正方立论", "order": ["pro:1"],
+             "rule": "正方立论：正方1号辩手陈述价值标准与论证"},
+            {"id": "cross_examination", "label": "反方质询", "announce": True, "order": ["con:1"],
+             "rule": "反方质询：反方1号辩手向正方提问"},
+            {"id": "opening", "label": "反方立论", "announce": True, "order": ["con:1"],
+             "rule": "反方立论：反方1号辩手陈述价值标准与论证，并回应正方立论"},
+            {"id": "cross_examination", "label": "正方质询", "announce": True, "order": ["pro:1"],
+             "rule": "正方质询：正方1号辩手向反方提问"},
+            {"id": "rebuttal", "label": "反驳", "announce": True, "order": ["pro:1", "con:1", "pro:1"],
+             "rule": "反驳：正方、反方、正方依次反驳，正方最后发言"},
+            {"id": "judging", "label": "裁判评分", "announce": True, "order": ["judges"],
+             "rule": "独立评分：{judges_count}位裁判各自独立评分（互不干扰）"},
+            {"id": "final", "label": "宣布结果", "order": ["moderator"],
+             "rule": "最终裁决：主持人综合{judges_count}位裁判意见宣布结果"},
+        ],
+        "visibility": {"judge": ["judge"]},
+    },
+    "cross_examination": {
+        "label": "质询式辩论",
+        "phases": [
+            {"id": "intro", "label": "主持人介绍", "order": ["moderator"]},
+            {"id": "opening", "label": "开场陈述", "order": ["pro:{i}", "con:{i}"], "for_each_debater": True,
+             "independent": True, "rule": "开场陈述：正反方各{debaters_per_side}位辩手依次陈述观点"},
+            {"id": "cross_examination", "label": "交叉质询", "announce": True, "order": ["con:{i}", "pro:{i}"],
+             "for_each_debater": True, "rule": "交叉质询：双方同号辩手依次向对方提问并回应"},
+            {"id": "free_debate", "label": "自由辩论", "announce": True, "order": ["pro:1"],
+             "cycle": ["con:random", "pro:random"], "turns": "free_debate_turns", "numbered": True,
+             "rule": "自由辩论：双方自由交锋"},
+            {"id": "closing", "label": "总结陈词", "announce": True, "order": ["con:last", "pro:last"],
+             "rule": "总结陈词：反方和正方的{debaters_per_side}号辩手总结"},
+            {"id": "judging", "label": "裁判评分", "announce": True, "order": ["judges"],
+             "rule": "独立评分：{judges_count}位裁判各自独立评分（互不干扰）"},
+            {"id": "final", "label": "宣布结果", "order": ["moderator"],
+             "rule": "最终裁决：主持人综合{judges_count}位裁判意见宣布结果"},
+        ],
+        "visibility": {"judge": ["judge"]},
+    },
+}
+
+ROLES = ("moderator", "pro", "con", "judge")
+
+# 未设置 pinned 时默认固定保留的阶段
+DEFAULT_PINNED_PHASES = frozenset({"intro", "opening"})
+
+# 没有状态机时的默认可见性：裁判看不到其他裁判的评分
+DEFAULT_VISIBILITY = {"judge": frozenset({"judge"})}
+
+
+@lru_cache(maxsize=1024)
+def get_role(name):
+    """根据发言者名称判断角色，辩论发起人等其他发言者返回 None"""
+    if name == MODERATOR_NAME:
+        return "moderator"
+    if name.startswith("正方"):
+        return "pro"
+    if name.startswith("反方"):
+        return "con"
+    if name.startswith("裁判"):
+        return "judge"
+    return None
+
+
+def filter_messages(viewer, messages, visibility):
+    """按可见性规则过滤 viewer 看到的对话历史，无需过滤时原样返回同一个列表"""
+    hidden = visibility.get(get_role(viewer))
+    if not hidden:
+        return messages
+    return [
+        m for m in messages
+        if m.get("name", "") == viewer or get_role(m.get("name", "")) not in hidden
+    ]
+
+
+class VisibilityView:
+    """viewer 在一份消息记录上的可见视图，增量维护
+
+    每次 get 只检查上次之后新增的消息，可见消息追加到视图自己的列表中并直接返回该列表（不复制）。
+    消息记录只会追加，视图列表也只会追加，因此并行评分的裁判各自读取自己的视图是安全的；
+    消息记录被替换或变短（如恢复辩论、清空历史）时重新建立视图。
+
+    Args:
+        transform: 可选，对每条可见消息做一次转换（如改写为 viewer 视角的角色），结果随视图缓存
+    """
+
+    def __init__(self, viewer, visibility, transform=None):
+        self.viewer = viewer
+        self.hidden = visibility.get(get_role(viewer))
+        self.transform = transform
+        self._lock = threading.Lock()
+        self._source = None
+        self._scanned = 0
+        self._visible = []
+
+    def get(self, messages):
+        """返回 messages 中 viewer 可见的消息"""
+        if not self.hidden and self.transform is None:
+            # 没有需要隐藏的角色时直接使用原列表
+            return messages
+        with self._lock:
+            if messages is not self._source or len(messages) < self._scanned:
+                self._source = messages
+                self._scanned = 0
+                self._visible = []
+            for index in range(self._scanned, len(messages)):
+                m = messages[index]
+                name = m.get("name", "")
+                if self.hidden and name != self.viewer and get_role(name) in self.hidden:
+                    continue
+                self._visible.append(self.transform(m) if self.transform else m)
+            self._scanned = len(messages)
+            return self._visible
+
+
+# ============================================================================
+# 赛制编译
+# ============================================================================
+class CompiledFormat:
+    """编译后的赛制：展开后的发言步骤、阶段信息、可见性规则和开场说明
+
+    phases 中每个阶段为 {id, label, announce, turns, rule, numbered, independent, pinned}，
+    turns 为解析后的发言数上限（没有上限时为 None），rule 为代入参数后的阶段说明；
+    steps 中每一步为 (阶段序号, 发言者名称, 随机候选)，
+    随机选人的步骤发言者名称为 None，运行时从随机候选中选择。
+    pinned_turns 为固定保留阶段中的发言，每项为 (发言者名称, 该发言者的第几条发言，从0开始)，
+    按发言者计数而不是按消息位置，过滤掉其他角色的历史中也能对应。
+    """
+
+    __slots__ = ("name", "label", "phases", "steps", "visibility", "rules", "pinned_turns")
+
+    def __init__(self, name, label, phases, steps, visibility, rules, pinned_turns=frozenset()):
+        self.name = name
+        self.label = label
+        self.phases = phases
+        self.steps = steps
+        self.visibility = visibility
+        self.rules = rules
+        self.pinned_turns = pinned_turns
+
+    def get_phase_roles(self):
+        """各阶段发言者的角色集合（moderator / pro / con / judge），与 phases 一一对应"""
+        roles = [set() for _ in self.phases]
+        for phase, speaker, candidates in self.steps:
+            roles[phase].add(get_role(speaker if speaker is not None else candidates[0]))
+        return [frozenset(r) for r in roles]
+
+    def get_phase_labels(self):
+        """阶段标识 -> 中文名称，同一标识对应多个名称时用 / 连接（如 正方立论/反方立论）"""
+        labels = {}
+        for phase in self.phases:
+            names = labels.setdefault(phase["id"], [])
+            if phase["label"] not in names:
+                names.append(phase["label"])
+        return {phase_id: "/".join(names) for phase_id, names in labels.items()}
+
+    def to_dict(self):
+        """便于检查和测试的可读形式"""
+        return {
+            "name": self.name,
+            "label": self.label,
+            "phases": [dict(phase) for phase in self.phases],
+            "steps": [
+                {"phase": self.phases[phase]["id"], "speaker": speaker, "candidates": list(candidates) if candidates else None}
+                for phase, speaker, candidates in self.steps
+            ],
+            "visibility": {role: sorted(hidden) for role, hidden in self.visibility.items()},
+            "rules": list(self.rules),
+            "pinned_turns": sorted(self.pinned_turns),
+        }
+
+
+def _resolve_speaker(ref, params, index=None):
+    """把发言者写法解析为名称，随机选人时返回候选名称元组"""
+    debaters = params["debaters_per_side"]
+    if ref == "moderator":
+        return MODERATOR_NAME
+    side, _, number = ref.partition(":")
+    if side not in ("pro", "con") or not number:
+        raise ValueError(f"无法识别的发言者：{ref}")
+    prefix = "正方辩手" if side == "pro" else "反方辩手"
+    if number == "random":
+        return tuple(f"{prefix}{i}" for i in range(1, debaters + 1))
+    if number == "last":
+        number = debaters
+    elif number == "{i}":
+        if index is None:
+            raise ValueError(f"{ref} 需要配合 for_each_debater 使用")
+        number = index
+    number = int(number)
+    if not 1 <= number <= debaters:
+        raise ValueError(f"发言者 {ref} 超出每方辩手人数 {debaters}")
+    return f"{prefix}{number}"
+
+
+def _expand_refs(refs, params, for_each=False):
+    """展开一组发言者写法，返回 [(名称, 随机候选)]"""
+    indices = range(1, params["debaters_per_side"] + 1) if for_each else [None]
+    expanded = []
+    for index in indices:
+        for ref in refs:
+            if ref == "judges":
+                if params["parallel_judging"]:
+                    expanded.append((JUDGE_PANEL_NAME, None))
+                else:
+                    expanded.extend((f"裁判{i}", None) for i in range(1, params["judges_count"] + 1))
+                continue
+            speaker = _resolve_speaker(ref, params, index)
+            expanded.append((None, speaker) if isinstance(speaker, tuple) else (speaker, None))
+    return expanded
+
+
+def compile_format(spec, debaters_per_side, judges_count, free_debate_turns, parallel_judging, name=None):
+    """把赛制定义编译为 CompiledFormat"""
+    params = {
+        "debaters_per_side": debaters_per_side or 0,
+        "judges_count": judges_count or 0,
+        "free_debate_turns": free_debate_turns or 0,
+        "parallel_judging": bool(parallel_judging),
+    }
+
+    phases = []
+    steps = []
+    rules = []
+    # 发言者 -> 已发言条数；随机选人之后候选者的条数无法确定，记为 None
+    spoken = {}
+    pinned_turns = set()
+    for phase_index, phase in enumerate(spec["phases"]):
+        if "id" not in phase:
+            raise ValueError(f"赛制 {name} 的第{phase_index + 1}个阶段缺少 id")
+        pinned = phase.get("pinned", phase["id"] in DEFAULT_PINNED_PHASES)
+        if phase.get("announce"):
+            steps.append((phase_index, MODERATOR_NAME, None))
+            spoken[MODERATOR_NAME] = spoken.get(MODERATOR_NAME, 0) + 1
+
+        speakers = _expand_refs(phase.get("order", []), params, phase.get("for_each_debater", False))
+        turns = phase.get("turns")
+        if turns is not None:
+            turns = params[turns] if isinstance(turns, str) else int(turns)
+            cycle = _expand_refs(phase.get("cycle", []), params)
+            while cycle and len(speakers) < turns:
+                speakers.extend(cycle[:turns - len(speakers)])
+            speakers = speakers[:turns]
+        steps.extend((phase_index, speaker, candidates) for speaker, candidates in speakers)
+        for speaker, candidates in speakers:
+            if speaker is None:
+                spoken.update(dict.fromkeys(candidates))
+                continue
+            count = spoken.get(speaker, 0)
+            if count is None:
+                continue
+            if pinned:
+                pinned_turns.add((speaker, count))
+            spoken[speaker] = count + 1
+
+        rule = phase["rule"].format(**params) if phase.get("rule") else ""
+        if rule:
+            rules.append(rule)
+
+        phases.append({
+            "id": phase["id"],
+            "label": phase.get("label", phase["id"]),
+            "announce": bool(phase.get("announce")),
+            "turns": turns,
+            "rule": rule,
+            "numbered": bool(phase.get("numbered")),
+            "independent": bool(phase.get("independent")),
+            "pinned": bool(pinned),
+        })
+
+    visibility = {}
+    for role, hidden in spec.get("visibility", {}).items():
+        unknown = {role, *hidden} - set(ROLES)
+        if unknown:
+            raise ValueError(f"赛制 {name} 的可见性规则包含未知角色：{sorted(unknown)}")
+        visibility[role] = frozenset(hidden)
+
+    return CompiledFormat(
+        name=name,
+        label=spec.get("label", name),
+        phases=tuple(phases),
+        steps=tuple(steps),
+        visibility=visibility,
+        rules=tuple(rules),
+        pinned_turns=frozenset(pinned_turns),
+    )
+
+
+def load_format_spec(path):
+    """从 JSON 或 YAML 文件读取赛制定义（YAML 需要安装 PyYAML）"""
+    with open(path, encoding="utf-8") as f:
+        if os.path.splitext(path)[1].lower() in (".yaml", ".yml"):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("读取 YAML 赛制文件需要安装 PyYAML：pip install pyyaml")
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+@lru_cache(maxsize=128)
+def get_compiled_format(debate_format, debaters_per_side, judges_count, free_debate_turns, parallel_judging):
+    """获取编译后的赛制（按赛制和参数缓存，同一进程中的多场辩论共享）
+
+    Args:
+        debate_format: 内置赛制名称（见 DEBATE_FORMATS）或赛制定义文件路径
+    """
+    if debate_format in DEBATE_FORMATS:
+        spec = DEBATE_FORMATS[debate_format]
+    elif os.path.isfile(debate_format):
+        spec = load_format_spec(debate_format)
+    else:
+        raise ValueError(f"未知的赛制：{debate_format}，可选：{list(DEBATE_FORMATS)} 或赛制定义文件路径")
+    return compile_format(spec, debaters_per_side, judges_count, free_debate_turns, parallel_judging, name=debate_format)
@@ -1,158 +1,200 @@
 import random
+import uuid
+import config
 from config import max_free_debate_turns
+from debate_formats import JUDGE_PANEL_NAME, MODERATOR_NAME, VisibilityView, get_compiled_format, compile_format
+from debate_timeline import create_timeline
 
 # ============================================================================
 # 辩论状态机（带独立裁判评分）
 # ============================================================================
 class DebateStateMachine:
-    """管理辩论流程的状态机，支持裁判独立评分"""
-    
-    def __init__(self, max_free_debate_turns=None, debaters_per_side=None, judges_count=None):
-        self.state = "intro"  # 状态：intro -> opening -> free_debate -> closing -> judging -> final -> end
-        self.round_count = 0
-        self.free_debate_turns = 0
+    """管理辩论流程的状态机，支持裁判独立评分
+
+    辩论流程由赛制定义（见 debate_formats.py）决定，创建时一次性编译为发言步骤表，
+    每次选择发言者只需前进一步；按名称查找 Agent 使用索引，不再遍历 Agent 列表。
+    """
+
+    __slots__ = (
+        "debate_id", "timeline", "state", "round_count",
+        "max_free_debate_turns", "debaters_per_side", "judges_count", "parallel_judging", "rng",
+        "debate_messages", "judge_scores", "judge_verdicts", "format",
+        "_format_source", "_seed", "_step", "_phase", "_views", "_agent_index", "_indexed_agents", "_indexed_count",
+    )
+
+    def __init__(self, max_free_debate_turns=None, debaters_per_side=None, judges_count=None, parallel_judging=None, seed=None, debate_format=None):
+        self.debate_id = uuid.uuid4().hex[:12]  # 辩论标识，用于关联埋点和日志
+        self.state = "intro"  # 当前阶段标识，标准赛制：intro -> opening -> free_debate -> closing -> judging -> final -> end
+        self.round_count = 0  # 当前阶段内已发言的辩手/裁判数（不含主持人宣布）
         self.max_free_debate_turns = max_free_debate_turns  # 允许多次自由辩论（可配置）
         self.debaters_per_side = debaters_per_side  # 每方辩手人数
         self.judges_count = judges_count  # 裁判人数
+        # 是否由裁判团并行评分（各裁判同时独立评分）
+        self.parallel_judging = config.parallel_judging if parallel_judging is None else parallel_judging
+        # 自由辩论随机选人使用独立的随机数生成器，固定种子即可复现发言顺序
+        self._seed = config.debate_random_seed if seed is None else seed
+        self.rng = random.Random(self._seed)
         
         # 存储辩论内容（不包含裁判评分）
         self.debate_messages = []
         
         # 存储裁判评分（独立保存）
         self.judge_scores = {}
-        
-        # 当前正在评分的裁判
-        self.current_judge_index = 0
+        # 本地解析后的裁判评分（见 agents/verdicts.py），用于汇总和模板化的最终裁决
+        self.judge_verdicts = {}
+
+        # 编译后的赛制：内置赛制名称或定义文件按参数缓存，直接传入的定义字典单独编译
+        debate_format = config.debate_format if debate_format is None else debate_format
+        self._format_source = debate_format
+        if isinstance(debate_format, dict):
+            self.format = compile_format(debate_format, debaters_per_side, judges_count, max_free_debate_turns, self.parallel_judging)
+        else:
+            self.format = get_compiled_format(debate_format, debaters_per_side, judges_count, max_free_debate_turns, self.parallel_judging)
+        # 阶段时间线，记录各阶段和各发言的耗时，阶段名称取自赛制
+        self.timeline = create_timeline(self.debate_id, self.format.get_phase_labels())
+
+        # 下一个发言步骤的序号，以及当前阶段的定义
+        self._step = 0
+        self._phase = None
+
+        # 各发言者的可见视图（按需创建，增量维护）
+        self._views = {}
+
+        # Agent 名称索引（首次选择发言者时按 groupchat.agents 建立）
+        self._agent_index = {}
+        self._indexed_agents = None
+        self._indexed_count = 0
+
+    def get_schedule(self):
+        """获取编译后的赛制（阶段、发言步骤、可见性规则），可用于检查或测试发言顺序"""
+        return self.format.to_dict()
 
     def next_speaker(self, last_speaker, groupchat):
-        """根据当前状态决定下一个发言者"""
-        
-        if self.state == "intro":
-            # 主持人介绍
-            self.state = "opening"
+        """根据当前状态决定下一个发言者，并在时间线中开始新的一段发言"""
+        speaker = self._select_speaker(last_speaker, groupchat)
+        if speaker is None:
+            self.timeline.finish()
+        else:
+            self.timeline.begin_turn(speaker.name, self.state, self._phase["label"] if self._phase else None)
+        return speaker
+
+    def _set_state(self, new_state):
+        """切换状态并记录阶段转换"""
+        if new_state != self.state:
+            self.timeline.on_transition(self.state, new_state)
+        self.state = new_state
+
+    def _select_speaker(self, last_speaker, groupchat):
+        """按发言步骤表前进一步，返回下一个发言者，全部步骤结束后返回 None"""
+        steps = self.format.steps
+        if self._step >= len(steps):
+            # 辩论结束
+            self._set_state("end")
+            return None
+
+        phase_index, speaker_name, candidates = steps[self._step]
+        self._step += 1
+
+        phase = self.format.phases[phase_index]
+        if phase is not self._phase:
+            # 进入新阶段
+            self._phase = phase
             self.round_count = 0
-            return self._get_agent("主持人", groupchat)
-        
-        elif self.state == "opening":
-            # 开场陈述：正1 反1 正2 反2 正3 反3
-            opening_order = []
-            for i in range(1, self.debaters_per_side + 1):
-                opening_order.extend([f"正方辩手{i}", f"反方辩手{i}"])
-            
-            if self.round_count < len(opening_order):
-                speaker_name = opening_order[self.round_count]
-                self.round_count += 1
-                return self._get_agent(speaker_name, groupchat)
-            else:
-                # 开场结束，进入自由辩论
-                self.state = "free_debate"
-                self.round_count = 0
-                self.free_debate_turns = 0
-                return self._get_agent("主持人", groupchat)
-        
-        elif self.state == "free_debate":
-            # 主持人宣布后，开始自由辩论
-            if last_speaker.name == "主持人":
-                self.free_debate_turns = 1
-                return self._get_agent("正方辩手1", groupchat)
-            
-            # 自由辩论：正反方交替，随机选择队内成员
-            if self.free_debate_turns >= self.max_free_debate_turns:
-                self.state = "closing"
-                self.round_count = 1
-                return self._get_agent("主持人", groupchat)
-            
-            # 正反方交替
-            if self.free_debate_turns % 2 == 0:
-                # 正方回合
-                debater_num = random.randint(1, self.debaters_per_side)
-                speaker_name = f"正方辩手{debater_num}"
-            else:
-                # 反方回合
-                debater_num = random.randint(1, self.debaters_per_side)
-                speaker_name = f"反方辩手{debater_num}"
-            
-            self.free_debate_turns += 1
-            return self._get_agent(speaker_name, groupchat)
-        
-        elif self.state == "closing":
-            # 主持人宣布后，开始总结
-            if last_speaker.name == "主持人":
-                self.round_count = 0
-                return self._get_agent(f"反方辩手{self.debaters_per_side}", groupchat)
-
-            closing_order = [f"正方辩手{self.debaters_per_side}"]
-            
-            if self.round_count < len(closing_order):
-                speaker_name = closing_order[self.round_count]
-                self.round_count += 1
-                return self._get_agent(speaker_name, groupchat)
-            else:
-                # 总结结束，进入评判（主持人宣布）
-                self.state = "judging"
-                self.round_count = 0
-                self.current_judge_index = 0
-                return self._get_agent("主持人", groupchat)
-        
-        elif self.state == "judging":
-            # 主持人宣布后，裁判依次评分（但彼此看不到对方评分）
-            # 裁判评分：裁判1 裁判2 裁判3
-            # 关键：每个裁判只看辩论内容，看不到其他裁判的评分
-            judge_order = [f"裁判{i}" for i in range(1, self.judges_count + 1)]
-            
-            if last_speaker.name == "主持人":
-                self.current_judge_index = 1  # 下一个裁判是裁判2
-                return self._get_agent(judge_order[0], groupchat)
-            
-            if self.current_judge_index < len(judge_order):
-                judge_name = judge_order[self.current_judge_index]
-                self.current_judge_index += 1
-                return self._get_agent(judge_name, groupchat)
-            else:
-                # 所有裁判评分完毕，主持人综合宣布结果
-                self.state = "final"
-                return self._get_agent("主持人", groupchat)
-        
-        elif self.state == "final":
-            # 主持人宣布最终结果后结束
-            self.state = "end"
+            self._set_state(phase["id"])
+
+        if speaker_name is None:
+            # 随机选人（随机数的取法与按编号拼接名称时一致，固定种子的发言顺序不变）
+            speaker_name = candidates[self.rng.randint(1, len(candidates)) - 1]
+        if speaker_name != MODERATOR_NAME:
+            self.round_count += 1
+        return self._get_agent(speaker_name, groupchat)
+
+    def get_next_opening_speaker(self):
+        """可提前生成的阶段中，当前发言者之后的下一位辩手名称，没有时返回 None"""
+        if self._phase is None or not self._phase["independent"] or self._step >= len(self.format.steps):
             return None
-        
-        elif self.state == "end":
-            # 辩论结束
+        phase_index, speaker_name, _ = self.format.steps[self._step]
+        if self.format.phases[phase_index] is not self._phase:
             return None
-        
-        return None
-    
+        return speaker_name
+
+    def get_checkpoint_state(self):
+        """导出恢复辩论所需的状态（可 JSON 序列化）"""
+        return {
+            "debate_id": self.debate_id,
+            "state": self.state,
+            "round_count": self.round_count,
+            "step": self._step,
+            "judge_scores": dict(self.judge_scores),
+            "judge_verdicts": dict(self.judge_verdicts),
+        }
+
+    def get_checkpoint_config(self):
+        """导出重建状态机所需的参数（可 JSON 序列化）"""
+        return {
+            "max_free_debate_turns": self.max_free_debate_turns,
+            "debaters_per_side": self.debaters_per_side,
+            "judges_count": self.judges_count,
+            "parallel_judging": self.parallel_judging,
+            "seed": self._seed,
+            "debate_format": self._format_source,
+        }
+
+    def restore_checkpoint_state(self, checkpoint_state):
+        """恢复 get_checkpoint_state 导出的状态，之后的 next_speaker 从下一步继续"""
+        self.debate_id = checkpoint_state["debate_id"]
+        self.timeline = create_timeline(self.debate_id, self.format.get_phase_labels())
+        self.state = checkpoint_state["state"]
+        self.round_count = checkpoint_state["round_count"]
+        self.judge_scores = dict(checkpoint_state["judge_scores"])
+        self.judge_verdicts = dict(checkpoint_state.get("judge_verdicts", {}))
+        self._step = checkpoint_state["step"]
+        steps = self.format.steps
+        self._phase = self.format.phases[steps[self._step - 1][0]] if 0 < self._step <= len(steps) else None
+        # 重放已经发生的随机选人，固定种子时之后的发言顺序与不中断时一致
+        for _, _, candidates in steps[:self._step]:
+            if candidates:
+                self.rng.randint(1, len(candidates))
+
+    def visible_messages(self, viewer, messages):
+        """按赛制的可见性规则过滤 viewer 能看到的对话历史，无需过滤时返回原列表
+
+        返回的列表由 viewer 的可见视图增量维护，调用方不能修改。
+        """
+        view = self._views.get(viewer)
+        if view is None:
+            view = self._views.setdefault(viewer, VisibilityView(viewer, self.format.visibility))
+        return view.get(messages)
+
     def _get_agent(self, name, groupchat):
-        """根据名称获取agent"""
-        for agent in groupchat.agents:
-            if agent.name == name:
-                return agent
-        return None
+        """根据名称获取agent（Agent 列表变化时重建索引）"""
+        agents = groupchat.agents
+        if agents is not self._indexed_agents or len(agents) != self._indexed_count:
+            index = {}
+            for agent in agents:
+                # 重名时与逐个查找一致，取第一个
+                index.setdefault(agent.name, agent)
+            self._agent_index = index
+            self._indexed_agents = agents
+            self._indexed_count = len(agents)
+        return self._agent_index.get(name)
 
     def get_state_name(self):
-        """获取当前状态中文名称"""
-        if self.state == "free_debate":
+        """获取当前阶段中文名称（用于辩手发言标签）"""
+        if self._phase is None:
+            return "未知状态"
+        if self._phase["numbered"]:
             # 自由辩论显示轮数
-            turn_number = self.free_debate_turns if self.free_debate_turns > 0 else 1
-            return f"自由辩论-第{turn_number}轮"
-        else:
-            state_desc = {
-                "opening": "开场陈述",
-                "closing": "总结陈词",
-            }
-            return state_desc.get(self.state, "未知状态")
+            turn_number = self.round_count if self.round_count > 0 else 1
+            return f"{self._phase['label']}-第{turn_number}轮"
+        return self._phase["label"]
 
     def get_state_description(self):
         """获取当前状态描述（用于调试）"""
-        state_desc = {
-            "intro": "介绍阶段",
-            "opening": f"开场陈述 (第{self.round_count}位)",
-            "free_debate": f"自由辩论 (第{self.free_debate_turns}轮)",
-            "closing": f"总结陈词 (第{self.round_count}位)",
-            "judging": f"裁判评分 (第{self.current_judge_index}位)",
-            "final": "主持人宣布结果",
-            "end": "辩论结束"
-        }
-        return state_desc.get(self.state, "未知状态")
\ No newline at end of file
+        if self.state == "end":
+            return "辩论结束"
+        if self._phase is None:
+            return "介绍阶段"
+        if self.state == "judging" and self.parallel_judging:
+            return f"{self._phase['label']} (并行)"
+        return f"{self._phase['label']} (第{self.round_count}位)"
@@ -0,0 +1,226 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from instrumentation import get_call_context
+
+# ============================================================================
+# 辩论阶段时间线
+# ============================================================================
+# 没有赛制提供阶段名称时（如 end 状态）使用的默认名称
+PHASE_NAMES = {
+    "intro": "主持人介绍",
+    "opening": "开场陈述",
+    "free_debate": "自由辩论",
+    "cross_examination": "质询",
+    "rebuttal": "反驳",
+    "closing": "总结陈词",
+    "judging": "裁判评分",
+    "final": "宣布结果",
+    "end": "辩论结束",
+}
+
+# 进程内保留的时间线数量（批量运行时避免无限增长）
+MAX_TIMELINES = 64
+
+_timelines = OrderedDict()
+_timelines_lock = threading.Lock()
+
+
+class DebateTimeline:
+    """记录一场辩论中各阶段、各发言及信息提取的耗时
+
+    由 DebateStateMachine 驱动：每次选择发言者时结束上一段发言并开始新的一段，
+    状态切换时记录阶段转换；信息提取耗时按调用上下文归入当前发言。
+
+    Args:
+        phase_labels: 阶段标识 -> 名称，取自赛制定义，缺少的阶段使用 PHASE_NAMES
+    """
+
+    def __init__(self, debate_id: str, phase_labels: Optional[Dict[str, str]] = None):
+        self.debate_id = debate_id
+        self.phase_labels = dict(phase_labels or {})
+        self._lock = threading.Lock()
+        self.start_time: Optional[float] = None
+        self.end_time: Optional[float] = None
+        # 发言记录：{"speaker", "phase", "label", "start", "end", "extraction", "spans"}
+        self.turns: List[Dict] = []
+        # 阶段转换：{"from", "to", "time"}
+        self.transitions: List[Dict] = []
+        self._current: Optional[Dict] = None
+
+    def on_transition(self, old_state: str, new_state: str):
+        """状态机切换阶段时调用"""
+        with self._lock:
+            if self.start_time is None:
+                self.start_time = time.perf_counter()
+            self.transitions.append({"from": old_state, "to": new_state, "time": time.perf_counter()})
+
+    def phase_name(self, phase: str) -> str:
+        """阶段名称：优先使用赛制中的名称，其次 PHASE_NAMES，都没有时为阶段标识"""
+        return self.phase_labels.get(phase) or PHASE_NAMES.get(phase, phase)
+
+    def begin_turn(self, speaker: str, phase: str, label: Optional[str] = None):
+        """开始一段发言（同时结束上一段）
+
+        Args:
+            label: 发言所在阶段的名称（同一阶段标识在赛制中可能有不同名称，如 正方立论 / 反方立论）
+        """
+        now = time.perf_counter()
+        with self._lock:
+            if self.start_time is None:
+                self.start_time = now
+            self._close_current(now)
+            self._current = {"speaker": speaker, "phase": phase, "label": label or self.phase_name(phase), "start": now, "end": None, "extraction": 0.0, "spans": []}
+            self.turns.append(self._current)
+
+    def add_span(self, name: str, start: float, end: float):
+        """为当前发言添加子区间（如裁判团中每位裁判的评分）"""
+        with self._lock:
+            if self._current is not None:
+                self._current["spans"].append({"name": name, "start": start, "end": end})
+
+    def add_extraction(self, duration: float):
+        """累计当前发言中信息提取的耗时"""
+        with self._lock:
+            if self._current is not None:
+                self._current["extraction"] += duration
+
+    def finish(self):
+        """结束最后一段发言，可重复调用"""
+        now = time.perf_counter()
+        with self._lock:
+            self._close_current(now)
+            if self.start_time is not None and self.end_time is None:
+                self.end_time = now
+
+    def _close_current(self, now):
+        if self._current is not None and self._current["end"] is None:
+            self._current["end"] = now
+        self._current = None
+
+    # ------------------------------------------------------------------
+    # 统计与报告
+    # ------------------------------------------------------------------
+    def get_phase_stats(self) -> List[Dict]:
+        """按阶段汇总耗时，阶段按首次出现的顺序排列"""
+        phases = OrderedDict()
+        with self._lock:
+            turns = [dict(t) for t in self.turns if t["end"] is not None]
+        for turn in turns:
+            stats = phases.setdefault(turn["phase"], {"phase": turn["phase"], "start": turn["start"], "end": turn["end"], "turns": 0, "duration": 0.0, "extraction": 0.0})
+            stats["end"] = max(stats["end"], turn["end"])
+            stats["turns"] += 1
+            stats["duration"] += turn["end"] - turn["start"]
+            stats["extraction"] += turn["extraction"]
+        return list(phases.values())
+
+    def get_total_duration(self) -> float:
+        if self.start_time is None:
+            return 0.0
+        return (self.end_time or time.perf_counter()) - self.start_time
+
+    def to_markdown(self, title: Optional[str] = None) -> str:
+        """生成包含阶段耗时表、发言耗时表和 Mermaid 甘特图的 Markdown 报告"""
+        total = self.get_total_duration()
+        phase_stats = self.get_phase_stats()
+        with self._lock:
+            turns = [dict(t) for t in self.turns if t["end"] is not None]
+        origin = self.start_time or 0.0
+
+        content = "# AI辩论系统 - 阶段时间线\n\n"
+        if title:
+            content += f"## 辩论辩题\n{title}\n\n"
+        content += f"- 辩论标识：{self.debate_id}\n"
+        content += f"- 总耗时：{total:.2f} 秒\n"
+        extraction_total = sum(t["extraction"] for t in turns)
+        content += f"- 信息提取总耗时：{extraction_total:.3f} 秒（{_ratio(extraction_total, total)}）\n\n"
+
+        content += "## 阶段耗时\n\n"
+        content += "| 阶段 | 耗时(秒) | 占比 | 发言数 | 信息提取(秒) | 提取占比 |\n"
+        content += "| --- | ---: | ---: | ---: | ---: | ---: |\n"
+        for stats in phase_stats:
+            content += (
+                f"| {self.phase_name(stats['phase'])} | {stats['duration']:.2f} | {_ratio(stats['duration'], total)} "
+                f"| {stats['turns']} | {stats['extraction']:.3f} | {_ratio(stats['extraction'], stats['duration'])} |\n"
+            )
+        content += "\n"
+
+        with self._lock:
+            transitions = list(self.transitions)
+        if transitions:
+            content += "## 阶段切换\n\n"
+            for t in transitions:
+                content += f"- {t['time'] - origin:.2f} 秒：{self.phase_name(t['from'])} → {self.phase_name(t['to'])}\n"
+            content += "\n"
+
+        content += "## 发言耗时\n\n"
+        content += "| 序号 | 阶段 | 发言者 | 开始(秒) | 耗时(秒) | 信息提取(秒) |\n"
+        content += "| ---: | --- | --- | ---: | ---: | ---: |\n"
+        for index, turn in enumerate(turns, 1):
+            content += (
+                f"| {index} | {turn['label']} | {turn['speaker']} | {turn['start'] - origin:.2f} "
+                f"| {turn['end'] - turn['start']:.2f} | {turn['extraction']:.3f} |\n"
+            )
+            for span in sorted(turn["spans"], key=lambda x: x["start"]):
+                content += f"| | | └ {span['name']} | {span['start'] - origin:.2f} | {span['end'] - span['start']:.2f} | |\n"
+        content += "\n"
+
+        # Mermaid 甘特图，时间为相对辩论开始的毫秒数
+        content += "## 甘特图\n\n```mermaid\ngantt\n    dateFormat x\n    axisFormat %M:%S\n"
+        current_section = None
+        for turn in turns:
+            if turn["label"] != current_section:
+                current_section = turn["label"]
+                content += f"    section {current_section}\n"
+            content += f"    {turn['speaker']} : {_gantt_range(turn['start'] - origin, turn['end'] - origin)}\n"
+            for span in sorted(turn["spans"], key=lambda x: x["start"]):
+                content += f"    {span['name']} : {_gantt_range(span['start'] - origin, span['end'] - origin)}\n"
+        content += "```\n"
+        return content
+
+    def export_markdown(self, path: str, title: Optional[str] = None):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.to_markdown(title))
+
+
+def _ratio(part, whole):
+    return f"{part / whole:.1%}" if whole else "0.0%"
+
+
+def _gantt_range(start, end):
+    # 甘特图中零长度的任务不显示，至少保留1毫秒
+    start_ms = max(0, int(start * 1000))
+    return f"{start_ms}, {max(start_ms + 1, int(end * 1000))}"
+
+
+# ============================================================================
+# 时间线注册表
+# ============================================================================
+def create_timeline(debate_id: str, phase_labels: Optional[Dict[str, str]] = None) -> DebateTimeline:
+    """创建并登记一场辩论的时间线"""
+    timeline = DebateTimeline(debate_id, phase_labels)
+    with _timelines_lock:
+        _timelines[debate_id] = timeline
+        while len(_timelines) > MAX_TIMELINES:
+            _timelines.popitem(last=False)
+    return timeline
+
+
+def get_timeline(debate_id: Optional[str]) -> Optional[DebateTimeline]:
+    with _timelines_lock:
+        return _timelines.get(debate_id)
+
+
+def get_latest_timeline() -> Optional[DebateTimeline]:
+    """获取最近一场辩论的时间线（界面导出时使用）"""
+    with _timelines_lock:
+        return next(reversed(_timelines.values()), None)
+
+
+def record_extraction(duration: float):
+    """把一次信息提取的耗时记入当前调用上下文所属辩论的时间线"""
+    timeline = get_timeline(get_call_context().get("debate_id"))
+    if timeline is not None:
+        timeline.add_extraction(duration)
@@ -2,9 +2,12 @@ import tkinter as tk
 from tkinter import ttk, scrolledtext, filedialog
 import threading
 import queue
+import time
 from config import get_debate_model_assignments, update_config, models_by_company, judge_models
 from debater_traits import get_all_trait_names, get_trait_info, get_random_trait, create_custom_trait
 import datetime
+import os
+from debate_timeline import get_latest_timeline
 
 class DebateConfigWindow:
     """辩论配置窗口类"""
@@ -646,6 +649,11 @@ class DebateUI:
         'btn_disabled_fg': '#718096',
     }
     
+    # 消息调度：每帧最多占用的渲染时间、每批最多取出的消息数、队列为空时的轮询间隔
+    FRAME_BUDGET_MS = 16
+    MAX_BATCH_SIZE = 64
+    IDLE_POLL_MS = 50
+    
     def __init__(self, debate_func):
         self.debate_func = debate_func
         self.root = tk.Tk()
@@ -654,14 +662,18 @@ class DebateUI:
         self.root.resizable(True, True)
         self.root.configure(bg=self.COLORS['bg'])
         
-        # 消息队列
+        # 消息队列（后台线程只写入队列，由主线程轮询处理）
         self.message_queue = queue.Queue()
+        # 当前排队中的 after 回调
+        self.process_after_id = None
         
         # 当前发言者
         self.current_speaker = None
         
         # 辩论历史记录
         self.debate_history = []
+        # 历史面板中已渲染的记录条数（用于增量追加）
+        self.history_rendered_count = 0
         
         # 辩手数量（初始化后会更新）
         self.debaters_per_side = 0
@@ -679,8 +691,8 @@ class DebateUI:
         # 创建界面布局
         self.create_widgets()
         
-        # 启动消息处理
-        self.root.after(100, self.process_messages)
+        # 启动消息处理：主线程通过 after 轮询消息队列
+        self.schedule_process_messages(self.IDLE_POLL_MS)
         
     def create_widgets(self):
         """创建界面组件"""
@@ -819,6 +831,12 @@ class DebateUI:
                                                       bg=self.COLORS['text_bg'], relief='flat')
         self.history_text.pack(fill=tk.BOTH, expand=True, padx=8, pady=(8, 5))
         
+        # 创建不同角色的标签样式（只需配置一次）
+        self.history_text.tag_configure("moderator", background="#4CAF50", foreground="white", font=('Arial', 10, 'bold'))
+        self.history_text.tag_configure("pro", background="#2196F3", foreground="white", font=('Arial', 10, 'bold'))
+        self.history_text.tag_configure("con", background="#F44336", foreground="white", font=('Arial', 10, 'bold'))
+        self.history_text.tag_configure("judge", background="#FF9800", foreground="white", font=('Arial', 10, 'bold'))
+        
         # 导出按钮
         self.export_button = tk.Button(right_frame, text="📥 导出本场辩论", 
                                        font=("Microsoft YaHei", 10, "bold"), bg='#6c5ce7', fg='white',
@@ -1215,6 +1233,7 @@ class DebateUI:
         self.con_text.delete(1.0, tk.END)
         self.judges_text.delete(1.0, tk.END)
         self.history_text.delete(1.0, tk.END)
+        self.history_rendered_count = 0
         
         self.moderator_text.config(state=tk.DISABLED)
         self.pro_text.config(state=tk.DISABLED)
@@ -1223,24 +1242,91 @@ class DebateUI:
         self.history_text.config(state=tk.DISABLED)
     
     def ui_callback(self, speaker_name, message):
-        """UI回调函数，接收来自Agent的消息"""
+        """UI回调函数，接收来自Agent的消息
+
+        由辩论线程和裁判线程调用，只写入消息队列；Tkinter 不是线程安全的，
+        界面只能在主线程中由 process_messages 更新。
+        """
         self.message_queue.put((speaker_name, message))
     
+    def schedule_process_messages(self, delay_ms):
+        """安排下一次消息处理，保证同一时间只有一个待执行的回调"""
+        if self.process_after_id is not None:
+            self.root.after_cancel(self.process_after_id)
+        self.process_after_id = self.root.after(delay_ms, self.process_messages)
+    
     def process_messages(self):
-        """处理消息队列中的消息"""
-        try:
-            while True:
-                speaker_name, message = self.message_queue.get_nowait()
-                # 检查是否是辩论结束信号
-                if speaker_name == "__DEBATE_END__":
-                    self.on_debate_end()
-                else:
-                    self.show_message(speaker_name, message)
-        except queue.Empty:
-            pass
+        """按帧预算分批处理消息队列中的消息（在主线程中由 after 调度）"""
+        deadline = time.perf_counter() + self.FRAME_BUDGET_MS / 1000
+        
+        while time.perf_counter() < deadline:
+            batch = []
+            try:
+                while len(batch) < self.MAX_BATCH_SIZE:
+                    batch.append(self.message_queue.get_nowait())
+            except queue.Empty:
+                pass
+            
+            if not batch:
+                break
+            self.render_batch(batch)
+        
+        # 本帧预算用完仍有积压时，让出事件循环后尽快继续；否则回到空闲轮询
+        if self.message_queue.empty():
+            self.schedule_process_messages(self.IDLE_POLL_MS)
+        else:
+            self.schedule_process_messages(1)
+    
+    def render_batch(self, batch):
+        """渲染一批消息，合并对同一面板的连续更新"""
+        i = 0
+        while i < len(batch):
+            speaker_name, message = batch[i]
+            
+            # 检查是否是辩论结束信号
+            if speaker_name == "__DEBATE_END__":
+                self.on_debate_end()
+                i += 1
+                continue
+            
+            # 流式输出：同一辩手连续的增量文本合并为一次插入
+            if speaker_name == "__STREAM__":
+                stream_speaker, chunk = message
+                j = i + 1
+                if chunk is not None:
+                    chunks = [chunk]
+                    while (j < len(batch) and batch[j][0] == "__STREAM__"
+                           and batch[j][1][0] == stream_speaker and batch[j][1][1] is not None):
+                        chunks.append(batch[j][1][1])
+                        j += 1
+                    chunk = "".join(chunks)
+                self.show_stream_chunk(stream_speaker, chunk)
+                i = j
+                continue
+            
+            # 普通消息：连续发往同一面板的只渲染最后一条，但全部写入历史记录
+            panel = self.get_message_panel(speaker_name)
+            j = i + 1
+            while (j < len(batch) and batch[j][0] not in ("__DEBATE_END__", "__STREAM__")
+                   and self.get_message_panel(batch[j][0]) is panel):
+                j += 1
+            self.debate_history.extend(batch[i:j - 1])
+            self.show_message(*batch[j - 1], update_history=False)
+            i = j
         
-        # 继续监听消息
-        self.root.after(100, self.process_messages)
+        self.update_history_text()
+    
+    def get_message_panel(self, speaker_name):
+        """获取发言者对应的消息面板，没有对应面板时返回 None"""
+        if speaker_name == "主持人":
+            return self.moderator_text
+        elif speaker_name.startswith("正方辩手"):
+            return self.pro_text
+        elif speaker_name.startswith("反方辩手"):
+            return self.con_text
+        elif speaker_name.startswith("裁判"):
+            return self.judges_text
+        return None
     
     def on_debate_end(self):
         """辩论结束时的处理"""
@@ -1254,8 +1340,11 @@ class DebateUI:
         self.debate_history.append(("系统消息", end_info))
         self.update_history_text()
     
-    def show_message(self, speaker_name, message):
-        """在界面上显示消息"""
+    def show_message(self, speaker_name, message, update_history=True):
+        """在界面上显示消息
+        
+        update_history 为 False 时只记入 debate_history，由调用方统一刷新历史面板
+        """
         # 高亮当前发言者圆圈
         self.highlight_speaker(speaker_name)
         
@@ -1275,7 +1364,32 @@ class DebateUI:
         
         # 更新历史记录
         self.debate_history.append((speaker_name, message))
-        self.update_history_text()
+        if update_history:
+            self.update_history_text()
+    
+    def show_stream_chunk(self, speaker_name, chunk):
+        """显示辩手流式输出的增量文本（不记入历史记录）
+        
+        chunk 为 None 表示新一轮输出开始；生成结束后 show_message 会用提取后的
+        完整回复覆盖面板内容并写入历史记录。
+        """
+        if speaker_name.startswith("正方辩手"):
+            widget, label = self.pro_text, self.pro_speaker_label
+        elif speaker_name.startswith("反方辩手"):
+            widget, label = self.con_text, self.con_speaker_label
+        else:
+            return
+        
+        widget.config(state=tk.NORMAL)
+        if chunk is None:
+            self.highlight_speaker(speaker_name)
+            self.current_speaker = speaker_name
+            label.config(text=speaker_name)
+            widget.delete(1.0, tk.END)
+        else:
+            widget.insert(tk.END, chunk)
+            widget.see(tk.END)
+        widget.config(state=tk.DISABLED)
     
     def update_text_widget(self, widget, message):
         """更新文本组件"""
@@ -1293,18 +1407,20 @@ class DebateUI:
         widget.config(state=tk.DISABLED)
     
     def update_history_text(self):
-        """更新历史记录文本"""
-        self.history_text.config(state=tk.NORMAL)
-        self.history_text.delete(1.0, tk.END)
+        """更新历史记录文本（只追加尚未渲染的记录）"""
+        # 历史记录被外部清空或替换时，回退到完整重建
+        if self.history_rendered_count > len(self.debate_history):
+            self.rebuild_history_text()
+            return
         
-        # 创建不同角色的标签样式
-        self.history_text.tag_configure("moderator", background="#4CAF50", foreground="white", font=('Arial', 10, 'bold'))
-        self.history_text.tag_configure("pro", background="#2196F3", foreground="white", font=('Arial', 10, 'bold'))
-        self.history_text.tag_configure("con", background="#F44336", foreground="white", font=('Arial', 10, 'bold'))
-        self.history_text.tag_configure("judge", background="#FF9800", foreground="white", font=('Arial', 10, 'bold'))
+        if self.history_rendered_count == len(self.debate_history):
+            return
+        
+        self.history_text.config(state=tk.NORMAL)
         
-        # 显示历史记录，每条记录之间用分隔线分隔
-        for i, (speaker, message) in enumerate(self.debate_history):
+        # 显示新增的历史记录，每条记录之间用分隔线分隔
+        for i in range(self.history_rendered_count, len(self.debate_history)):
+            speaker, message = self.debate_history[i]
             if i > 0:
                 # 添加明显的分隔线
                 self.history_text.insert(tk.END, "\n" + "="*60 + "\n\n")
@@ -1325,9 +1441,19 @@ class DebateUI:
             self.history_text.insert(tk.END, f"{speaker}:\n", tag)
             self.history_text.insert(tk.END, f"{message}\n")
         
+        self.history_rendered_count = len(self.debate_history)
+        
         self.history_text.see(tk.END)  # 滚动到最后
         self.history_text.config(state=tk.DISABLED)
     
+    def rebuild_history_text(self):
+        """清空历史面板并按 debate_history 完整重建（仅用于重新开始和清空）"""
+        self.history_text.config(state=tk.NORMAL)
+        self.history_text.delete(1.0, tk.END)
+        self.history_text.config(state=tk.DISABLED)
+        self.history_rendered_count = 0
+        self.update_history_text()
+    
     def run(self):
         """运行界面"""
         self.root.mainloop()
@@ -1402,5 +1528,17 @@ class DebateUI:
                 f.write(markdown_content)
             
             self.show_message("系统消息", f"辩论记录已成功导出到：{file_path}")
+        except Exception as e:
+            self.show_message("系统消息", f"导出失败：{str(e)}")
+            return
+        
+        # 在辩论记录旁导出阶段时间线
+        timeline = get_latest_timeline()
+        if timeline is None or not timeline.turns:
+            return
+        timeline_path = os.path.splitext(file_path)[0] + "_timeline.md"
+        try:
+            timeline.export_markdown(timeline_path, title=topic)
+            self.show_message("系统消息", f"阶段时间线已导出到：{timeline_path}")
         except Exception as e:
             self.show_message("系统消息", f"导出失败：{str(e)}")
\ No newline at end of file
@@ -1,6 +1,10 @@
 import traceback
 import logging
 from typing import Any, Callable, Optional
+from retry_policy import (
+    classify_error, ERROR_RATE_LIMIT, ERROR_CIRCUIT_OPEN, ERROR_CONNECTION, ERROR_TIMEOUT,
+    ERROR_AUTH, ERROR_BAD_REQUEST, ERROR_SERVER,
+)
 
 # 配置日志记录器
 logging.basicConfig(
@@ -40,13 +44,16 @@ def handle_agent_error(agent_name: str, error: Exception, ui_callback: Optional[
     
     # 根据错误类型进行分类处理
     if ui_callback:
-        if "rate limit" in error_message.lower() or "quota" in error_message.lower():
+        category = classify_error(error)
+        if category == ERROR_RATE_LIMIT:
             ui_callback("系统", f"[{agent_name}] 遇到API调用频率限制，请稍后再试")
-        elif "connection" in error_message.lower() or "timeout" in error_message.lower():
+        elif category == ERROR_CIRCUIT_OPEN:
+            ui_callback("系统", f"[{agent_name}] 模型连续调用失败，已暂停调用: {error_message}")
+        elif category in (ERROR_CONNECTION, ERROR_TIMEOUT):
             ui_callback("系统", f"[{agent_name}] 网络连接问题，请检查网络连接")
-        elif "authentication" in error_message.lower() or "api key" in error_message.lower():
+        elif category == ERROR_AUTH:
             ui_callback("系统", f"[{agent_name}] API认证失败，请检查API密钥")
-        elif "model" in error_message.lower():
+        elif category in (ERROR_BAD_REQUEST, ERROR_SERVER):
             ui_callback("系统", f"[{agent_name}] 模型调用错误: {error_message}")
         else:
             ui_callback("系统", f"[{agent_name}] 发生未知错误: {error_message}")
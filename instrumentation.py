@@ -0,0 +1,173 @@
+import contextvars
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import config
+
+# ============================================================================
+# 大模型调用埋点
+# ============================================================================
+# 当前线程/协程正在处理的调用上下文（辩论、Agent、阶段），信息提取等附属调用沿用该上下文
+_call_context = contextvars.ContextVar("debate_call_context", default={})
+# 正在进行中的调用记录，流式输出通过它记录首token时间
+_active_call = contextvars.ContextVar("debate_active_call", default=None)
+
+
+def get_role(agent_name: str) -> str:
+    """根据Agent名称判断角色"""
+    if agent_name == "主持人":
+        return "moderator"
+    if agent_name.startswith("正方辩手") or agent_name.startswith("反方辩手"):
+        return "debater"
+    if agent_name.startswith("裁判"):
+        return "judge"
+    return "other"
+
+
+def set_call_context(debate_id: Optional[str], agent_name: str, phase: Optional[str]):
+    """设置当前调用上下文，之后在同一线程/协程中的附属调用都会归属到该Agent"""
+    _call_context.set({"debate_id": debate_id, "agent": agent_name, "phase": phase})
+
+
+def get_call_context() -> Dict:
+    """获取当前调用上下文"""
+    return _call_context.get()
+
+
+class InstrumentationRecorder:
+    """收集每次大模型调用的模型、角色、阶段、token、首token时间、总延迟和重试次数"""
+
+    def __init__(self, log_path: Optional[str] = None):
+        self.log_path = log_path
+        self._lock = threading.Lock()
+        self.records: List[Dict] = []
+
+    def record(self, **fields) -> Dict:
+        """记录一次调用，未提供的上下文字段从当前调用上下文补全"""
+        context = get_call_context()
+        record = {
+            "timestamp": time.time(),
+            "debate_id": context.get("debate_id"),
+            "agent": context.get("agent"),
+            "phase": context.get("phase"),
+            "role": None,
+            "model": None,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "cached_tokens": 0,
+            "ttft": None,
+            "latency": 0.0,
+            "retries": 0,
+            "cache_hit": False,
+        }
+        record.update({key: value for key, value in fields.items() if value is not None})
+        if record["role"] is None:
+            record["role"] = get_role(record["agent"] or "")
+        if record["ttft"] is None:
+            # 非流式调用的首token时间即为总延迟
+            record["ttft"] = record["latency"]
+
+        with self._lock:
+            self.records.append(record)
+            if self.log_path:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return record
+
+    @contextmanager
+    def track_call(self, model: str, retries: int = 0, **fields):
+        """统计一次调用的耗时，调用期间可通过 mark_first_token / add_usage 补充信息"""
+        call = {"model": model, "retries": retries, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, **fields}
+        token = _active_call.set(call)
+        start = time.perf_counter()
+        call["_start"] = start
+        try:
+            yield call
+        except Exception as e:
+            call["error"] = type(e).__name__
+            raise
+        finally:
+            _active_call.reset(token)
+            call["latency"] = time.perf_counter() - start
+            call.pop("_start", None)
+            self.record(**call)
+
+    def get_records(self, debate_id: Optional[str] = None) -> List[Dict]:
+        """获取调用记录，可按辩论过滤"""
+        with self._lock:
+            return [r for r in self.records if debate_id is None or r["debate_id"] == debate_id]
+
+    def export_jsonl(self, path: str, debate_id: Optional[str] = None) -> int:
+        """导出调用记录为 JSON Lines，返回导出条数"""
+        records = self.get_records(debate_id)
+        with open(path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return len(records)
+
+    def summarize(self, debate_id: Optional[str] = None) -> Dict:
+        """按角色和模型汇总调用次数、token、延迟和重试
+
+        cached_ratio 为服务商提示词缓存命中的输入token占全部输入token的比例。
+        """
+        records = self.get_records(debate_id)
+
+        def aggregate(group):
+            latencies = sorted(r["latency"] for r in group)
+            prompt_tokens = sum(r["prompt_tokens"] for r in group)
+            cached_tokens = sum(r.get("cached_tokens", 0) for r in group)
+            return {
+                "calls": len(group),
+                "cache_hits": sum(1 for r in group if r["cache_hit"]),
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": sum(r["completion_tokens"] for r in group),
+                "cached_tokens": cached_tokens,
+                "cached_ratio": cached_tokens / prompt_tokens if prompt_tokens else 0.0,
+                "total_latency": sum(latencies),
+                "avg_latency": sum(latencies) / len(latencies) if latencies else 0.0,
+                "p95_latency": latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] if latencies else 0.0,
+                "avg_ttft": sum(r["ttft"] for r in group) / len(group) if group else 0.0,
+                "retries": sum(r["retries"] for r in group),
+            }
+
+        def group_by(key):
+            groups = {}
+            for r in records:
+                groups.setdefault(r[key] or "unknown", []).append(r)
+            return {name: aggregate(group) for name, group in groups.items()}
+
+        return {
+            "debate_id": debate_id,
+            "total": aggregate(records),
+            "by_role": group_by("role"),
+            "by_model": group_by("model"),
+            "by_phase": group_by("phase"),
+        }
+
+    def clear(self):
+        with self._lock:
+            self.records.clear()
+
+
+def mark_first_token():
+    """流式输出收到第一段内容时调用，记录首token时间"""
+    call = _active_call.get()
+    if call is not None and "ttft" not in call:
+        call["ttft"] = time.perf_counter() - call["_start"]
+
+
+def add_usage(prompt_tokens: int = 0, completion_tokens: int = 0, cached_tokens: int = 0, **extra):
+    """为进行中的调用补充token用量，cached_tokens 为其中命中服务商提示词缓存的输入token"""
+    call = _active_call.get()
+    if call is not None:
+        call["prompt_tokens"] += prompt_tokens or 0
+        call["completion_tokens"] += completion_tokens or 0
+        call["cached_tokens"] = call.get("cached_tokens", 0) + (cached_tokens or 0)
+        call.update(extra)
+
+
+# 全局埋点记录器
+recorder = InstrumentationRecorder(config.instrumentation_log_path)
@@ -1,22 +1,28 @@
+import argparse
 from autogen import GroupChat, GroupChatManager, UserProxyAgent
 from debate_state import DebateStateMachine
-from agents.factory import create_agents
+from debate_formats import get_compiled_format
+from agents.factory import create_agents, create_judge_panel
 from config import debaters_per_side, judges_count, base_config, host_model, get_debate_model_assignments, update_config
-from debate_ui import DebateUI
+import config
 from error_handler import handle_debate_error, log_debate_error
+from instrumentation import recorder
+from model_router import model_router
+from checkpoint import DebateCheckpoint, load_checkpoint
+from agents.verdicts import aggregate_verdicts
+
+# 辩论发起人名称（只发送开场消息，不参与后续发言）
+INITIATOR_NAME = "辩论发起人"
 
 # ============================================================================
 # 辩论执行函数
 # ============================================================================
-def run_debate(debate_topic, ui_callback, debaters_per_side=2, judges_count=3, max_free_debate_turns=4, pro_models=None, con_models=None, judge_models=None, moderator_model=None, pro_traits=None, con_traits=None):
-    """执行辩论的函数，用于在UI中调用"""
-    # 更新配置参数
-    update_config(
-        debaters_per_side=debaters_per_side,
-        judges_count=judges_count,
-        max_free_debate_turns=max_free_debate_turns
-    )
+def build_assignments(debaters_per_side, judges_count, pro_models=None, con_models=None, judge_models=None, moderator_model=None, pro_traits=None, con_traits=None):
+    """生成模型分配和特质分配
     
+    Returns:
+        tuple: (model_assignments, trait_assignments)
+    """
     # 生成模型分配
     if pro_models and con_models and judge_models:
         # 使用自定义模型分配
@@ -39,28 +45,186 @@ def run_debate(debate_topic, ui_callback, debaters_per_side=2, judges_count=3, m
     else:
         trait_assignments = None
     
+    return model_assignments, trait_assignments
+
+def get_opening_message(debate_topic, debaters_per_side, judges_count, rules=None):
+    """辩论发起人的开场消息
+
+    Args:
+        rules: 赛制各阶段的说明（DebateStateMachine.format.rules），默认为标准赛制
+    """
+    if rules is None:
+        rules = get_compiled_format("standard", debaters_per_side, judges_count, config.max_free_debate_turns, config.parallel_judging).rules
+    rule_lines = "\n".join(f"{i}. {rule}" for i, rule in enumerate(rules, 1))
+    return f"""现在开始关于"{debate_topic}"的辩论。
+
+辩论规则：
+{rule_lines}
+
+请主持人开始介绍。"""
+
+def run_debate(debate_topic, ui_callback, debaters_per_side=2, judges_count=3, max_free_debate_turns=4, pro_models=None, con_models=None, judge_models=None, moderator_model=None, pro_traits=None, con_traits=None):
+    """执行辩论的函数，用于在UI中调用
+    
+    Returns:
+        list: GroupChat 中的完整消息记录
+    """
+    # 更新配置参数
+    update_config(
+        debaters_per_side=debaters_per_side,
+        judges_count=judges_count,
+        max_free_debate_turns=max_free_debate_turns
+    )
+    
+    # 生成模型和特质分配
+    model_assignments, trait_assignments = build_assignments(
+        debaters_per_side, judges_count, pro_models, con_models, judge_models, moderator_model, pro_traits, con_traits
+    )
+    
     # 模型配置信息已在UI初始化时显示，此处不再重复输出
     
     # 创建状态机
     print(f"Debug: 创建状态机时的参数 - max_free_debate_turns={max_free_debate_turns}, debaters_per_side={debaters_per_side}, judges_count={judges_count}")
     debate_sm = DebateStateMachine(max_free_debate_turns, debaters_per_side, judges_count)
     
+    # 每轮发言结束后写入检查点
+    checkpoint = None
+    if config.checkpoint_enabled:
+        checkpoint = DebateCheckpoint.create(debate_sm, debate_topic, model_assignments, trait_assignments)
+        print(f"Debug: 检查点文件 - {checkpoint.path}")
+    
+    groupchat, manager, user_proxy, pro_debaters = create_groupchat(
+        debate_topic, ui_callback, debate_sm, model_assignments, trait_assignments, checkpoint
+    )
+    
+    # 开始辩论
+    try:
+        user_proxy.initiate_chat(
+            manager,
+            message=get_opening_message(debate_topic, debaters_per_side, judges_count, debate_sm.format.rules),
+        )
+        # 辩论正常结束，发送结束信号
+        ui_callback("__DEBATE_END__", "辩论已结束")
+    except Exception as e:
+        log_debate_error("辩论系统", e, "run_debate - initiate_chat")
+        handle_debate_error(e, ui_callback)
+        # 发生错误时也发送结束信号
+        ui_callback("__DEBATE_END__", "辩论因错误而结束")
+    
+    finish_debate(debate_sm, pro_debaters, checkpoint)
+    return groupchat.messages
+
+def resume_debate(checkpoint_path, ui_callback):
+    """从检查点恢复中断的辩论，从最后一个已提交的发言之后继续，已完成的发言不会重新调用模型
+    
+    Returns:
+        list: GroupChat 中的完整消息记录（包含恢复前的发言）
+    """
+    data = load_checkpoint(checkpoint_path)
+    header = data["header"]
+    messages = data["messages"]
+    sm_config = header["state_machine"]
+    
+    if data["complete"]:
+        print(f"Debug: 辩论 {header['debate_id']} 已经结束，无需恢复")
+        return messages
+    
+    update_config(
+        debaters_per_side=sm_config["debaters_per_side"],
+        judges_count=sm_config["judges_count"],
+        max_free_debate_turns=sm_config["max_free_debate_turns"]
+    )
+    
+    # 重建状态机并恢复到最后一个已提交的发言
+    debate_sm = DebateStateMachine(**sm_config)
+    if data["sm"] is not None:
+        debate_sm.restore_checkpoint_state(data["sm"])
+    checkpoint = DebateCheckpoint(checkpoint_path, saved=len(messages))
+    print(f"Debug: 从检查点恢复辩论 {header['debate_id']}，已完成 {len(messages)} 条发言，当前阶段 {debate_sm.state}")
+    
+    groupchat, manager, user_proxy, pro_debaters = create_groupchat(
+        header["topic"], ui_callback, debate_sm, header["model_assignments"], header["trait_assignments"], checkpoint
+    )
+    
+    # 把已完成的发言重新推送到界面
+    for message in messages:
+        if message.get("name") in groupchat.agent_names:
+            ui_callback(message["name"], message["content"])
+    ui_callback("系统", f"已从检查点恢复，继续{debate_sm.get_state_description()}")
+    
+    try:
+        if len(messages) > 1:
+            # 载入历史后，由最后一位发言者重新发出最后一条发言，GroupChat 从下一位发言者继续
+            last_agent, last_message = manager.resume(messages, silent=True)
+            restore_own_messages(groupchat, manager, messages[:-1])
+            last_agent.initiate_chat(manager, message=last_message, clear_history=False)
+        else:
+            # 只有开场消息时，与新辩论一样开始
+            opening_message = messages[0]["content"] if messages else get_opening_message(
+                header["topic"], sm_config["debaters_per_side"], sm_config["judges_count"], debate_sm.format.rules
+            )
+            user_proxy.initiate_chat(manager, message=opening_message)
+        ui_callback("__DEBATE_END__", "辩论已结束")
+    except Exception as e:
+        log_debate_error("辩论系统", e, "resume_debate - initiate_chat")
+        handle_debate_error(e, ui_callback)
+        ui_callback("__DEBATE_END__", "辩论因错误而结束")
+    
+    finish_debate(debate_sm, pro_debaters, checkpoint)
+    return groupchat.messages
+
+def restore_own_messages(groupchat, manager, messages):
+    """补回各 Agent 自己的历史发言
+    
+    GroupChatManager.resume 只把其他人的发言发给每个 Agent，而正常辩论中 Agent 的历史里
+    也有自己的发言（角色为 assistant），这里按原顺序插回，使恢复后各 Agent 看到的历史与不中断时一致。
+    """
+    for agent in groupchat.agents:
+        others = iter(agent.chat_messages[manager])
+        history = []
+        for message in messages:
+            if message.get("name") == agent.name:
+                history.append({"content": message["content"], "name": agent.name, "role": "assistant"})
+            else:
+                history.append(next(others))
+        agent.chat_messages[manager] = history
+
+def create_groupchat(debate_topic, ui_callback, debate_sm, model_assignments, trait_assignments, checkpoint=None):
+    """创建所有 Agent、GroupChat、GroupChatManager 和辩论发起人
+    
+    Returns:
+        tuple: (groupchat, manager, user_proxy, pro_debaters)
+    """
+    debaters_per_side = debate_sm.debaters_per_side
+    judges_count = debate_sm.judges_count
+    
     # 创建agents（传入状态机引用、预分配的模型、UI回调和辩论配置参数）
     moderator, pro_debaters, con_debaters, judges = create_agents(
-        debate_topic, debate_sm, model_assignments, trait_assignments, ui_callback, max_free_debate_turns,
+        debate_topic, debate_sm, model_assignments, trait_assignments, ui_callback, debate_sm.max_free_debate_turns,
         debaters_per_side=debaters_per_side, judges_count=judges_count
     )
     
     # 所有agents列表
     all_agents = [moderator] + pro_debaters + con_debaters + judges
     
-    # 创建GroupChat
+    # 并行评分时由裁判团统一调度裁判
+    if debate_sm.parallel_judging:
+        all_agents.append(create_judge_panel(judges, debate_sm, ui_callback))
+    
+    def select_speaker(last_speaker, gc):
+        # 选择下一位发言者之前，上一位的发言已经完成，此时提交检查点
+        if checkpoint is not None:
+            checkpoint.commit(gc.messages, debate_sm)
+        return debate_sm.next_speaker(last_speaker, gc)
+    
+    # 创建GroupChat（辩论发起人不参与发言，作为管理员名称以便恢复时识别其开场消息）
     groupchat = GroupChat(
         agents=all_agents,
         messages=[],
         max_round=50,
-        speaker_selection_method=lambda last_speaker, gc: debate_sm.next_speaker(last_speaker, gc),
+        speaker_selection_method=select_speaker,
         allow_repeat_speaker=False,
+        admin_name=INITIATOR_NAME,
     )
     
     # 创建GroupChatManager
@@ -71,39 +235,63 @@ def run_debate(debate_topic, ui_callback, debaters_per_side=2, judges_count=3, m
     
     # 创建用户代理
     user_proxy = UserProxyAgent(
-        name="辩论发起人",
+        name=INITIATOR_NAME,
         human_input_mode="NEVER",
         max_consecutive_auto_reply=0,
         code_execution_config=False,
     )
-    
-    # 开始辩论
-    try:
-        user_proxy.initiate_chat(
-            manager,
-            message=f"""现在开始关于"{debate_topic}"的辩论。
+    return groupchat, manager, user_proxy, pro_debaters
 
-辩论规则：
-1. 开场陈述：正反方各{debaters_per_side}位辩手依次陈述观点
-2. 自由辩论：双方自由交锋
-3. 总结陈词：反方和正方的{debaters_per_side}号辩手总结
-4. 独立评分：{judges_count}位裁判各自独立评分（互不干扰）
-5. 最终裁决：主持人综合{judges_count}位裁判意见宣布结果
-
-请主持人开始介绍。""",
-        )
-        # 辩论正常结束，发送结束信号
-        ui_callback("__DEBATE_END__", "辩论已结束")
-    except Exception as e:
-        log_debate_error("辩论系统", e, "run_debate - initiate_chat")
-        handle_debate_error(e, ui_callback)
-        # 发生错误时也发送结束信号
-        ui_callback("__DEBATE_END__", "辩论因错误而结束")
+def finish_debate(debate_sm, pro_debaters, checkpoint=None):
+    """辩论结束后的收尾：标记检查点、输出各项统计、释放预生成线程"""
+    if checkpoint is not None and debate_sm.state == "end":
+        checkpoint.complete()
+    
+    # 输出本地汇总的裁判评分
+    aggregate = aggregate_verdicts(debate_sm.judge_verdicts)
+    if aggregate is not None:
+        print(f"Debug: 评分汇总 - 获胜方={aggregate['winner']}, 正方={aggregate['pro_mean']:.2f}, 反方={aggregate['con_mean']:.2f}, 投票={aggregate['votes']}, 置信度={aggregate['confidence']:.2f}")
+    
+    # 结束阶段时间线并输出各阶段耗时
+    debate_sm.timeline.finish()
+    print(f"Debug: 阶段耗时 - {[(p['phase'], round(p['duration'], 2), round(p['extraction'], 2)) for p in debate_sm.timeline.get_phase_stats()]}")
+    
+    # 输出本场辩论各角色的调用统计
+    print(f"Debug: 调用统计 - {recorder.summarize(debate_sm.debate_id)['by_role']}")
+    
+    # 输出模型故障切换统计
+    if config.model_routing_enabled:
+        print(f"Debug: 模型路由统计 - {model_router.get_stats()}")
+    
+    # 丢弃未采用的开场陈述预生成
+    speculator = pro_debaters[0].speculator if pro_debaters else None
+    if speculator is not None:
+        speculator.shutdown()
+        print(f"Debug: 开场陈述预生成统计 - {speculator.get_stats()}")
+    
+    # 输出上下文窗口节省的token
+    context_manager = pro_debaters[0].context_manager if pro_debaters else None
+    if context_manager is not None:
+        print(f"Debug: 上下文窗口统计 - {context_manager.get_report()}")
 
 # ============================================================================
 # 主程序
 # ============================================================================
 def main():
+    parser = argparse.ArgumentParser(description="多智能体辩论系统")
+    parser.add_argument("--resume", metavar="CHECKPOINT", help="从检查点文件恢复中断的辩论（无界面运行，发言输出到控制台）")
+    args = parser.parse_args()
+    
+    if args.resume:
+        def print_callback(speaker_name, message):
+            if speaker_name != "__STREAM__":
+                print(f"[{speaker_name}] {message}")
+        resume_debate(args.resume, print_callback)
+        return
+    
+    # 界面模块依赖Tk，仅在启动界面时导入，便于无界面环境复用 run_debate
+    from debate_ui import DebateUI
+    
     # 创建辩论界面
     debate_ui = DebateUI(run_debate)
     
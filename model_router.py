@@ -0,0 +1,151 @@
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import config
+from retry_policy import get_circuit_breaker
+
+# ============================================================================
+# 模型故障切换
+# ============================================================================
+class ModelHealth:
+    """单个模型的实时延迟和错误率（指数加权平均）"""
+
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.latency = None
+        self.error_rate = 0.0
+
+    def update(self, latency: Optional[float], ok: bool, alpha: float):
+        self.calls += 1
+        if not ok:
+            self.failures += 1
+        self.error_rate = alpha * (0.0 if ok else 1.0) + (1 - alpha) * self.error_rate
+        # 失败的调用耗时不代表正常延迟，不计入
+        if ok and latency is not None:
+            self.latency = latency if self.latency is None else alpha * latency + (1 - alpha) * self.latency
+
+
+class ModelRouter:
+    """在同一公司的模型之间做故障切换
+
+    - 指定模型健康且不明显慢于同组最快的健康模型时，始终使用指定模型
+    - 指定模型错误率过高或已熔断时，切换到同组中最快的健康模型
+    - 指定模型比最快的健康模型慢 latency_ratio 倍以上时，切换到更快的模型
+    同组模型：config.models_by_company 中与之同属一个公司的模型；
+    不在任何公司列表中的裁判模型，以 config.judge_models 为同组。
+    """
+
+    def __init__(self, enabled=None, error_threshold=None, latency_ratio=None, min_samples=None, alpha=None):
+        # 为 None 时跟随 config.model_routing_enabled
+        self.enabled = enabled
+        self.error_threshold = error_threshold or config.model_routing_error_threshold
+        self.latency_ratio = latency_ratio or config.model_routing_latency_ratio
+        self.min_samples = config.model_routing_min_samples if min_samples is None else min_samples
+        self.alpha = alpha or config.model_routing_ewma_alpha
+        self._lock = threading.Lock()
+        self.health: Dict[str, ModelHealth] = {}
+        self.failovers = 0
+
+    def get_siblings(self, model: str) -> List[str]:
+        """同组的其他模型"""
+        for models in config.models_by_company.values():
+            if model in models:
+                return [m for m in models if m != model]
+        if model in config.judge_models:
+            return [m for m in config.judge_models if m != model]
+        return []
+
+    def record(self, model: str, latency: Optional[float], ok: bool):
+        """记录一次调用结果"""
+        with self._lock:
+            self.health.setdefault(model, ModelHealth()).update(latency, ok, self.alpha)
+
+    def is_healthy(self, model: str) -> bool:
+        if get_circuit_breaker(model).get_status()["state"] == "open":
+            return False
+        with self._lock:
+            health = self.health.get(model)
+            return health is None or health.error_rate < self.error_threshold
+
+    def _latency(self, model: str) -> Optional[float]:
+        """样本足够时返回延迟，否则返回 None"""
+        with self._lock:
+            health = self.health.get(model)
+            if health is None or health.calls < self.min_samples:
+                return None
+            return health.latency
+
+    def choose(self, assigned: str, failed: Optional[str] = None) -> str:
+        """为指定模型选择本次实际调用的模型
+
+        Args:
+            assigned: 分配给 Agent 的模型
+            failed: 上一次尝试失败的模型，本次尽量避开
+        """
+        enabled = config.model_routing_enabled if self.enabled is None else self.enabled
+        if not enabled:
+            return assigned
+
+        candidates = [assigned] + self.get_siblings(assigned)
+        healthy = [m for m in candidates if m != failed and self.is_healthy(m)]
+        if not healthy:
+            # 同组都不可用时，换一个与上次不同的模型碰碰运气
+            others = [m for m in candidates if m != failed]
+            return others[0] if others else assigned
+
+        known = [m for m in healthy if self._latency(m) is not None]
+        fastest = min(known, key=self._latency) if known else None
+
+        if assigned in healthy:
+            assigned_latency = self._latency(assigned)
+            if fastest is None or assigned_latency is None or assigned_latency <= self.latency_ratio * self._latency(fastest):
+                return assigned
+            choice = fastest
+        else:
+            # 指定模型不可用：优先已知最快的，否则按同组顺序取第一个
+            choice = fastest or healthy[0]
+
+        with self._lock:
+            self.failovers += 1
+        print(f"Debug: 模型切换 {assigned} -> {choice}")
+        return choice
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "failovers": self.failovers,
+                "models": {
+                    model: {
+                        "calls": h.calls,
+                        "failures": h.failures,
+                        "latency": h.latency,
+                        "error_rate": h.error_rate,
+                    }
+                    for model, h in self.health.items()
+                },
+            }
+
+
+@contextmanager
+def use_model(agent, model: str):
+    """临时让 agent 使用另一个模型（llm_config 和客户端取自共享池）"""
+    from agents.pool import intern_llm_config, get_client
+
+    config_entry = agent.llm_config["config_list"][0]
+    if model == config_entry["model"]:
+        yield
+        return
+
+    llm_config = intern_llm_config({**agent.llm_config, "config_list": [{**config_entry, "model": model}]})
+    original = (agent.llm_config, agent.client)
+    agent.llm_config, agent.client = llm_config, get_client(llm_config)
+    try:
+        yield
+    finally:
+        agent.llm_config, agent.client = original
+
+
+# 全局模型路由器（所有辩论共享各模型的健康数据）
+model_router = ModelRouter()
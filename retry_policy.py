@@ -0,0 +1,315 @@
+import asyncio
+import email.utils
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import config
+from agents.cache import CacheMissError
+
+# ============================================================================
+# 错误分类
+# ============================================================================
+ERROR_EMPTY = "empty"  # 调用成功但提取结果为空
+ERROR_RATE_LIMIT = "rate_limit"  # 429 / 配额不足
+ERROR_TIMEOUT = "timeout"  # 连接或读取超时
+ERROR_CONNECTION = "connection"  # 网络连接失败
+ERROR_SERVER = "server"  # 5xx
+ERROR_AUTH = "auth"  # 401 / 403
+ERROR_BAD_REQUEST = "bad_request"  # 400 / 404 / 422 等请求本身的问题
+ERROR_CIRCUIT_OPEN = "circuit_open"  # 熔断中，未发起调用
+ERROR_CACHE_MISS = "cache_miss"  # 回放模式下响应缓存未命中，未发起调用
+ERROR_UNKNOWN = "unknown"
+
+# 可以重试的错误类型（ERROR_UNKNOWN 多为本地代码错误，重试不会改变结果）
+RETRYABLE_ERRORS = {ERROR_EMPTY, ERROR_RATE_LIMIT, ERROR_TIMEOUT, ERROR_CONNECTION, ERROR_SERVER}
+# 计入熔断器的错误类型（说明服务端当前不可用，而不是请求本身有问题）
+BREAKER_ERRORS = {ERROR_RATE_LIMIT, ERROR_TIMEOUT, ERROR_CONNECTION, ERROR_SERVER}
+# 服务端正常返回了错误响应，说明模型本身可用，熔断器按成功处理
+SERVER_RESPONDED_ERRORS = {ERROR_AUTH, ERROR_BAD_REQUEST}
+
+
+class CircuitOpenError(Exception):
+    """模型处于熔断状态，本次调用被直接拒绝"""
+
+    def __init__(self, model: str, retry_in: float):
+        self.model = model
+        self.retry_in = retry_in
+        super().__init__(f"模型 {model} 已熔断，{retry_in:.1f} 秒后重试")
+
+
+def _get_status_code(error: Exception) -> Optional[int]:
+    """从 openai / requests 异常中取出 HTTP 状态码"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def classify_error(error: Exception) -> str:
+    """把异常归类为上面定义的错误类型"""
+    if isinstance(error, CircuitOpenError):
+        return ERROR_CIRCUIT_OPEN
+    if isinstance(error, CacheMissError):
+        # 本地缓存未命中是确定的结果，重试也不会命中
+        return ERROR_CACHE_MISS
+
+    status = _get_status_code(error)
+    if status is not None:
+        if status == 429:
+            return ERROR_RATE_LIMIT
+        if status in (401, 403):
+            return ERROR_AUTH
+        if status in (408, 504):
+            return ERROR_TIMEOUT
+        if status >= 500:
+            return ERROR_SERVER
+        if status >= 400:
+            return ERROR_BAD_REQUEST
+
+    # 没有状态码时按异常类型名判断（openai 与 requests 的异常命名一致）
+    names = {cls.__name__ for cls in type(error).__mro__}
+    if names & {"APITimeoutError", "Timeout", "TimeoutError", "ReadTimeout", "ConnectTimeout"}:
+        return ERROR_TIMEOUT
+    if names & {"APIConnectionError", "ConnectionError", "ConnectionResetError"}:
+        return ERROR_CONNECTION
+
+    # 兜底：按错误信息判断
+    message = str(error).lower()
+    if "rate limit" in message or "quota" in message:
+        return ERROR_RATE_LIMIT
+    if "timeout" in message or "timed out" in message:
+        return ERROR_TIMEOUT
+    if "connection" in message:
+        return ERROR_CONNECTION
+    if "authentication" in message or "api key" in message:
+        return ERROR_AUTH
+    return ERROR_UNKNOWN
+
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """读取响应头中的 Retry-After（秒数或 HTTP 日期），没有时返回 None"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+# ============================================================================
+# 熔断器
+# ============================================================================
+class CircuitBreaker:
+    """单个模型的熔断器
+
+    连续失败达到阈值后进入熔断，熔断期间所有调用直接拒绝；
+    到期后放行一次试探调用（半开），成功则恢复，失败则重新熔断。
+    """
+
+    def __init__(self, model: str, failure_threshold: int = None, reset_timeout: float = None):
+        self.model = model
+        self.failure_threshold = failure_threshold or config.circuit_breaker_failure_threshold
+        self.reset_timeout = reset_timeout or config.circuit_breaker_reset_timeout
+        self._lock = threading.Lock()
+        self.state = "closed"  # closed -> open -> half_open -> closed
+        self.failures = 0
+        self.opened_until = 0.0
+        self._probe_in_flight = False
+
+    def before_call(self):
+        """调用前检查，熔断中时抛出 CircuitOpenError"""
+        with self._lock:
+            if self.state == "closed":
+                return
+            now = time.monotonic()
+            if self.state == "open" and now >= self.opened_until:
+                self.state = "half_open"
+                self._probe_in_flight = False
+            if self.state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            raise CircuitOpenError(self.model, max(0.0, self.opened_until - now))
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def release_probe(self):
+        """调用没有得到服务端的结论（如本地错误、缓存未命中），不改变熔断状态，只归还半开状态的试探名额"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self, retry_after: Optional[float] = None):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                # 服务端要求的等待时间比默认熔断时间长时，以服务端为准
+                self.state = "open"
+                self.opened_until = time.monotonic() + max(self.reset_timeout, retry_after or 0.0)
+                self._probe_in_flight = False
+
+    def get_status(self) -> Dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "retry_in": max(0.0, self.opened_until - time.monotonic()) if self.state == "open" else 0.0,
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(model: str) -> CircuitBreaker:
+    """获取模型对应的熔断器（进程内所有辩论共享）"""
+    with _breakers_lock:
+        breaker = _breakers.get(model)
+        if breaker is None:
+            breaker = _breakers[model] = CircuitBreaker(model)
+        return breaker
+
+
+def get_breaker_status() -> Dict[str, Dict]:
+    """获取所有模型的熔断状态"""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.model: breaker.get_status() for breaker in breakers}
+
+
+# ============================================================================
+# 重试策略
+# ============================================================================
+class RetryPolicy:
+    """指数退避 + 全抖动的重试策略"""
+
+    def __init__(self, max_attempts: int = None, base_delay: float = None, max_delay: float = None, empty_delay: float = None, rng: random.Random = None):
+        self.max_attempts = max_attempts or config.retry_max_attempts
+        self.base_delay = config.retry_base_delay if base_delay is None else base_delay
+        self.max_delay = config.retry_max_delay if max_delay is None else max_delay
+        self.empty_delay = config.retry_empty_delay if empty_delay is None else empty_delay
+        self.rng = rng or random.Random()
+
+    def should_retry(self, category: str, attempt: int) -> bool:
+        return category in RETRYABLE_ERRORS and attempt + 1 < self.max_attempts
+
+    def compute_delay(self, category: str, attempt: int, retry_after: Optional[float] = None) -> float:
+        """计算第 attempt 次失败后的等待时间"""
+        if category == ERROR_EMPTY:
+            return self.empty_delay
+        if retry_after is not None:
+            return min(self.max_delay, retry_after)
+        # 全抖动：在 [0, base * 2^attempt] 内随机，避免多场辩论同时重试
+        return self.rng.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _on_error(self, model: str, breaker: CircuitBreaker, error: Exception, attempt: int, can_failover: bool = False) -> float:
+        """记录一次失败，需要重试时返回等待时间，否则重新抛出异常"""
+        category = classify_error(error)
+        retry_after = get_retry_after(error)
+        if category in BREAKER_ERRORS:
+            breaker.record_failure(retry_after)
+        elif category in SERVER_RESPONDED_ERRORS:
+            # 服务端有响应（如请求参数错误），说明模型本身可用
+            breaker.record_success()
+        elif category != ERROR_CIRCUIT_OPEN:
+            # 本地错误和缓存未命中不能说明模型是否可用
+            breaker.release_probe()
+        if category == ERROR_CIRCUIT_OPEN:
+            # 熔断中的模型只有在可以切换到其他模型时才继续尝试
+            if can_failover and attempt + 1 < self.max_attempts:
+                return 0.0
+            raise error
+        if not self.should_retry(category, attempt):
+            raise error
+        delay = self.compute_delay(category, attempt, retry_after)
+        print(f"调用 {model} 失败（{category}），{delay:.1f} 秒后进行第 {attempt + 2} 次尝试: {error}")
+        return delay
+
+    def _on_result(self, result, attempt: int) -> Optional[float]:
+        """结果为空且还能重试时返回等待时间，否则返回 None"""
+        if result or not self.should_retry(ERROR_EMPTY, attempt):
+            return None
+        print(f"回复为空，进行第 {attempt + 2} 次重试...")
+        return self.compute_delay(ERROR_EMPTY, attempt)
+
+    def _plan_next(self, route, attempt: int, failed_model: str, delay: float):
+        """失败后确定下一次尝试的模型，切换到其他模型时无需等待"""
+        if route is None:
+            return failed_model, delay
+        next_model = route(attempt + 1, failed_model)
+        return next_model, (0.0 if next_model != failed_model else delay)
+
+    def run(self, model: str, attempt_fn: Callable[[int, str], str], route: Callable[[int, Optional[str]], str] = None) -> str:
+        """执行 attempt_fn(attempt, model)，按错误类型退避重试，返回最后一次的结果
+
+        空结果按 empty_delay 重试且不计入熔断；可重试的异常按指数退避重试，
+        尝试次数用尽或遇到不可重试的错误时抛出最后一个异常。
+        提供 route(attempt, failed_model) 时每次尝试由它选择模型，失败后可以立即切换到其他模型。
+        """
+        result = None
+        current = route(0, None) if route else model
+        for attempt in range(self.max_attempts):
+            breaker = get_circuit_breaker(current)
+            try:
+                breaker.before_call()
+                result = attempt_fn(attempt, current)
+            except Exception as e:
+                delay = self._on_error(current, breaker, e, attempt, can_failover=route is not None)
+                current, delay = self._plan_next(route, attempt, current, delay)
+                if delay:
+                    time.sleep(delay)
+                continue
+            breaker.record_success()
+            delay = self._on_result(result, attempt)
+            if delay is None:
+                break
+            if delay:
+                time.sleep(delay)
+        return result
+
+    async def run_async(self, model: str, attempt_fn, route: Callable[[int, Optional[str]], str] = None) -> str:
+        """run 的异步版本，attempt_fn(attempt, model) 返回协程"""
+        result = None
+        current = route(0, None) if route else model
+        for attempt in range(self.max_attempts):
+            breaker = get_circuit_breaker(current)
+            try:
+                breaker.before_call()
+                result = await attempt_fn(attempt, current)
+            except Exception as e:
+                delay = self._on_error(current, breaker, e, attempt, can_failover=route is not None)
+                current, delay = self._plan_next(route, attempt, current, delay)
+                if delay:
+                    await asyncio.sleep(delay)
+                continue
+            breaker.record_success()
+            delay = self._on_result(result, attempt)
+            if delay is None:
+                break
+            if delay:
+                await asyncio.sleep(delay)
+        return result
+
+
+# 全局默认重试策略
+retry_policy = RetryPolicy()
@@ -0,0 +1,54 @@
+import pytest
+
+from agents.context import DebateContextManager
+from debate_formats import MODERATOR_NAME, compile_format, get_compiled_format
+
+
+def build_transcript(debate_format, pinned_labels):
+    """按赛制的发言步骤生成一份对话历史，返回 (历史, 应固定保留的消息)"""
+    opening = {"role": "user", "name": "用户", "content": "辩题：人工智能利大于弊"}
+    messages, expected = [opening], [opening]
+    announced = set()
+    for phase_index, speaker, candidates in debate_format.steps:
+        phase = debate_format.phases[phase_index]
+        speaker = speaker or candidates[0]
+        is_announcement = speaker == MODERATOR_NAME and phase["announce"] and phase_index not in announced
+        if is_announcement:
+            announced.add(phase_index)
+        message = {"role": "user", "name": speaker, "content": f"[{phase['label']}-{speaker}]: ……"}
+        messages.append(message)
+        if phase["label"] in pinned_labels and not is_announcement:
+            expected.append(message)
+    return messages, expected
+
+
+@pytest.mark.parametrize("format_name, pinned_labels", [
+    ("standard", {"主持人介绍", "开场陈述"}),
+    ("oxford", {"主持人介绍", "主题演讲"}),
+    ("lincoln_douglas", {"主持人介绍", "正方立论", "反方立论"}),
+    ("cross_examination", {"主持人介绍", "开场陈述"}),
+])
+def test_opening_speeches_are_pinned(format_name, pinned_labels):
+    debate_format = get_compiled_format(format_name, 2, 3, 6, False)
+    messages, expected = build_transcript(debate_format, pinned_labels)
+
+    manager = DebateContextManager(debate_format, recent_messages=2, summary_every=1000)
+    pinned, older, recent = manager._split(messages)
+
+    assert pinned == expected
+    assert recent == messages[-2:]
+    assert len(pinned) + len(older) + len(recent) == len(messages)
+
+
+def test_pinned_flag_overrides_default_phases():
+    spec = {
+        "phases": [
+            {"id": "intro", "label": "主持人介绍", "order": ["moderator"], "pinned": False},
+            {"id": "opening", "label": "开场陈述", "order": ["pro:1", "con:1"]},
+            {"id": "rebuttal", "label": "反驳", "announce": True, "order": ["con:1", "pro:1"], "pinned": True},
+        ],
+    }
+    debate_format = compile_format(spec, 1, 1, 0, False, name="custom")
+    assert debate_format.pinned_turns == {
+        ("正方辩手1", 0), ("反方辩手1", 0), ("反方辩手1", 1), ("正方辩手1", 1),
+    }
@@ -0,0 +1,64 @@
+from types import SimpleNamespace
+
+import pytest
+
+from agents import custom_agents
+from agents.cache import ResponseCache, CacheMissError
+
+JUDGE_PROMPT = "你是一位资深的辩论赛裁判。"
+HISTORY = [
+    {"role": "user", "name": "正方辩手1", "content": "我方认为……"},
+    {"role": "user", "name": "反方辩手1", "content": "对方的前提并不成立……"},
+]
+
+
+def make_judge(name, model="qwen/qwen3"):
+    return SimpleNamespace(
+        name=name,
+        debate_sm=None,
+        llm_config={"config_list": [{"model": model}], "temperature": 0.7},
+        system_message=JUDGE_PROMPT,
+    )
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = ResponseCache(path=str(tmp_path / "responses.sqlite3"), max_entries=100, replay=False)
+    monkeypatch.setattr(custom_agents, "get_response_cache", lambda: cache)
+    yield cache
+    cache.close()
+
+
+def test_make_key_includes_speaker():
+    key1 = ResponseCache.make_key("裁判1", "qwen/qwen3", 0.7, JUDGE_PROMPT, HISTORY)
+    key2 = ResponseCache.make_key("裁判2", "qwen/qwen3", 0.7, JUDGE_PROMPT, HISTORY)
+    assert key1 != key2
+    assert key1 == ResponseCache.make_key("裁判1", "qwen/qwen3", 0.7, JUDGE_PROMPT, list(HISTORY))
+
+
+def test_same_model_judges_get_separate_entries(cache):
+    verdicts = {"裁判1": "正方胜", "裁判2": "反方胜", "裁判3": "正方胜（险胜）"}
+    for name, verdict in verdicts.items():
+        reply = custom_agents.generate_llm_reply(make_judge(name), None, lambda v=verdict: v, messages=HISTORY)
+        assert reply == verdict
+
+    stats = cache.get_stats()
+    assert stats["hits"] == 0
+    assert stats["writes"] == 3
+    assert stats["entries"] == 3
+
+
+def test_replay_returns_each_judges_own_verdict(cache):
+    verdicts = {"裁判1": "正方胜", "裁判2": "反方胜"}
+    for name, verdict in verdicts.items():
+        custom_agents.generate_llm_reply(make_judge(name), None, lambda v=verdict: v, messages=HISTORY)
+
+    cache.replay = True
+
+    def must_not_generate():
+        raise AssertionError("回放模式下不应调用模型")
+
+    for name, verdict in verdicts.items():
+        assert custom_agents.generate_llm_reply(make_judge(name), None, must_not_generate, messages=HISTORY) == verdict
+    with pytest.raises(CacheMissError):
+        custom_agents.generate_llm_reply(make_judge("裁判3"), None, must_not_generate, messages=HISTORY)
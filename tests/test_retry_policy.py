@@ -0,0 +1,90 @@
+import pytest
+
+from retry_policy import (
+    CircuitBreaker, RetryPolicy, classify_error,
+    ERROR_BAD_REQUEST, ERROR_SERVER, ERROR_UNKNOWN,
+)
+
+
+class FakeStatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def failing(error):
+    def attempt(retry, model):
+        raise error
+    return attempt
+
+
+@pytest.fixture
+def policy():
+    return RetryPolicy(max_attempts=3, base_delay=0, max_delay=0, empty_delay=0)
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    breaker = CircuitBreaker("test/model", failure_threshold=2, reset_timeout=60)
+    monkeypatch.setattr("retry_policy.get_circuit_breaker", lambda model: breaker)
+    return breaker
+
+
+def test_classify_error():
+    assert classify_error(FakeStatusError(503)) == ERROR_SERVER
+    assert classify_error(FakeStatusError(400)) == ERROR_BAD_REQUEST
+    assert classify_error(KeyError("choices")) == ERROR_UNKNOWN
+
+
+def test_local_errors_are_not_retried(policy, breaker):
+    calls = []
+
+    def attempt(retry, model):
+        calls.append(retry)
+        raise KeyError("choices")
+
+    with pytest.raises(KeyError):
+        policy.run("test/model", attempt)
+    assert calls == [0]
+
+
+def test_local_errors_do_not_reset_breaker(policy, breaker):
+    breaker.record_failure()
+    with pytest.raises(TypeError):
+        policy.run("test/model", failing(TypeError("bad reply")))
+    assert breaker.get_status()["failures"] == 1
+
+
+def test_local_error_keeps_half_open_breaker_open_for_next_probe(policy, breaker):
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    breaker.opened_until = 0.0  # 熔断到期，下一次调用为试探
+
+    with pytest.raises(KeyError):
+        policy.run("test/model", failing(KeyError("choices")))
+    assert breaker.state == "half_open"
+
+    # 试探名额已归还，下一次调用仍可以试探
+    assert policy.run("test/model", lambda retry, model: "ok") == "ok"
+    assert breaker.state == "closed"
+
+
+def test_client_errors_prove_server_is_up(policy, breaker):
+    breaker.record_failure()
+    with pytest.raises(FakeStatusError):
+        policy.run("test/model", failing(FakeStatusError(400)))
+    assert breaker.get_status() == {"state": "closed", "failures": 0, "retry_in": 0.0}
+
+
+def test_server_errors_are_retried_and_counted(policy, breaker):
+    calls = []
+
+    def attempt(retry, model):
+        calls.append(retry)
+        if retry == 0:
+            raise FakeStatusError(503)
+        return "ok"
+
+    assert policy.run("test/model", attempt) == "ok"
+    assert calls == [0, 1]